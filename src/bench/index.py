@@ -0,0 +1,84 @@
+from src.query.index import IndexConfig
+from src.query.index import build_index
+from src.config.logging import logger
+from typing import Sequence
+from typing import Tuple
+import numpy as np
+import faiss
+import time
+
+
+def synthetic_embeddings(count: int = 50000, dim: int = 768, queries: int = 500, clusters: int = 1000,
+                         seed: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates clustered unit vectors, shaped like embeddings of company names, and queries that
+    are noisy copies of some of them, like misspelled names.
+
+    Args:
+        count (int): Number of indexed vectors.
+        dim (int): Dimension, 768 for textembedding-gecko.
+        queries (int): Number of queries.
+        clusters (int): Number of clusters the vectors are drawn around.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (vectors, queries) as float32 matrices.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(clusters, size=count)] + 0.5 * rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = vectors[rng.choice(count, queries, replace=False)]
+    noisy = picked + 0.02 * rng.standard_normal(picked.shape, dtype=np.float32)
+    noisy /= np.linalg.norm(noisy, axis=1, keepdims=True)
+    return vectors, noisy
+
+
+def benchmark(count: int = 50000, dim: int = 768, queries: int = 500, k: int = 10,
+              configs: Sequence[IndexConfig] = (IndexConfig('ivf_flat', nprobe=8),
+                                                IndexConfig('ivf_flat', nprobe=32),
+                                                IndexConfig('ivf_pq', nprobe=32),
+                                                IndexConfig('hnsw', ef_search=32),
+                                                IndexConfig('hnsw', ef_search=128))) -> None:
+    """
+    Measures build time, size, recall@k against the exact flat index, and single-query and
+    batched query latency of approximate index types, on CPU.
+
+    Args:
+        count (int): Number of indexed vectors.
+        dim (int): Vector dimension.
+        queries (int): Number of queries.
+        k (int): Neighbours retrieved per query.
+        configs (Sequence[IndexConfig]): Index types and parameters to compare with 'flat'.
+    """
+    vectors, query_vectors = synthetic_embeddings(count, dim, queries)
+    logger.info(f"Synthetic set: {count} vectors of dimension {dim}, {queries} queries, k={k}, "
+                f"{faiss.omp_get_max_threads()} threads")
+
+    exact = None
+    logger.info(f"{'index':<68} {'build s':>8} {'MB':>8} {'recall@' + str(k):>10} {'p50 ms':>7} "
+                f"{'p99 ms':>7} {'batch q/s':>10}")
+    for config in (IndexConfig('flat'), *configs):
+        started = time.perf_counter()
+        index = build_index(vectors, config)
+        build = time.perf_counter() - started
+        size = faiss.serialize_index(index).nbytes / 1e6
+
+        latencies = []
+        for query in query_vectors:
+            started = time.perf_counter()
+            index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        _, ids = index.search(query_vectors, k)
+        batch = queries / (time.perf_counter() - started)
+
+        if exact is None:
+            exact = ids
+        recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(ids, exact)])
+        logger.info(f"{repr(config):<68} {build:>8.2f} {size:>8.1f} {recall:>10.3f} "
+                    f"{np.percentile(latencies, 50):>7.3f} {np.percentile(latencies, 99):>7.3f} {batch:>10.0f}")
+
+
+if __name__ == '__main__':
+    benchmark()
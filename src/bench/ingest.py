@@ -0,0 +1,83 @@
+from src.utils.transfer import upload_metadata
+from src.utils.transfer import ingest_store
+from src.utils.storage import LocalStorage
+from src.utils.store import ContentStore
+from src.config.logging import logger
+from typing import Sequence
+from pathlib import Path
+import tempfile
+import random
+import time
+import os
+
+
+def synthetic_store(root: Path, count: int = 500, size_kb: int = 256, duplicates: float = 0.1,
+                    seed: int = 7) -> ContentStore:
+    """
+    Fills a ContentStore with random PDF-like files, some of them found under several URLs.
+
+    Args:
+        root (Path): Root directory of the store.
+        count (int): Number of downloads.
+        size_kb (int): Size of every file in KB.
+        duplicates (float): Share of downloads that repeat an earlier document.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        ContentStore: The filled store.
+    """
+    rng = random.Random(seed)
+    store = ContentStore(root)
+    bodies = []
+    for i in range(count):
+        if bodies and rng.random() < duplicates:
+            body = rng.choice(bodies)
+        else:
+            body = b'%PDF-1.4\n' + rng.randbytes(size_kb * 1024)
+            bodies.append(body)
+        url = f'https://www.example-bank-{i % 50}.com/investors/report-{i}.pdf'
+        path = store.incoming_path(url)
+        path.write_bytes(body)
+        store.add(path, url=url, company=f'Bank {i % 50}', title=f'report-{i}.pdf')
+    return store
+
+
+def benchmark(count: int = 500, size_kb: int = 256, workers: Sequence[int] = (1, 4, 16)) -> None:
+    """
+    Measures ingest throughput end to end on the local storage backend: uploading every unique
+    document of a store, writing and uploading the metadata shards, then an incremental re-run
+    in which nothing changed.
+
+    Args:
+        count (int): Number of synthetic downloads.
+        size_kb (int): Size of every file in KB.
+        workers (Sequence[int]): Thread counts to measure.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        store = synthetic_store(temp_dir / 'store', count, size_kb)
+        logger.info(f"Synthetic store: {count} downloads of {size_kb} KB, "
+                    f"{sum(1 for _ in store.documents())} unique documents")
+
+        logger.info(f"{'workers':>8} {'full files/s':>13} {'full MB/s':>10} {'re-run s':>9} {'re-run files/s':>15}")
+        for worker_count in workers:
+            target = LocalStorage(temp_dir / f'bucket-{worker_count}')
+            metadata_folder = temp_dir / f'metadata-{worker_count}'
+
+            started = time.perf_counter()
+            stats = ingest_store(store, target, metadata_folder, worker_count)
+            upload_metadata(target, metadata_folder)
+            full = time.perf_counter() - started
+            stored_bytes = sum(info.size for info in target.list() if info.name.endswith('.pdf'))
+
+            started = time.perf_counter()
+            ingest_store(store, target, metadata_folder, worker_count, incremental=True)
+            upload_metadata(target, metadata_folder)
+            rerun = time.perf_counter() - started
+
+            logger.info(f"{worker_count:>8} {stats['stored'] / full:>13.1f} {stored_bytes / full / 1e6:>10.1f} "
+                        f"{rerun:>9.3f} {stats['documents'] / rerun:>15.1f}")
+
+
+if __name__ == '__main__':
+    benchmark(workers=(1, 4, 16, os.cpu_count() or 1))
@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+from src.scrape.links import analyze_page
+from src.config.logging import logger
+from src.scrape.links import BACKENDS
+from pathlib import Path
+from typing import Tuple
+from typing import List
+import random
+import time
+import os
+
+
+def synthetic_pages(count: int = 200, anchors: int = 400, seed: int = 7) -> List[Tuple[str, str]]:
+    """
+    Generates investor-relations-like pages with navigation, text and a mix of PDF and page links.
+
+    Args:
+        count (int): Number of pages.
+        anchors (int): Anchors per page.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        List[Tuple[str, str]]: (page_url, html) pairs.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        rows = []
+        for j in range(anchors):
+            if rng.random() < 0.3:
+                href = f'/-/files/investors/{2000 + j % 24}/report-{i}-{j}.pdf'
+            else:
+                href = f'https://www.example-bank.com/investors/section-{j}?lang=en&amp;page={i}'
+            rows.append(f'<tr><td class="doc"><span>Item {j}</span></td>'
+                        f'<td><a class="link" data-id="{j}" href="{href}">Document {j}</a></td></tr>')
+        html_content = ('<!DOCTYPE html><html><head><title>Investors</title>'
+                        '<script>var x = "<a href=\'nope\'>";</script></head><body>'
+                        f'<nav>{"".join(rows[:20])}</nav><table>{"".join(rows)}</table>'
+                        f'<p>{"Lorem ipsum dolor sit amet. " * 200}</p></body></html>')
+        pages.append((f'https://www.example-bank.com/investors/page-{i}', html_content))
+    return pages
+
+
+def load_fixtures(folder: str) -> List[Tuple[str, str]]:
+    """
+    Loads saved HTML pages from a folder. The file name stands in for the page URL.
+    """
+    pages = []
+    for path in sorted(Path(folder).glob('*.htm*')):
+        pages.append((f'https://{path.stem}/', path.read_text(encoding='utf-8', errors='replace')))
+    return pages
+
+
+def run_inline(pages: List[Tuple[str, str]], backend: str) -> float:
+    started = time.perf_counter()
+    for page_url, html_content in pages:
+        analyze_page(html_content, page_url, backend)
+    return len(pages) / (time.perf_counter() - started)
+
+
+def run_pool(pages: List[Tuple[str, str]], backend: str, processes: int) -> float:
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        # Warm the workers up so process start-up is not measured
+        list(pool.map(analyze_page, [pages[0][1]] * processes, [pages[0][0]] * processes, [backend] * processes))
+        started = time.perf_counter()
+        list(pool.map(analyze_page, [html for _, html in pages], [url for url, _ in pages],
+                      [backend] * len(pages), chunksize=4))
+        return len(pages) / (time.perf_counter() - started)
+
+
+def benchmark(fixtures_folder: str = './data/html', processes: int = os.cpu_count() or 1) -> None:
+    """
+    Measures pages per second for every link extraction backend, inline and in a process pool.
+
+    Args:
+        fixtures_folder (str): Folder of saved HTML pages. Synthetic pages are used if it is empty or missing.
+        processes (int): Worker processes for the pooled measurement.
+    """
+    pages = load_fixtures(fixtures_folder) if Path(fixtures_folder).is_dir() else []
+    if pages:
+        logger.info(f"Loaded {len(pages)} HTML fixtures from {fixtures_folder}")
+    else:
+        pages = synthetic_pages()
+        logger.info(f"No fixtures in {fixtures_folder}, using {len(pages)} synthetic pages")
+
+    logger.info(f"{'backend':<12} {'inline pages/s':>15} {f'{processes} procs pages/s':>18}")
+    for backend in BACKENDS:
+        inline = run_inline(pages, backend)
+        pooled = run_pool(pages, backend, processes)
+        logger.info(f"{backend:<12} {inline:>15.1f} {pooled:>18.1f}")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,162 @@
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.embeddings.base import Embeddings
+from src.query.hybrid import HybridResolver
+from src.query.lexical import LexicalIndex
+from src.query.lexical import ngram_hashes
+from src.query.index import build_index
+from src.query.lexical import normalize
+from langchain.vectorstores import FAISS
+from src.config.logging import logger
+from langchain.schema import Document
+from typing import Sequence
+from typing import Tuple
+from typing import List
+import numpy as np
+import random
+import json
+import time
+import zlib
+
+
+LEGAL_SUFFIXES = {'sa', 'ag', 'plc', 'inc', 'ltd', 'limited', 'nv', 'bv', 'spa', 'sau', 'ab', 'asa', 'as', 'eg',
+                  'gmbh', 'pjsc', 'psc', 'bhd', 'berhad', 'tbk', 'co', 'corp', 'corporation', 'group'}
+
+
+class SimulatedEmbeddings(Embeddings):
+    """
+    Offline stand-in for the embedding API: hashed character bigrams and words, randomly
+    projected, and a fixed delay per request like a remote call. Its accuracy is only indicative;
+    run the benchmark with `live=True` to measure the real model.
+    """
+
+    def __init__(self, dim: int = 256, latency_s: float = 0.08, seed: int = 7):
+        self.latency_s = latency_s
+        self.projection = np.random.default_rng(seed).standard_normal((2 ** 16, dim), dtype=np.float32)
+
+    def _embed(self, text: str) -> List[float]:
+        features = np.concatenate([ngram_hashes(text, n=2, n_features=2 ** 16),
+                                   ngram_hashes(text, n=4, n_features=2 ** 16),
+                                   [zlib.crc32(word.encode('utf-8')) % 2 ** 16 for word in normalize(text).split()]]).astype(np.int64)
+        vector = self.projection[features].sum(axis=0)
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_s)
+        return self._embed(text)
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """
+    Applies one or two typical input errors to a company name: a dropped, swapped or replaced
+    letter, a missing legal suffix, or lost capitalization.
+    """
+    for _ in range(rng.randint(1, 2)):
+        words = name.split()
+        error = rng.choice(('drop', 'swap', 'replace', 'suffix', 'case'))
+        if error == 'suffix' and len(words) > 1 and normalize(words[-1]) in LEGAL_SUFFIXES:
+            name = ' '.join(words[:-1])
+        elif error == 'case':
+            name = name.lower()
+        elif len(name) > 4:
+            i = rng.randrange(1, len(name) - 2)
+            if error == 'drop':
+                name = name[:i] + name[i + 1:]
+            elif error == 'swap':
+                name = name[:i] + name[i + 1] + name[i] + name[i + 2:]
+            else:
+                name = name[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + name[i + 1:]
+    return name
+
+
+def entity_store(records: List[dict], text_embedder: Embeddings) -> Tuple[FAISS, LexicalIndex]:
+    """
+    Builds the vector store and the lexical index of some bank records, keyed by their row number.
+    """
+    documents = [Document(page_content=record['bank_name'],
+                          metadata={'country': record.get('country'), 'site_url': record.get('site_url'),
+                                    'entity_id': i})
+                 for i, record in enumerate(records)]
+    ids = list(range(len(documents)))
+    names = [document.page_content for document in documents]
+    vectors = np.array(text_embedder.embed_documents(names), dtype=np.float32)
+    vector_store = FAISS(text_embedder.embed_query, build_index(vectors, ids=ids),
+                         InMemoryDocstore({str(id_): document for id_, document in zip(ids, documents)}),
+                         {id_: str(id_) for id_ in ids})
+    return vector_store, LexicalIndex.build(ids, names)
+
+
+def benchmark(records_path: str = './src/query/banks.jsonl', queries: int = 300, thresholds: Sequence[float] = (0.7, 0.8, 0.9),
+              live: bool = False, seed: int = 7) -> None:
+    """
+    Compares the accuracy and per-query latency of the vector retriever of `retrieve.py`, the
+    lexical index alone and the hybrid resolver at several fast-path thresholds, on misspelled
+    names of real banks.
+
+    A query counts as resolved if its top match is the bank it was derived from, or a bank with
+    the same normalized name, which no retriever can tell apart.
+
+    Args:
+        records_path (str): JSONL file of banks.
+        queries (int): Number of misspelled queries.
+        thresholds (Sequence[float]): Fast-path thresholds of the hybrid resolver.
+        live (bool): Embed with textembedding-gecko instead of the offline stand-in. Needs the project config.
+        seed (int): Random seed, so runs are comparable.
+    """
+    with open(records_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if live:
+        from src.query.embed import MyVertexAIEmbeddings
+        text_embedder = MyVertexAIEmbeddings()
+    else:
+        text_embedder = SimulatedEmbeddings()
+    vector_store, lexical = entity_store(records, text_embedder)
+
+    rng = random.Random(seed)
+    truth = rng.sample(range(len(records)), queries)
+    names = [misspell(records[i]['bank_name'], rng) for i in truth]
+
+    def correct(document: Document, i: int) -> bool:
+        return normalize(document.page_content) == normalize(records[i]['bank_name'])
+
+    logger.info(f"{len(records)} banks, {queries} misspelled queries, "
+                f"{'live' if live else 'simulated'} embeddings")
+    logger.info(f"{'retriever':<24} {'accuracy@1':>11} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'embedded':>9}")
+
+    def report(label: str, hits: int, latencies: List[float], embedded: int) -> None:
+        logger.info(f"{label:<24} {hits / queries:>11.3f} {np.mean(latencies):>8.2f} "
+                    f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f} {embedded / queries:>9.0%}")
+
+    hits, latencies = 0, []
+    for name, i in zip(names, truth):
+        started = time.perf_counter()
+        matches = vector_store.similarity_search(name, k=3)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += bool(matches) and correct(matches[0], i)
+    report('vector (retrieve.py)', hits, latencies, queries)
+
+    hits, latencies = 0, []
+    for name, i in zip(names, truth):
+        started = time.perf_counter()
+        matches = lexical.search(name, k=3)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += bool(matches) and correct(vector_store.docstore.search(str(matches[0][0])), i)
+    report('lexical', hits, latencies, 0)
+
+    for threshold in (*thresholds, float('inf')):
+        resolver = HybridResolver(vector_store, lexical, text_embedder, threshold=threshold)
+        hits, latencies = 0, []
+        for name, i in zip(names, truth):
+            started = time.perf_counter()
+            resolution = resolver.resolve(name)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += bool(resolution.matches) and correct(resolution.matches[0][0], i)
+        label = f'hybrid, threshold {threshold}' if threshold != float('inf') else 'hybrid, always embed'
+        report(label, hits, latencies, resolver.stats['embedded'])
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,116 @@
+from langchain.docstore.in_memory import InMemoryDocstore
+from src.query.docstore import save_vector_store
+from concurrent.futures import ProcessPoolExecutor
+from langchain.embeddings.base import Embeddings
+from src.query.docstore import load_mapped
+from src.query.index import IndexConfig
+from src.query.index import build_index
+from langchain.vectorstores import FAISS
+from src.config.logging import logger
+from langchain.schema import Document
+from typing import Sequence
+from typing import Dict
+from typing import List
+from pathlib import Path
+import multiprocessing
+import numpy as np
+import tempfile
+import time
+
+
+class RandomEmbeddings(Embeddings):
+    """
+    Stands in for the embedding API, so that only loading and searching are measured.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return np.random.default_rng(abs(hash(text))).standard_normal(self.dim, dtype=np.float32).tolist()
+
+
+def memory_mb() -> Dict[str, float]:
+    """
+    Returns the resident memory of this process in MB, and the part of it that is anonymous, i.e.
+    not backed by a file and so never shared with other processes loading the same store.
+    """
+    usage = {'rss': 0.0, 'anonymous': 0.0}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            field, value = line.split(':', 1)
+            if field == 'Rss':
+                usage['rss'] += int(value.split()[0]) / 1024
+            elif field == 'Anonymous':
+                usage['anonymous'] += int(value.split()[0]) / 1024
+    return usage
+
+
+def synthetic_store(folder: Path, count: int, dim: int, kind: str) -> None:
+    """
+    Writes a store of `count` companies twice: pickled by `FAISS.save_local` into 'pickle/' and in
+    the memory-mappable format of `save_vector_store` into 'mapped/'.
+    """
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    ids = rng.choice(2 ** 62, count, replace=False)
+    documents = {int(id_): Document(page_content=f'Company {i} SA',
+                                    metadata={'country': 'Country', 'site_url': f'site:company-{i}.com/',
+                                              'entity_id': int(id_)})
+                 for i, id_ in enumerate(ids)}
+    index = build_index(vectors, IndexConfig(kind), ids=ids)
+    vector_store = FAISS(RandomEmbeddings(dim).embed_query, index,
+                         InMemoryDocstore({str(id_): document for id_, document in documents.items()}),
+                         {id_: str(id_) for id_ in documents})
+    vector_store.save_local(str(folder / 'pickle'))
+    save_vector_store(vector_store, folder / 'mapped')
+
+
+def measure(folder: str, dim: int, mapped: bool) -> Dict[str, float]:
+    """
+    Loads a store in a fresh process and times the load and the first query.
+    """
+    embeddings = RandomEmbeddings(dim)
+    before = memory_mb()
+    started = time.perf_counter()
+    if mapped:
+        vector_store = load_mapped(folder, embeddings)
+    else:
+        vector_store = FAISS.load_local(folder, embeddings)
+    loaded = time.perf_counter()
+    vector_store.similarity_search('Company 42', k=3)
+    first = time.perf_counter()
+    after = memory_mb()
+    return {'load_ms': (loaded - started) * 1000, 'first_query_ms': (first - loaded) * 1000,
+            'rss_mb': after['rss'] - before['rss'], 'anonymous_mb': after['anonymous'] - before['anonymous']}
+
+
+def benchmark(count: int = 100000, dim: int = 768, kinds: Sequence[str] = ('flat', 'ivf_flat', 'hnsw')) -> None:
+    """
+    Compares start-up time, first-query latency and memory of the pickled and the memory-mapped
+    store formats. Every load runs in a new process, so nothing is shared with earlier runs but
+    the operating system's page cache.
+
+    Args:
+        count (int): Number of companies in the store.
+        dim (int): Embedding dimension.
+        kinds (Sequence[str]): Index types to measure, see IndexConfig.
+    """
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        logger.info(f"{'index':<10} {'format':<8} {'load ms':>9} {'first query ms':>15} {'RSS MB':>8} {'anonymous MB':>13}")
+        for kind in kinds:
+            folder = Path(temp_dir) / kind
+            synthetic_store(folder, count, dim, kind)
+            for mapped in (False, True):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(measure, str(folder / ('mapped' if mapped else 'pickle')), dim, mapped).result()
+                logger.info(f"{kind:<10} {'mapped' if mapped else 'pickle':<8} {result['load_ms']:>9.1f} "
+                            f"{result['first_query_ms']:>15.1f} {result['rss_mb']:>8.1f} {result['anonymous_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,192 @@
+from src.config.logging import logger
+from typing import Sequence
+from typing import Optional
+from typing import Union
+from typing import Tuple
+from typing import Dict
+from typing import List
+from pathlib import Path
+import numpy as np
+import threading
+import hashlib
+import json
+import os
+
+
+EMBEDDING_CACHE_FOLDER = './src/query/embedding_cache'
+KEY_BYTES = 16
+INDEX_DTYPE = np.dtype([('key', f'S{KEY_BYTES}'), ('row', '<i8')])
+INDEX_FILENAME = 'index.npy'
+VECTORS_FILENAME = 'vectors.bin'
+META_FILENAME = 'meta.json'
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by a hash of the model name and the text.
+
+    The vectors are rows of a raw float32 (or float16) file that is only ever appended to, and
+    'index.npy' holds the sorted 16-byte keys with their row numbers. Both are memory-mapped,
+    so opening the cache costs the same for ten entries as for ten million, and lookups are a
+    binary search. New entries are kept in memory until `flush`, which rewrites the small index
+    atomically; rows appended by a process that died before flushing are simply never referenced.
+    One process at a time may write to a cache folder; any number may read it.
+    """
+
+    def __init__(self, folder: Union[str, Path] = EMBEDDING_CACHE_FOLDER, model_name: str = 'textembedding-gecko',
+                 dtype: str = 'float32', flush_every: int = 1024):
+        """
+        Parameters:
+        folder (Union[str, Path]): Folder holding the cache files.
+        model_name (str): Embedding model, part of every key so that models never share vectors.
+        dtype (str): Storage type of the vectors, 'float32' or 'float16'. Fixed when the cache is created.
+        flush_every (int): Number of new entries after which the index is flushed automatically.
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.flush_every = flush_every
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[bytes, Tuple[int, np.ndarray]] = {}
+
+        meta_path = self.folder / META_FILENAME
+        if meta_path.exists():
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['dtype'] != self.dtype.name:
+                raise ValueError(f"Embedding cache {self.folder} stores {meta['dtype']} vectors, not {self.dtype.name}")
+            self.dim = meta['dim']
+        index_path = self.folder / INDEX_FILENAME
+        self._index = np.load(index_path, mmap_mode='r') if index_path.exists() else np.empty(0, INDEX_DTYPE)
+        self._vectors = self._map_vectors()
+        logger.info(f"Opened embedding cache {self.folder} with {len(self._index)} entries")
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._pending)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f'{self.model_name}\x00{text}'.encode('utf-8')).digest()[:KEY_BYTES]
+
+    def _map_vectors(self) -> Optional[np.memmap]:
+        path = self.folder / VECTORS_FILENAME
+        if self.dim is None or not path.exists():
+            return None
+        rows = path.stat().st_size // (self.dim * self.dtype.itemsize)
+        return np.memmap(path, dtype=self.dtype, mode='r', shape=(rows, self.dim)) if rows else None
+
+    def _rows(self, keys: List[bytes]) -> np.ndarray:
+        """
+        Returns the row of each key in the flushed index, or -1.
+        """
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self._index) or not keys:
+            return rows
+        keys = np.array(keys, dtype=INDEX_DTYPE['key'])
+        positions = np.searchsorted(self._index['key'], keys)
+        inside = positions < len(self._index)
+        found = np.zeros(len(keys), dtype=bool)
+        found[inside] = self._index['key'][positions[inside]] == keys[inside]
+        rows[found] = self._index['row'][positions[found]]
+        return rows
+
+    def get(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Looks up the embeddings of several texts.
+
+        Parameters:
+        texts (Sequence[str]): Texts to look up.
+
+        Returns:
+        List[Optional[np.ndarray]]: The float32 embedding of each text, or None if it is not cached.
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            rows = self._rows(keys)
+            result = []
+            for key, row in zip(keys, rows):
+                if key in self._pending:
+                    result.append(self._pending[key][1])
+                elif row >= 0:
+                    result.append(np.asarray(self._vectors[row], dtype=np.float32))
+                else:
+                    result.append(None)
+            misses = sum(vector is None for vector in result)
+            self.misses += misses
+            self.hits += len(result) - misses
+        return result
+
+    def put(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Adds embeddings to the cache. Texts that are already cached are ignored.
+
+        Parameters:
+        texts (Sequence[str]): The embedded texts.
+        vectors (Sequence[Sequence[float]]): Their embeddings, in the same order.
+        """
+        if len(texts) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(texts)} texts")
+        if not len(texts):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.folder / META_FILENAME, 'w') as f:
+                    json.dump({'dim': self.dim, 'dtype': self.dtype.name, 'key_bytes': KEY_BYTES}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding cache {self.folder} holds {self.dim}-dimensional vectors, "
+                                 f"got {vectors.shape[1]}")
+
+            rows = self._rows(keys)
+            new = {}
+            for key, row, vector in zip(keys, rows, vectors):
+                if row < 0 and key not in self._pending:
+                    new[key] = vector
+            if not new:
+                return
+
+            path = self.folder / VECTORS_FILENAME
+            row_bytes = self.dim * self.dtype.itemsize
+            with open(path, 'ab') as f:
+                size = f.tell()
+                if size % row_bytes:
+                    # A torn row left by a crash is never referenced, drop it
+                    size -= size % row_bytes
+                    f.truncate(size)
+                f.write(np.stack(list(new.values())).astype(self.dtype).tobytes())
+            first = size // row_bytes
+            for offset, (key, vector) in enumerate(new.items()):
+                self._pending[key] = (first + offset, vector)
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Makes the entries added since the last flush visible to other processes and future runs.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            new = np.array([(key, row) for key, (row, _) in self._pending.items()], dtype=INDEX_DTYPE)
+            merged = np.concatenate([np.asarray(self._index), new])
+            merged = merged[np.argsort(merged['key'], kind='stable')]
+
+            index_path = self.folder / INDEX_FILENAME
+            temp_path = index_path.with_name(index_path.name + '.tmp')
+            with open(temp_path, 'wb') as f:
+                np.save(f, merged)
+            os.replace(temp_path, index_path)
+
+            self._index = np.load(index_path, mmap_mode='r')
+            self._vectors = self._map_vectors()
+            logger.info(f"Flushed {len(self._pending)} new embeddings to {self.folder}, {len(self._index)} cached")
+            self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
@@ -0,0 +1,69 @@
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Any
+import requests
+
+
+SERVICE_URL = 'http://127.0.0.1:8765'
+
+
+class ResolverClient:
+    """
+    Client of the entity resolution service of `service.py`, for other pipeline stages.
+
+    It keeps one HTTP session, so successive calls reuse the same connection. Sending several
+    names in one `resolve` call is cheaper than one call per name, but concurrent callers are
+    batched together by the service either way.
+    """
+
+    def __init__(self, url: str = SERVICE_URL, timeout: float = 30.0):
+        """
+        Parameters:
+        url (str): Base URL of the service.
+        timeout (float): Seconds to wait for a response.
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def resolve(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Resolve company names.
+
+        Parameters:
+        queries (List[str]): Company names to resolve.
+
+        Returns:
+        List[Dict[str, Any]]: {'query', 'embedded', 'lexical_score', 'matches'} records, aligned with `queries`.
+            Every match has 'bank_name', 'country', 'site_url', 'entity_id' and 'score', best first.
+
+        Raises:
+        requests.HTTPError: If the service rejected or failed the request.
+        """
+        if not queries:
+            return []
+        response = self.session.post(f'{self.url}/resolve', json={'queries': queries}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['results']
+
+    def resolve_one(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve one company name.
+
+        Returns:
+        Optional[Dict[str, Any]]: The best match, or None if nothing matched.
+        """
+        matches = self.resolve([query])[0]['matches']
+        return matches[0] if matches else None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Latency and batch-size statistics of the service.
+        """
+        response = self.session.get(f'{self.url}/metrics', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,211 @@
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.embeddings.base import Embeddings
+from langchain.docstore.base import Docstore
+from langchain.vectorstores import FAISS
+from langchain.schema import Document
+from src.query.index import current_version
+from src.query.lexical import LexicalIndex
+from src.config.logging import logger
+from typing import Iterator
+from typing import Mapping
+from typing import Union
+from typing import Dict
+from pathlib import Path
+import numpy as np
+import faiss
+import json
+import mmap
+import time
+
+
+INDEX_FILENAME = 'index.faiss'
+DOCSTORE_FILENAME = 'docstore.jsonl'
+DOCSTORE_INDEX_FILENAME = 'docstore-index.npy'
+DOCSTORE_INDEX_DTYPE = np.dtype([('id', '<i8'), ('offset', '<i8'), ('length', '<i8')])
+# Tried in order: newer faiss maps flat and HNSW storage too (IO_FLAG_MMAP_IFC), faiss 1.7 only IVF lists
+MMAP_FLAGS = list(dict.fromkeys((faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0),
+                                 faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)))
+
+
+def write_docstore(folder: Union[str, Path], documents: Dict[int, Document]) -> None:
+    """
+    Write documents in the compact docstore format read by `MappedDocstore`.
+
+    'docstore.jsonl' holds one JSON document per line and 'docstore-index.npy' the entity IDs in
+    sorted order with the offset and length of their line.
+
+    Parameters:
+    folder (Union[str, Path]): Folder receiving the two files.
+    documents (Dict[int, Document]): Documents by entity ID.
+    """
+    folder = Path(folder)
+    index = np.zeros(len(documents), dtype=DOCSTORE_INDEX_DTYPE)
+    offset = 0
+    with open(folder / DOCSTORE_FILENAME, 'wb') as f:
+        for row, id_ in enumerate(sorted(documents)):
+            document = documents[id_]
+            line = json.dumps({'page_content': document.page_content, 'metadata': document.metadata},
+                              ensure_ascii=False).encode('utf-8') + b'\n'
+            f.write(line)
+            index[row] = (id_, offset, len(line))
+            offset += len(line)
+    np.save(folder / DOCSTORE_INDEX_FILENAME, index)
+
+
+class MappedDocstore(Docstore):
+    """
+    Read-only docstore over memory-mapped files in the format of `write_docstore`.
+
+    Opening it reads nothing but the file headers, whatever the number of documents, and every
+    process that opens the same files shares their pages. Lookups are a binary search in the ID
+    index followed by decoding one line. Keys are entity IDs as strings, like the docstores built
+    by `encode.build_vector_store`.
+    """
+
+    def __init__(self, folder: Union[str, Path]):
+        """
+        Parameters:
+        folder (Union[str, Path]): Folder holding 'docstore.jsonl' and 'docstore-index.npy'.
+        """
+        folder = Path(folder)
+        self._index = np.load(folder / DOCSTORE_INDEX_FILENAME, mmap_mode='r')
+        self._data = b''
+        if len(self._index):
+            with open(folder / DOCSTORE_FILENAME, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _row(self, id_: int) -> int:
+        row = int(np.searchsorted(self._index['id'], id_))
+        return row if row < len(self._index) and self._index['id'][row] == id_ else -1
+
+    def __contains__(self, id_: int) -> bool:
+        return self._row(int(id_)) >= 0
+
+    def ids(self) -> np.ndarray:
+        """
+        Returns the sorted entity IDs, memory-mapped.
+        """
+        return self._index['id']
+
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Look up a document by its key.
+
+        Parameters:
+        search (str): Entity ID of the document, as a string.
+
+        Returns:
+        Union[str, Document]: The document, or an error message if there is none, as InMemoryDocstore does.
+        """
+        row = self._row(int(search))
+        if row < 0:
+            return f"ID {search} not found."
+        offset, length = int(self._index['offset'][row]), int(self._index['length'][row])
+        return Document(**json.loads(self._data[offset: offset + length]))
+
+    def to_dict(self) -> Dict[str, Document]:
+        """
+        Returns every document by key, e.g. to build a mutable InMemoryDocstore.
+        """
+        return {str(id_): self.search(str(id_)) for id_ in self.ids().tolist()}
+
+
+class EntityIdMap(Mapping):
+    """
+    Read-only `index_to_docstore_id` of a store keyed by entity ID, backed by its MappedDocstore.
+
+    Index labels are entity IDs and docstore keys their string form, so no dictionary with an
+    entry per entity needs to be built at load time.
+    """
+
+    def __init__(self, docstore: MappedDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, id_: int) -> str:
+        if id_ not in self.docstore:
+            raise KeyError(id_)
+        return str(id_)
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.docstore.ids().tolist())
+
+
+def save_vector_store(vector_store: FAISS, folder: Union[str, Path]) -> None:
+    """
+    Write a vector store keyed by entity ID: the FAISS index, the compact docstore and the lexical
+    index of the entity names used by `hybrid.HybridResolver`.
+
+    Use it through `index.save_atomic`, so that readers see the index and the docstore change together.
+
+    Parameters:
+    vector_store (FAISS): Store built by `encode.build_vector_store` or updated by `update.EntityIndex`.
+    folder (Union[str, Path]): Folder receiving 'index.faiss', the docstore and the lexical index files.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vector_store.index, str(folder / INDEX_FILENAME))
+    documents = {id_: vector_store.docstore.search(key) for id_, key in vector_store.index_to_docstore_id.items()}
+    write_docstore(folder, documents)
+    LexicalIndex.build(list(documents), [document.page_content for document in documents.values()]).save(folder)
+
+
+def load_mapped(folder: Union[str, Path], embeddings: Embeddings) -> FAISS:
+    """
+    Load a vector store for querying without reading the index or the docstore into memory.
+
+    IVF indexes are memory-mapped with any faiss version, flat and HNSW indexes with faiss
+    versions that support IO_FLAG_MMAP_IFC; older versions read those into memory. The store is
+    read-only. A folder saved by `FAISS.save_local` is loaded with it instead.
+
+    Parameters:
+    folder (Union[str, Path]): Folder written by `save_vector_store`, or saved through `index.save_atomic`.
+    embeddings (Embeddings): Embedder of the queries.
+
+    Returns:
+    FAISS: The vector store.
+    """
+    folder = current_version(folder)
+    started = time.perf_counter()
+    if not (folder / DOCSTORE_INDEX_FILENAME).exists():
+        logger.info(f"No compact docstore in {folder}, loading the pickled one")
+        return FAISS.load_local(str(folder), embeddings)
+
+    error = None
+    for flags in MMAP_FLAGS:
+        try:
+            index = faiss.read_index(str(folder / INDEX_FILENAME), flags)
+            break
+        except RuntimeError as e:
+            error = e
+    else:
+        raise error
+    docstore = MappedDocstore(folder)
+    logger.info(f"Mapped {folder} with {index.ntotal} vectors in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return FAISS(embeddings.embed_query, index, docstore, EntityIdMap(docstore))
+
+
+def load_in_memory(folder: Union[str, Path], embeddings: Embeddings) -> FAISS:
+    """
+    Load a vector store fully into memory, so that it can be updated.
+
+    Parameters:
+    folder (Union[str, Path]): Folder written by `save_vector_store`, or by `FAISS.save_local`, or saved
+        through `index.save_atomic`.
+    embeddings (Embeddings): Embedder of new documents and queries.
+
+    Returns:
+    FAISS: The vector store, with an InMemoryDocstore.
+    """
+    folder = current_version(folder)
+    if not (folder / DOCSTORE_INDEX_FILENAME).exists():
+        return FAISS.load_local(str(folder), embeddings)
+    index = faiss.read_index(str(folder / INDEX_FILENAME))
+    documents = MappedDocstore(folder).to_dict()
+    return FAISS(embeddings.embed_query, index, InMemoryDocstore(documents), {int(key): key for key in documents})
+
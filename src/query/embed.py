@@ -1,47 +1,159 @@
+from google.api_core.exceptions import InternalServerError
+from google.api_core.exceptions import ServiceUnavailable
+from google.api_core.exceptions import ResourceExhausted
+from google.api_core.exceptions import DeadlineExceeded
+from concurrent.futures import ThreadPoolExecutor
 from langchain.embeddings import VertexAIEmbeddings
 from langchain.document_loaders import JSONLoader
+from concurrent.futures import as_completed
 from langchain.vectorstores import FAISS
+from src.utils.retry import RetryPolicy
 from src.config.logging import logger
 from src.config.setup import Config
+from typing import Optional
 from typing import List
+from typing import Any
 from typing import Dict
 from tqdm import tqdm
+import time
+
+
+# Errors of the embedding API that are worth retrying: quota, overload, timeouts and transient server faults
+RETRYABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError, ConnectionError)
+
+
+class EmbeddingError(RuntimeError):
+    """
+    Raised when names could not be embedded, instead of returning embeddings that no longer
+    line up with the names.
+    """
 
 
 class MyVertexAIEmbeddings(VertexAIEmbeddings):
     """
     Custom class for handling batch processing with Vertex AI embeddings.
+
+    Batches are sent concurrently, up to `max_concurrency` at a time, and a batch that fails with
+    a transient error is retried with exponential backoff. The embeddings are always returned in
+    the order of the input names; if any batch still fails, `EmbeddingError` is raised.
+
+    With a `cache` (an `EmbeddingCache`), only names and queries that were never embedded before
+    are sent to the API. `embed_documents` flushes it after every call unless `flush_cache` is off,
+    as in long-running processes embedding a few names at a time, which leave it to the cache's
+    `flush_every` and `close()`.
     """
     model_name = 'textembedding-gecko'
-    max_batch_size = 5
+    max_batch_size: int = 5
+    max_concurrency: int = 8
+    max_retries: int = 6
+    cache: Optional[Any] = None
+    flush_cache: bool = True
 
-    def embed_names(self, names: List[str]) -> List[List[float]]:
+    def _embed_batch(self, batch: List[str], policy: RetryPolicy) -> List[List[float]]:
         """
-        Embed a list of bank names using batch processing.
-        
+        Embed one batch, retrying transient errors.
+
         Parameters:
-        segments (List[str]): List of bank names to embed.
+        batch (List[str]): Names to embed in a single request.
+        policy (RetryPolicy): Retry policy for the request.
 
         Returns:
-        List[List[float]]: List of embeddings for each bank name.
+        List[List[float]]: One embedding per name, in order.
         """
-        logger.info("Starting embedding of bank names")
-        embeddings = []
-        for i in tqdm(range(0, len(names), self.max_batch_size)):
-            batch = names[i: i + self.max_batch_size]
+        for attempt in range(policy.max_retries):
             try:
-                batch_embeddings = self.client.get_embeddings(batch)
-                embeddings.extend(batch_embeddings)
-                logger.info(f"Batch {i} embedded successfully")
+                embeddings = self.client.get_embeddings(batch)
+                if len(embeddings) != len(batch):
+                    raise EmbeddingError(f"Got {len(embeddings)} embeddings for {len(batch)} names")
+                return [embedding.values for embedding in embeddings]
+            except (*RETRYABLE_ERRORS, EmbeddingError) as e:
+                if attempt + 1 == policy.max_retries:
+                    raise
+                logger.warning(f"Retry {attempt + 1}/{policy.max_retries} for a batch of {len(batch)} names. "
+                               f"Error: {type(e).__name__}")
+                time.sleep(policy.backoff(attempt))
+
+    def embed_names(self, names: List[str], batch_size: Optional[int] = None, flush: bool = True) -> List[List[float]]:
+        """
+        Embed a list of bank names, sending only those missing from the cache to the API.
+
+        Parameters:
+        names (List[str]): List of bank names to embed.
+        batch_size (int, optional): Names per request. Defaults to `max_batch_size`.
+        flush (bool): Flush the cache when new names were embedded. Otherwise they are persisted
+            by the cache's next automatic flush or `close()`.
+
+        Returns:
+        List[List[float]]: List of embeddings for each bank name, aligned with `names`.
+
+        Raises:
+        EmbeddingError: If a batch could not be embedded after all retries.
+        """
+        if self.cache is None:
+            return self._embed_batches(names, batch_size)
+
+        cached = self.cache.get(names)
+        missing = list(dict.fromkeys(name for name, vector in zip(names, cached) if vector is None))
+        logger.info(f"{len(names) - sum(vector is None for vector in cached)} of {len(names)} bank names "
+                    f"found in the embedding cache, {len(missing)} to embed")
+        fresh = {}
+        if missing:
+            embeddings = self._embed_batches(missing, batch_size)
+            self.cache.put(missing, embeddings)
+            if flush:
+                self.cache.flush()
+            fresh = dict(zip(missing, embeddings))
+        return [vector.tolist() if vector is not None else fresh[name] for name, vector in zip(names, cached)]
+
+    def _embed_batches(self, names: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Embed a list of bank names using concurrent batch processing.
+
+        Parameters:
+        names (List[str]): List of bank names to embed.
+        batch_size (int, optional): Names per request. Defaults to `max_batch_size`.
+
+        Returns:
+        List[List[float]]: List of embeddings for each bank name, aligned with `names`.
+
+        Raises:
+        EmbeddingError: If a batch could not be embedded after all retries.
+        """
+        batch_size = batch_size or self.max_batch_size
+        policy = RetryPolicy(max_retries=self.max_retries, base_delay=1.0, max_delay=60.0)
+        starts = range(0, len(names), batch_size)
+        embeddings: List[Optional[List[float]]] = [None] * len(names)
+        logger.info(f"Starting embedding of {len(names)} bank names in {len(starts)} batches, "
+                    f"{self.max_concurrency} at a time")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {executor.submit(self._embed_batch, names[i: i + batch_size], policy): i for i in starts}
+            try:
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    i = futures[future]
+                    embeddings[i: i + batch_size] = future.result()
             except Exception as e:
-                logger.error(f"Error embedding batch {i}: {e}")
-        logger.info("Completed embedding of bank names")
-        return [embedding.values for embedding in embeddings]
+                for pending in futures:
+                    pending.cancel()
+                logger.error(f"Error embedding batch {i // batch_size}: {e}")
+                raise EmbeddingError(f"Failed to embed names {i} to {min(i + batch_size, len(names)) - 1}: {e}") from e
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Completed embedding of {len(names)} bank names in {elapsed:.1f}s "
+                    f"({len(names) / elapsed if elapsed else 0:.1f} names/s)")
+        return embeddings
+
+    def embed_documents(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Embed documents, e.g. for `FAISS.from_documents`, through `embed_names`.
+        """
+        return self.embed_names(texts, batch_size, flush=self.flush_cache)
 
     def embed_query(self, query: str) -> List[float]:
         """
         Embed a single query string.
-        
+
         Parameters:
         query (str): Query string to embed.
 
@@ -49,10 +161,17 @@ class MyVertexAIEmbeddings(VertexAIEmbeddings):
         List[float]: Embedding of the query.
         """
         logger.info(f"Embedding query: {query}")
+        if self.cache is not None:
+            cached = self.cache.get([query])[0]
+            if cached is not None:
+                logger.info("Query found in the embedding cache")
+                return cached.tolist()
         try:
-            embeddings = self.client.get_embeddings([query])
+            embedding = self._embed_batch([query], RetryPolicy(max_retries=self.max_retries, base_delay=0.5))
             logger.info("Query embedded successfully")
-            return embeddings[0].values
+            if self.cache is not None:
+                self.cache.put([query], embedding)
+            return embedding[0]
         except Exception as e:
             logger.error(f"Error embedding query: {e}")
-            return []
\ No newline at end of file
+            return []
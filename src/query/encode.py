@@ -1,12 +1,44 @@
+from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.document_loaders import JSONLoader
+from src.query.cache import EMBEDDING_CACHE_FOLDER
 from src.query.embed import MyVertexAIEmbeddings
+from langchain.schema import Document
+from src.query.docstore import save_vector_store
+from src.query.cache import EmbeddingCache
 from langchain.vectorstores import FAISS
+from src.query.index import IndexConfig
+from src.query.index import build_index
+from src.query.index import save_atomic
 from src.config.logging import logger
 from src.config.setup import Config
 
+from typing import Optional
 from typing import List
 from typing import Dict
+from functools import partial
 from tqdm import tqdm
+import numpy as np
+import hashlib
+
+
+def entity_id(record: Dict) -> int:
+    """
+    Compute the stable int64 ID of a bank record, used by the vector index and the docstore.
+
+    Records may carry their own 'id', e.g. from a company master list, so that a renamed bank keeps
+    its ID. Otherwise the ID is derived from the name, country and site URL, which are unique together.
+
+    Parameters:
+    record (Dict): Record with 'bank_name', 'country' and 'site_url', and optionally 'id'.
+
+    Returns:
+    int: A non-negative 63-bit ID.
+    """
+    if record.get('id') is not None:
+        key = str(record['id'])
+    else:
+        key = '\x00'.join(str(record.get(field, '')) for field in ('bank_name', 'country', 'site_url'))
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big') >> 1
 
 
 def extract_metadata(record: Dict, metadata: Dict) -> Dict:
@@ -22,15 +54,45 @@ def extract_metadata(record: Dict, metadata: Dict) -> Dict:
     """
     metadata['country'] = record.get('country', 'Unknown')
     metadata['site_url'] = record.get('site_url', 'Unknown')
+    metadata['entity_id'] = entity_id(record)
     return metadata
 
 
-def load_and_index(file_path: str) -> FAISS:
+def build_vector_store(segments: List[Document], text_embedder: MyVertexAIEmbeddings,
+                       index_config: Optional[IndexConfig] = None) -> FAISS:
+    """
+    Embed documents and index them in a FAISS vector store of the configured index type.
+
+    Vectors and docstore entries are keyed by the 'entity_id' of each document, so that the store
+    can later be updated in place, see `update.EntityIndex`. Of several documents with the same
+    ID, the last one is kept.
+
+    Parameters:
+    segments (List[Document]): Documents to index, embedded by their page content, with an 'entity_id' in their metadata.
+    text_embedder (MyVertexAIEmbeddings): Embedder for the documents and later queries.
+    index_config (IndexConfig, optional): Index type and parameters. Defaults to an exact flat index.
+
+    Returns:
+    FAISS: FAISS vector store holding the documents.
+    """
+    segments = list({segment.metadata['entity_id']: segment for segment in segments}.values())
+    ids = [segment.metadata['entity_id'] for segment in segments]
+    embeddings = text_embedder.embed_documents([segment.page_content for segment in segments])
+    index = build_index(np.array(embeddings, dtype=np.float32), index_config, ids=ids)
+    docstore = InMemoryDocstore({str(id_): segment for id_, segment in zip(ids, segments)})
+    return FAISS(text_embedder.embed_query, index, docstore, {id_: str(id_) for id_ in ids})
+
+
+def load_and_index(file_path: str, cache_folder: Optional[str] = EMBEDDING_CACHE_FOLDER,
+                   index_config: Optional[IndexConfig] = None) -> FAISS:
     """
     Load data from JSONL file and index them in a FAISS vector store.
     
     Parameters:
     file_path (str): Path to the JSONL file.
+    cache_folder (str, optional): Embedding cache, so that only new bank names are embedded. None disables it.
+    index_config (IndexConfig, optional): Index type and parameters, e.g. IndexConfig('hnsw', ef_search=128)
+        for large entity sets. Defaults to an exact flat index.
 
     Returns:
     FAISS: FAISS vector store with loaded data.
@@ -47,11 +109,12 @@ def load_and_index(file_path: str) -> FAISS:
         logger.info("Data loaded successfully")
 
         logger.info("Initializing text embedder")
-        text_embedder = MyVertexAIEmbeddings()
+        cache = EmbeddingCache(cache_folder) if cache_folder else None
+        text_embedder = MyVertexAIEmbeddings(cache=cache)
         logger.info("Text embedder initialized")
 
-        logger.info("Creating FAISS vector store from loaded data")
-        vector_store = FAISS.from_documents(segments, text_embedder)
+        logger.info(f"Creating FAISS vector store from loaded data with {index_config or IndexConfig()}")
+        vector_store = build_vector_store(segments, text_embedder, index_config)
         logger.info("FAISS vector store created successfully")
 
         return vector_store
@@ -61,4 +124,4 @@ def load_and_index(file_path: str) -> FAISS:
 
 if __name__ == "__main__":
     vector_store = load_and_index("./src/query/banks.jsonl")
-    vector_store.save_local("./src/query/faiss_index")
\ No newline at end of file
+    save_atomic("./src/query/faiss_index", partial(save_vector_store, vector_store))
\ No newline at end of file
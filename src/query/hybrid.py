@@ -0,0 +1,147 @@
+from langchain.embeddings.base import Embeddings
+from src.query.index import current_version
+from src.query.docstore import load_mapped
+from src.query.lexical import LexicalIndex
+from langchain.vectorstores import FAISS
+from src.config.logging import logger
+from langchain.schema import Document
+from typing import Union
+from typing import Tuple
+from typing import Dict
+from typing import List
+from pathlib import Path
+import numpy as np
+
+
+# Rank offset of reciprocal rank fusion; 60 is the usual choice and keeps single lists from dominating
+RRF_K = 60
+# Lexical cosine similarity above which a match is trusted without asking the embedding API
+DEFAULT_THRESHOLD = 0.8
+
+
+class Resolution:
+    """
+    Matches of one query, as returned by `HybridResolver.resolve_batch`.
+
+    `matches` are (document, score) pairs, best first. Scores are reciprocal rank fusion scores
+    of the lexical and the vector ranking, or of the lexical ranking alone when the query took
+    the fast path. `lexical_score` is the cosine similarity of the best lexical match, and
+    `embedded` tells whether the query was sent to the embedding API.
+    """
+
+    def __init__(self, query: str, matches: List[Tuple[Document, float]], lexical_score: float, embedded: bool):
+        self.query = query
+        self.matches = matches
+        self.lexical_score = lexical_score
+        self.embedded = embedded
+
+
+class HybridResolver:
+    """
+    Resolves company names with a character n-gram TF-IDF index and the vector index together.
+
+    Every query is first looked up lexically, which is local and takes well under a millisecond.
+    If its best lexical match is at least `threshold` similar, the lexical ranking is trusted and
+    no embedding is requested. Otherwise the query is embedded, with all other such queries of the
+    batch, and the lexical and vector candidate rankings are merged by reciprocal rank fusion.
+    """
+
+    def __init__(self, vector_store: FAISS, lexical: LexicalIndex, text_embedder: Embeddings, k: int = 3,
+                 candidates: int = 20, threshold: float = DEFAULT_THRESHOLD, lexical_weight: float = 1.0,
+                 vector_weight: float = 1.0):
+        """
+        Parameters:
+        vector_store (FAISS): Vector store keyed by entity ID.
+        lexical (LexicalIndex): Lexical index of the same entities.
+        text_embedder (Embeddings): Embedder of the queries, e.g. MyVertexAIEmbeddings.
+        k (int): Number of matches per query.
+        candidates (int): Candidates taken from each ranking before fusion.
+        threshold (float): Lexical similarity that skips the embedding call. Above 1 disables the fast path.
+        lexical_weight (float): Weight of the lexical ranking in the fusion.
+        vector_weight (float): Weight of the vector ranking in the fusion.
+        """
+        self.vector_store = vector_store
+        self.lexical = lexical
+        self.text_embedder = text_embedder
+        self.k = k
+        self.candidates = max(candidates, k)
+        self.threshold = threshold
+        self.lexical_weight = lexical_weight
+        self.vector_weight = vector_weight
+        self.stats = {'queries': 0, 'fast_path': 0, 'embedded': 0}
+
+    @classmethod
+    def load(cls, folder: Union[str, Path], text_embedder: Embeddings, **kwargs) -> 'HybridResolver':
+        """
+        Memory-map a vector store saved by `docstore.save_vector_store` together with its lexical index.
+
+        Parameters:
+        folder (Union[str, Path]): Folder of the vector store.
+        text_embedder (Embeddings): Embedder of the queries.
+        **kwargs: Further arguments of HybridResolver.
+
+        Returns:
+        HybridResolver: The resolver.
+        """
+        # Resolved once, so that the vectors and the lexical index come from the same saved version
+        folder = current_version(folder)
+        vector_store = load_mapped(folder, text_embedder)
+        if LexicalIndex.exists(folder):
+            lexical = LexicalIndex.load(folder)
+        else:
+            logger.info(f"No lexical index in {folder}, building it from the docstore")
+            ids = list(vector_store.index_to_docstore_id)
+            lexical = LexicalIndex.build(ids, [cls._lookup(vector_store, id_).page_content for id_ in ids])
+        return cls(vector_store, lexical, text_embedder, **kwargs)
+
+    @staticmethod
+    def _lookup(vector_store: FAISS, id_: int) -> Document:
+        return vector_store.docstore.search(vector_store.index_to_docstore_id[id_])
+
+    def _fuse(self, rankings: List[Tuple[float, List[int]]]) -> List[Tuple[Document, float]]:
+        scores: Dict[int, float] = {}
+        for weight, ids in rankings:
+            for rank, id_ in enumerate(ids):
+                scores[id_] = scores.get(id_, 0.0) + weight / (RRF_K + rank + 1)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:self.k]
+        return [(self._lookup(self.vector_store, id_), score) for id_, score in best]
+
+    def resolve_batch(self, queries: List[str]) -> List[Resolution]:
+        """
+        Resolve several company names, embedding only those without a confident lexical match, in one batch.
+
+        Parameters:
+        queries (List[str]): Company names to resolve.
+
+        Returns:
+        List[Resolution]: The resolution of every query, aligned with `queries`.
+        """
+        lexical = [self.lexical.search(query, self.candidates) for query in queries]
+        top_scores = [matches[0][1] if matches else 0.0 for matches in lexical]
+        uncertain = [i for i, score in enumerate(top_scores) if score < self.threshold]
+
+        vector_ids = {}
+        if uncertain:
+            vectors = np.array(self.text_embedder.embed_documents([queries[i] for i in uncertain]), dtype=np.float32)
+            # Index labels are entity IDs, so candidates are only looked up in the docstore once fused
+            _, labels = self.vector_store.index.search(vectors, self.candidates)
+            for i, row in zip(uncertain, labels.tolist()):
+                vector_ids[i] = [label for label in row if label != -1]
+
+        resolutions = []
+        for i, query in enumerate(queries):
+            rankings = [(self.lexical_weight, [id_ for id_, _ in lexical[i]])]
+            if i in vector_ids:
+                rankings.append((self.vector_weight, vector_ids[i]))
+            resolutions.append(Resolution(query, self._fuse(rankings), top_scores[i], i in vector_ids))
+
+        self.stats['queries'] += len(queries)
+        self.stats['embedded'] += len(uncertain)
+        self.stats['fast_path'] += len(queries) - len(uncertain)
+        return resolutions
+
+    def resolve(self, query: str) -> Resolution:
+        """
+        Resolve one company name, see `resolve_batch`.
+        """
+        return self.resolve_batch([query])[0]
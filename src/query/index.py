@@ -0,0 +1,261 @@
+from src.config.logging import logger
+from typing import Callable
+from typing import Optional
+from typing import Sequence
+from typing import Union
+from pathlib import Path
+import numpy as np
+import shutil
+import faiss
+import math
+import time
+import os
+
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+# Training k-means on fewer than ~40 points per list gives poor centroids, faiss warns below 39
+TRAINING_POINTS_PER_LIST = 64
+# Versions saved by `save_atomic` live in '<folder>.versions', the latest behind its 'current' link
+VERSIONS_SUFFIX = '.versions'
+CURRENT_VERSION_LINK = 'current'
+
+
+class IndexConfig:
+    """
+    Type and build/search parameters of an entity vector index.
+
+    - 'flat': exact search, every query is compared with every vector.
+    - 'ivf_flat': vectors are bucketed into `nlist` k-means cells and a query scans the `nprobe`
+      closest cells. Full vectors are kept.
+    - 'ivf_pq': like 'ivf_flat', but vectors are compressed to `pq_m` codes of `pq_bits` bits,
+      which cuts memory by an order of magnitude at some cost in recall.
+    - 'hnsw': a graph with `m` links per vector, searched with a candidate list of `ef_search`.
+      Needs no training and is the fastest to query, but uses the most memory.
+
+    All of them run on CPU.
+    """
+
+    def __init__(self, kind: str = 'flat', nlist: Optional[int] = None, nprobe: int = 16, pq_m: Optional[int] = None,
+                 pq_bits: int = 8, m: int = 32, ef_construction: int = 200, ef_search: int = 64,
+                 train_size: Optional[int] = None, seed: int = 7):
+        """
+        Parameters:
+        kind (str): One of INDEX_TYPES.
+        nlist (int, optional): Number of IVF cells. Defaults to about 4 * sqrt(n), as far as the training sample allows.
+        nprobe (int): IVF cells scanned per query.
+        pq_m (int, optional): Sub-quantizers of 'ivf_pq', a divisor of the dimension. Defaults to dimension / 8, at most 64.
+        pq_bits (int): Bits per sub-quantizer code of 'ivf_pq'.
+        m (int): Links per vector of 'hnsw'.
+        ef_construction (int): Candidate list size while building 'hnsw'.
+        ef_search (int): Candidate list size while searching 'hnsw'.
+        train_size (int, optional): Vectors sampled to train IVF indexes. Defaults to TRAINING_POINTS_PER_LIST * nlist.
+        seed (int): Seed of the training sample.
+        """
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{kind}', expected one of {', '.join(INDEX_TYPES)}")
+        self.kind = kind
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.train_size = train_size
+        self.seed = seed
+
+    def __repr__(self) -> str:
+        nlist = self.nlist or 'auto'
+        params = {'ivf_flat': f'nlist={nlist}, nprobe={self.nprobe}',
+                  'ivf_pq': f'nlist={nlist}, nprobe={self.nprobe}, pq_m={self.pq_m or "auto"}, pq_bits={self.pq_bits}',
+                  'hnsw': f'm={self.m}, ef_construction={self.ef_construction}, ef_search={self.ef_search}'}
+        return f"IndexConfig({self.kind}{', ' + params[self.kind] if self.kind in params else ''})"
+
+    def resolve_nlist(self, count: int) -> int:
+        """
+        Returns the number of IVF cells for `count` vectors, never more than can be trained.
+        """
+        nlist = self.nlist or min(4 * int(math.sqrt(count)), count // TRAINING_POINTS_PER_LIST)
+        return max(1, min(nlist, count))
+
+    def resolve_pq_m(self, dim: int) -> int:
+        """
+        Returns the number of sub-quantizers, the largest divisor of `dim` not above the requested one.
+        """
+        pq_m = min(self.pq_m or min(64, max(1, dim // 8)), dim)
+        while dim % pq_m:
+            pq_m -= 1
+        return pq_m
+
+    def factory_string(self, dim: int, count: int) -> str:
+        """
+        Returns the `faiss.index_factory` description of the index for `count` vectors of dimension `dim`.
+        """
+        if self.kind == 'flat':
+            return 'Flat'
+        if self.kind == 'hnsw':
+            return f'HNSW{self.m},Flat'
+        nlist = self.resolve_nlist(count)
+        if self.kind == 'ivf_flat':
+            return f'IVF{nlist},Flat'
+        return f'IVF{nlist},PQ{self.resolve_pq_m(dim)}x{self.pq_bits}'
+
+
+def set_search_params(index: faiss.Index, config: IndexConfig) -> None:
+    """
+    Applies the search-time parameters of a config (nprobe, efSearch) to a built or loaded index.
+    """
+    base = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(config.nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.ef_search
+
+
+def build_index(vectors: np.ndarray, config: Optional[IndexConfig] = None,
+                ids: Optional[Sequence[int]] = None) -> faiss.Index:
+    """
+    Builds and fills an L2 index of the configured type, training it on a sample when needed.
+
+    With `ids`, searches return those IDs instead of row positions, and vectors can later be
+    added and removed by ID, see `add_vectors` and `remove_ids`. IVF indexes store the IDs
+    themselves; flat and HNSW indexes are wrapped in an IndexIDMap2.
+
+    Parameters:
+    vectors (np.ndarray): float32 matrix with one vector per row.
+    config (IndexConfig, optional): Index type and parameters. Defaults to an exact flat index.
+    ids (Sequence[int], optional): Unique int64 ID of every vector.
+
+    Returns:
+    faiss.Index: The filled index, with the search parameters of the config applied. An 'ivf_pq'
+        config with fewer than 2**pq_bits vectors gives a flat index, as they cannot train the quantizer.
+
+    Raises:
+    ValueError: If an IVF index is requested for no vectors.
+    """
+    config = config or IndexConfig()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if config.kind in ('ivf_flat', 'ivf_pq') and count == 0:
+        raise ValueError(f"Cannot train an {config.kind} index without vectors, build a flat index instead")
+    if config.kind == 'ivf_pq' and count < 2 ** config.pq_bits:
+        # faiss refuses to train 2**pq_bits centroids per sub-quantizer on fewer points, and so few vectors are cheap to scan
+        logger.warning(f"{count} vectors are too few to train {2 ** config.pq_bits} PQ centroids (pq_bits={config.pq_bits}), "
+                       f"building an exact flat index instead")
+        config = IndexConfig('flat')
+    description = config.factory_string(dim, count)
+    index = faiss.index_factory(dim, description, faiss.METRIC_L2)
+
+    if config.kind == 'ivf_pq':
+        # Polysemous codes are only used by Hamming-filtered search; training them dominates the build time
+        index.do_polysemous_training = False
+    if not index.is_trained:
+        nlist = config.resolve_nlist(count)
+        train_size = min(count, config.train_size or TRAINING_POINTS_PER_LIST * nlist)
+        if config.kind == 'ivf_pq':
+            # Every PQ sub-quantizer has 2**pq_bits centroids to train as well
+            train_size = min(count, max(train_size, TRAINING_POINTS_PER_LIST * 2 ** config.pq_bits))
+        sample = vectors[np.random.default_rng(config.seed).choice(count, train_size, replace=False)]
+        logger.info(f"Training {description} index on {train_size} of {count} vectors")
+        index.train(sample)
+    if config.kind == 'hnsw':
+        faiss.downcast_index(index).hnsw.efConstruction = config.ef_construction
+
+    if ids is None:
+        index.add(vectors)
+    else:
+        if not isinstance(index, faiss.IndexIVF):
+            index = faiss.IndexIDMap2(index)
+        add_vectors(index, vectors, ids)
+    set_search_params(index, config)
+    logger.info(f"Built {description} index with {index.ntotal} vectors of dimension {dim}")
+    return index
+
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray, ids: Sequence[int]) -> None:
+    """
+    Adds vectors under their IDs to an index built with IDs. The IDs must not be in the index yet.
+    """
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+
+
+def remove_ids(index: faiss.Index, ids: Sequence[int]) -> faiss.Index:
+    """
+    Removes vectors by ID from an index built with IDs.
+
+    Flat and IVF indexes remove in place. HNSW graphs cannot drop nodes, so the remaining
+    vectors are re-added to an empty copy of the graph, which takes as long as building it.
+
+    Parameters:
+    index (faiss.Index): Index built by `build_index` with IDs.
+    ids (Sequence[int]): IDs to remove. Unknown IDs are ignored.
+
+    Returns:
+    faiss.Index: The index without the vectors, either `index` itself or its rebuilt replacement.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if not isinstance(base, faiss.IndexHNSW):
+        index.remove_ids(ids)
+        return index
+
+    started = time.perf_counter()
+    stored_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(stored_ids, ids)
+    vectors = base.reconstruct_n(0, base.ntotal)
+    graph = faiss.clone_index(base)
+    graph.reset()
+    rebuilt = faiss.IndexIDMap2(graph)
+    add_vectors(rebuilt, vectors[keep], stored_ids[keep])
+    logger.info(f"Rebuilt HNSW graph without {int((~keep).sum())} vectors in {time.perf_counter() - started:.1f}s")
+    return rebuilt
+
+
+def versions_folder(folder: Union[str, Path]) -> Path:
+    """
+    Returns the directory holding the versions of `folder` written by `save_atomic`, next to it.
+    """
+    folder = Path(folder)
+    return folder.with_name(f'{folder.name}{VERSIONS_SUFFIX}')
+
+
+def current_version(folder: Union[str, Path]) -> Path:
+    """
+    Returns the directory to load `folder` from: its latest version saved by `save_atomic`, or
+    `folder` itself if it was never saved that way.
+    """
+    current = versions_folder(folder) / CURRENT_VERSION_LINK
+    return current.resolve() if current.is_dir() else Path(folder)
+
+
+def save_atomic(folder: Union[str, Path], write: Callable[[Path], None]) -> None:
+    """
+    Writes a set of files that readers must only ever see together, e.g. an index and its docstore.
+
+    The files are written by `write` into a new directory under `versions_folder(folder)`, and its
+    'current' symbolic link is then switched to it in one step. Readers resolve `folder` with
+    `current_version`; those that opened the previous version keep reading it, and the next load
+    sees the new one. `folder` itself is left untouched, since the repository tracks the initial
+    index there: it is only read while no version has been saved.
+
+    Parameters:
+    folder (Union[str, Path]): Path readers load from, e.g. './src/query/faiss_index'.
+    write (Callable[[Path], None]): Writes the files into the directory it is given.
+    """
+    versions = versions_folder(folder)
+    version = versions / str(time.time_ns())
+    version.mkdir(parents=True)
+    try:
+        write(version)
+    except Exception:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+
+    current = versions / CURRENT_VERSION_LINK
+    previous = current.resolve() if current.is_symlink() else None
+    link = versions / f'{CURRENT_VERSION_LINK}.tmp'
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.name, target_is_directory=True)
+    os.replace(link, current)
+    if previous is not None and previous != version.resolve():
+        shutil.rmtree(previous, ignore_errors=True)
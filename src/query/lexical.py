@@ -0,0 +1,136 @@
+from typing import Sequence
+from typing import Union
+from typing import Tuple
+from typing import List
+from pathlib import Path
+import numpy as np
+import unicodedata
+import zlib
+import re
+
+
+NGRAM = 3
+# Hashed n-gram buckets; company-name trigrams number in the tens of thousands, so collisions are rare
+N_FEATURES = 2 ** 18
+LEXICAL_PREFIX = 'lexical-'
+LEXICAL_ARRAYS = ('ids', 'gram_ptr', 'docs', 'weights', 'idf')
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases a name, strips accents and replaces punctuation with single spaces.
+    """
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+
+def ngram_hashes(text: str, n: int = NGRAM, n_features: int = N_FEATURES) -> np.ndarray:
+    """
+    Returns the hashed character n-grams of a normalized, space-padded name, one per occurrence.
+    """
+    padded = f' {normalize(text)} '
+    grams = [padded[i: i + n] for i in range(max(1, len(padded) - n + 1))]
+    return np.array([zlib.crc32(gram.encode('utf-8')) % n_features for gram in grams], dtype=np.int64)
+
+
+class LexicalIndex:
+    """
+    Character n-gram TF-IDF index of entity names, searched by cosine similarity.
+
+    N-grams are hashed into N_FEATURES buckets, so no vocabulary is stored. The index is kept in
+    inverted form: for every bucket, the rows of the names containing it and their normalized
+    TF-IDF weights. A query only reads the postings of its own n-grams. Arrays are saved as .npy
+    files and memory-mapped when loaded, like the vector index and the docstore.
+    """
+
+    def __init__(self, ids: np.ndarray, gram_ptr: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                 idf: np.ndarray):
+        """
+        Parameters:
+        ids (np.ndarray): Entity ID of every row.
+        gram_ptr (np.ndarray): Start of the postings of every bucket in `docs` and `weights`, plus the end.
+        docs (np.ndarray): Rows of the postings, grouped by bucket.
+        weights (np.ndarray): TF-IDF weight of every posting, normalized per row.
+        idf (np.ndarray): Inverse document frequency of every bucket.
+        """
+        self.ids = ids
+        self.gram_ptr = gram_ptr
+        self.docs = docs
+        self.weights = weights
+        self.idf = idf
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: Sequence[int], texts: Sequence[str]) -> 'LexicalIndex':
+        """
+        Build the index of some names.
+
+        Parameters:
+        ids (Sequence[int]): Entity ID of every name.
+        texts (Sequence[str]): The names.
+
+        Returns:
+        LexicalIndex: The index.
+        """
+        hashes = [ngram_hashes(text) for text in texts]
+        rows = np.repeat(np.arange(len(hashes), dtype=np.int64), [len(h) for h in hashes])
+        keys, counts = np.unique(rows * N_FEATURES + np.concatenate(hashes or [np.empty(0, np.int64)]),
+                                 return_counts=True)
+        rows, grams = keys // N_FEATURES, keys % N_FEATURES
+
+        df = np.bincount(grams, minlength=N_FEATURES)
+        idf = (np.log((1 + len(hashes)) / (1 + df)) + 1).astype(np.float32)
+        weights = (1 + np.log(counts)) * idf[grams]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(hashes)))
+        weights = (weights / norms[rows]).astype(np.float32)
+
+        order = np.argsort(grams, kind='stable')
+        gram_ptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        return cls(np.asarray(ids, dtype=np.int64), gram_ptr, rows[order].astype(np.int32), weights[order], idf)
+
+    def save(self, folder: Union[str, Path]) -> None:
+        for name in LEXICAL_ARRAYS:
+            np.save(Path(folder) / f'{LEXICAL_PREFIX}{name}.npy', getattr(self, name))
+
+    @classmethod
+    def exists(cls, folder: Union[str, Path]) -> bool:
+        return all((Path(folder) / f'{LEXICAL_PREFIX}{name}.npy').exists() for name in LEXICAL_ARRAYS)
+
+    @classmethod
+    def load(cls, folder: Union[str, Path]) -> 'LexicalIndex':
+        """
+        Memory-map an index saved by `save`.
+        """
+        return cls(*(np.load(Path(folder) / f'{LEXICAL_PREFIX}{name}.npy', mmap_mode='r') for name in LEXICAL_ARRAYS))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Find the names most similar to a query.
+
+        Parameters:
+        query (str): The name to look up, possibly misspelled.
+        k (int): Number of matches.
+
+        Returns:
+        List[Tuple[int, float]]: Entity IDs with their cosine similarity in [0, 1], most similar first.
+        """
+        grams, counts = np.unique(ngram_hashes(query), return_counts=True)
+        query_weights = (1 + np.log(counts)) * self.idf[grams]
+        query_weights /= np.linalg.norm(query_weights) or 1.0
+
+        starts, ends = self.gram_ptr[grams], self.gram_ptr[grams + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return []
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        scores = np.bincount(self.docs[positions], weights=self.weights[positions] * np.repeat(query_weights, lengths),
+                             minlength=len(self.ids))
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')][:k]
+        return [(int(self.ids[row]), float(scores[row])) for row in top]
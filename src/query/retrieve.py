@@ -1,7 +1,22 @@
+from src.query.cache import EmbeddingCache
 from src.query.embed import MyVertexAIEmbeddings
+from src.query.docstore import load_mapped
 from langchain.vectorstores import FAISS
 from src.config.logging import logger
+from langchain.schema import Document
 from src.config.setup import Config
+from itertools import islice
+from typing import Iterator
+from typing import Iterable
+from typing import Tuple
+from typing import List
+import numpy as np
+import json
+import time
+
+
+# Queries embedded and searched together; bounds memory when resolving very large inputs
+QUERY_CHUNK_SIZE = 1000
 
 
 def execute_query(query: str, retriever):
@@ -28,8 +43,117 @@ def execute_query(query: str, retriever):
         logger.error(f"Error executing query '{query}': {e}")
 
 
+def search_vectors(vectors: np.ndarray, vector_store: FAISS, k: int = 3) -> List[List[Tuple[Document, float]]]:
+    """
+    Search the index for many query vectors at once with a single matrix search.
+
+    Parameters:
+    vectors (np.ndarray): float32 matrix with one query vector per row.
+    vector_store (FAISS): Vector store to search.
+    k (int): Number of matches per query.
+
+    Returns:
+    List[List[Tuple[Document, float]]]: The matches of every query with their L2 distance, closest first.
+    """
+    distances, labels = vector_store.index.search(np.ascontiguousarray(vectors, dtype=np.float32), k)
+    results = []
+    for row_distances, row_labels in zip(distances, labels):
+        matches = []
+        for distance, label in zip(row_distances.tolist(), row_labels.tolist()):
+            if label != -1:
+                matches.append((vector_store.docstore.search(vector_store.index_to_docstore_id[label]), distance))
+        results.append(matches)
+    return results
+
+
+def iter_resolve(queries: Iterable[str], vector_store: FAISS, text_embedder: MyVertexAIEmbeddings, k: int = 3,
+                 chunk_size: int = QUERY_CHUNK_SIZE) -> Iterator[Tuple[str, List[Tuple[Document, float]]]]:
+    """
+    Resolve company names against the index, streaming results for inputs of any size.
+
+    Queries are read `chunk_size` at a time. Each chunk is embedded with concurrent batched
+    requests and searched with one matrix search, and its results are yielded before the next
+    chunk is read.
+
+    Parameters:
+    queries (Iterable[str]): Company names to resolve, e.g. the lines of a file.
+    vector_store (FAISS): Vector store to search.
+    text_embedder (MyVertexAIEmbeddings): Embedder of the queries.
+    k (int): Number of matches per query.
+    chunk_size (int): Queries embedded and searched together.
+
+    Yields:
+    Tuple[str, List[Tuple[Document, float]]]: Every query with its matches and their L2 distance, in input order.
+
+    Raises:
+    EmbeddingError: If queries could not be embedded.
+    """
+    queries = iter(queries)
+    resolved = 0
+    started = time.perf_counter()
+    while True:
+        chunk = list(islice(queries, chunk_size))
+        if not chunk:
+            break
+        vectors = np.array(text_embedder.embed_names(chunk), dtype=np.float32)
+        yield from zip(chunk, search_vectors(vectors, vector_store, k))
+        resolved += len(chunk)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Resolved {resolved} queries in {elapsed:.1f}s ({resolved / elapsed:.1f} queries/s)")
+
+
+def resolve_batch(queries: List[str], vector_store: FAISS, text_embedder: MyVertexAIEmbeddings,
+                  k: int = 3) -> List[List[Tuple[Document, float]]]:
+    """
+    Resolve a list of company names against the index.
+
+    Parameters:
+    queries (List[str]): Company names to resolve.
+    vector_store (FAISS): Vector store to search.
+    text_embedder (MyVertexAIEmbeddings): Embedder of the queries.
+    k (int): Number of matches per query.
+
+    Returns:
+    List[List[Tuple[Document, float]]]: The matches of every query with their L2 distance, aligned with `queries`.
+    """
+    return [matches for _, matches in iter_resolve(queries, vector_store, text_embedder, k)]
+
+
+def resolve_file(input_path: str, output_path: str, vector_store: FAISS, text_embedder: MyVertexAIEmbeddings,
+                 k: int = 3) -> int:
+    """
+    Resolve a file with one company name per line into a JSONL file with one result per line.
+
+    Parameters:
+    input_path (str): Text file of company names. Blank lines are skipped.
+    output_path (str): JSONL file receiving {'query', 'matches'} records, written as results arrive.
+    vector_store (FAISS): Vector store to search.
+    text_embedder (MyVertexAIEmbeddings): Embedder of the queries.
+    k (int): Number of matches per query.
+
+    Returns:
+    int: Number of queries resolved.
+    """
+    count = 0
+    with open(input_path) as queries, open(output_path, 'w') as output:
+        names = (line.strip() for line in queries if line.strip())
+        for query, matches in iter_resolve(names, vector_store, text_embedder, k):
+            output.write(json.dumps({'query': query, 'matches': [
+                {'bank_name': bank.page_content, 'country': bank.metadata.get('country'),
+                 'site_url': bank.metadata.get('site_url'), 'entity_id': bank.metadata.get('entity_id'),
+                 'distance': distance}
+                for bank, distance in matches]}) + '\n')
+            count += 1
+    return count
+
+
 if __name__ == "__main__":
-    embeddings = MyVertexAIEmbeddings()
-    vector_store = FAISS.load_local("./src/query/faiss_index", embeddings)
+    started = time.perf_counter()
+    embeddings = MyVertexAIEmbeddings(cache=EmbeddingCache())
+    vector_store = load_mapped("./src/query/faiss_index", embeddings)
+    loaded = time.perf_counter()
     retriever = vector_store.as_retriever(search_type='similarity', search_kwargs={'k': 3})
     execute_query("colmbia financial SA", retriever)
+    logger.info(f"Startup took {(loaded - started) * 1000:.1f} ms, "
+                f"first query {(time.perf_counter() - loaded) * 1000:.1f} ms")
+    embeddings.cache.close()
@@ -0,0 +1,315 @@
+from src.query.hybrid import DEFAULT_THRESHOLD
+from src.query.hybrid import HybridResolver
+from src.query.cache import EmbeddingCache
+from src.query.hybrid import Resolution
+from src.utils.telemetry import percentile
+from src.config.logging import logger
+from collections import deque
+from typing import Optional
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from aiohttp import web
+import asyncio
+import time
+
+
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+# Largest number of queries one micro-batch collects before it is resolved
+MAX_BATCH_SIZE = 64
+# Longest time the first query of a batch waits for others to join it
+MAX_BATCH_DELAY_MS = 5.0
+# Queries waiting for a batch beyond which requests are turned away with 503
+MAX_PENDING = 10000
+# Observations kept for the latency and batch-size percentiles
+METRICS_WINDOW = 10000
+
+
+class BatchMetrics:
+    """
+    Request latency and batch size statistics of the service, over the last METRICS_WINDOW observations.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.queries = 0
+        self.batches = 0
+        self.errors = 0
+        self.rejected = 0
+        self.request_ms = deque(maxlen=window)
+        self.wait_ms = deque(maxlen=window)
+        self.batch_ms = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+
+    def record_batch(self, size: int, duration_ms: float, wait_ms: List[float]) -> None:
+        self.batches += 1
+        self.queries += size
+        self.batch_sizes.append(size)
+        self.batch_ms.append(duration_ms)
+        self.wait_ms.extend(wait_ms)
+
+    def record_request(self, duration_ms: float) -> None:
+        self.requests += 1
+        self.request_ms.append(duration_ms)
+
+    @staticmethod
+    def _percentiles(values: deque) -> Dict[str, Optional[float]]:
+        values = list(values)
+        return {f'p{q}': round(percentile(values, q), 3) if values else None for q in (50, 90, 99)}
+
+    def summary(self) -> Dict[str, Any]:
+        sizes = list(self.batch_sizes)
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'queries': self.queries,
+            'batches': self.batches,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'request_ms': self._percentiles(self.request_ms),
+            'queue_wait_ms': self._percentiles(self.wait_ms),
+            'batch_ms': self._percentiles(self.batch_ms),
+            'batch_size': {'mean': round(sum(sizes) / len(sizes), 2) if sizes else None, 'max': max(sizes, default=None),
+                           **self._percentiles(self.batch_sizes)},
+        }
+
+
+class MicroBatcher:
+    """
+    Merges the queries of concurrent requests into batches for `HybridResolver.resolve_batch`.
+
+    A batch is closed when it holds `max_batch_size` queries or when its first query has waited
+    `max_batch_delay_ms`, whichever comes first. Batches are resolved one at a time in a worker
+    thread, so the event loop keeps accepting requests, and queries arriving meanwhile form the
+    next batch: under load, batches grow by themselves and the delay is rarely waited in full.
+    """
+
+    def __init__(self, resolver: HybridResolver, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_delay_ms: float = MAX_BATCH_DELAY_MS, max_pending: int = MAX_PENDING):
+        """
+        Parameters:
+        resolver (HybridResolver): Resolver kept warm by the service.
+        max_batch_size (int): Largest number of queries resolved together.
+        max_batch_delay_ms (float): Longest wait of a query for its batch to fill.
+        max_pending (int): Queued queries beyond which `submit` raises asyncio.QueueFull.
+        """
+        self.resolver = resolver
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay_ms / 1000
+        self.metrics = BatchMetrics()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    def submit(self, query: str) -> asyncio.Future:
+        """
+        Queue a query for the next batch.
+
+        Parameters:
+        query (str): Company name to resolve.
+
+        Returns:
+        asyncio.Future: Resolves to the query's Resolution, or raises the error of its batch.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, future, time.perf_counter()))
+        return future
+
+    def submit_many(self, queries: List[str]) -> List[asyncio.Future]:
+        """
+        Queue the queries of one request, all or none of them.
+
+        Parameters:
+        queries (List[str]): Company names to resolve.
+
+        Returns:
+        List[asyncio.Future]: The future of every query, see `submit`.
+        """
+        if self._queue.maxsize and self.pending + len(queries) > self._queue.maxsize:
+            raise asyncio.QueueFull()
+        return [self.submit(query) for query in queries]
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return [item for item in batch if not item[1].done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                resolutions = await loop.run_in_executor(None, self.resolver.resolve_batch,
+                                                         [query for query, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Failed to resolve a batch of {len(batch)} queries: {e}")
+                self.metrics.errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch), (time.perf_counter() - started) * 1000,
+                                      [(started - queued) * 1000 for _, _, queued in batch])
+            for (_, future, _), resolution in zip(batch, resolutions):
+                if not future.done():
+                    future.set_result(resolution)
+
+
+def resolution_record(resolution: Resolution) -> Dict[str, Any]:
+    """
+    Turn a resolution into the JSON record returned by the service.
+    """
+    return {'query': resolution.query, 'embedded': resolution.embedded,
+            'lexical_score': round(resolution.lexical_score, 4), 'matches': [
+                {'bank_name': bank.page_content, 'country': bank.metadata.get('country'),
+                 'site_url': bank.metadata.get('site_url'), 'entity_id': bank.metadata.get('entity_id'),
+                 'score': score}
+                for bank, score in resolution.matches]}
+
+
+async def handle_resolve(request: web.Request) -> web.Response:
+    """
+    POST /resolve with {"queries": [...]} returns {"results": [...]}, aligned with the queries.
+    GET /resolve?q=<name> resolves a single name.
+    """
+    started = time.perf_counter()
+    batcher: MicroBatcher = request.app['batcher']
+    if request.method == 'GET':
+        queries = request.query.getall('q', [])
+    else:
+        try:
+            queries = (await request.json())['queries']
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Expected a JSON body {"queries": [...]}')
+    if not isinstance(queries, list) or not all(isinstance(query, str) and query.strip() for query in queries):
+        raise web.HTTPBadRequest(text='Queries must be non-empty strings')
+
+    try:
+        futures = batcher.submit_many([query.strip() for query in queries])
+    except asyncio.QueueFull:
+        batcher.metrics.rejected += 1
+        raise web.HTTPServiceUnavailable(text='Too many pending queries, retry later')
+    resolutions = await asyncio.gather(*futures, return_exceptions=True)
+    errors = [resolution for resolution in resolutions if isinstance(resolution, BaseException)]
+    if errors:
+        raise web.HTTPBadGateway(text=f'Failed to resolve queries: {errors[0]}')
+    batcher.metrics.record_request((time.perf_counter() - started) * 1000)
+    return web.json_response({'results': [resolution_record(resolution) for resolution in resolutions]})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """
+    GET /metrics returns the latency and batch-size statistics, and the resolver's fast-path counts.
+    """
+    batcher: MicroBatcher = request.app['batcher']
+    return web.json_response({**batcher.metrics.summary(), 'resolver': dict(batcher.resolver.stats),
+                              'pending': batcher.pending,
+                              'max_batch_size': batcher.max_batch_size,
+                              'max_batch_delay_ms': batcher.max_batch_delay * 1000})
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok', 'entities': len(request.app['batcher'].resolver.lexical)})
+
+
+def create_app(resolver: HybridResolver, max_batch_size: int = MAX_BATCH_SIZE,
+               max_batch_delay_ms: float = MAX_BATCH_DELAY_MS, max_pending: int = MAX_PENDING) -> web.Application:
+    """
+    Build the web application around a loaded resolver.
+
+    Parameters:
+    resolver (HybridResolver): Resolver kept warm by the service.
+    max_batch_size (int): Largest number of queries resolved together.
+    max_batch_delay_ms (float): Longest wait of a query for its batch to fill.
+    max_pending (int): Queued queries beyond which requests get 503.
+
+    Returns:
+    web.Application: The application, serving /resolve, /metrics and /health.
+    """
+    app = web.Application()
+    app['batcher'] = MicroBatcher(resolver, max_batch_size, max_batch_delay_ms, max_pending)
+
+    async def start_batcher(app: web.Application) -> None:
+        app['batcher'].start()
+
+    async def stop_batcher(app: web.Application) -> None:
+        await app['batcher'].stop()
+        logger.info(f"Resolution service stopped: {app['batcher'].metrics.summary()}")
+
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+    app.router.add_post('/resolve', handle_resolve)
+    app.router.add_get('/resolve', handle_resolve)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/health', handle_health)
+    return app
+
+
+def serve(folder: str = './src/query/faiss_index', host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+          threshold: float = DEFAULT_THRESHOLD, k: int = 3, max_batch_size: int = MAX_BATCH_SIZE,
+          max_batch_delay_ms: float = MAX_BATCH_DELAY_MS) -> None:
+    """
+    Load the vector store once and serve entity resolution over HTTP until interrupted.
+
+    Parameters:
+    folder (str): Folder of the vector store, see `docstore.save_vector_store`.
+    host (str): Interface to listen on. The default only accepts local connections.
+    port (int): Port to listen on.
+    threshold (float): Lexical similarity that skips the embedding call, see `HybridResolver`.
+    k (int): Number of matches per query.
+    max_batch_size (int): Largest number of queries resolved together.
+    max_batch_delay_ms (float): Longest wait of a query for its batch to fill.
+    """
+    # Imported here so that the batching code can be used and tested without the project config
+    from src.query.embed import MyVertexAIEmbeddings
+
+    started = time.perf_counter()
+    # Every batch embeds a few new queries; the cache flushes them every `flush_every` entries and on exit
+    embeddings = MyVertexAIEmbeddings(cache=EmbeddingCache(), flush_cache=False)
+    resolver = HybridResolver.load(folder, embeddings, k=k, threshold=threshold)
+    logger.info(f"Loaded {len(resolver.lexical)} entities in {(time.perf_counter() - started) * 1000:.1f} ms, "
+                f"serving on http://{host}:{port}")
+    try:
+        web.run_app(create_app(resolver, max_batch_size, max_batch_delay_ms), host=host, port=port, print=None,
+                    access_log=None)
+    finally:
+        embeddings.cache.close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,186 @@
+from src.query.cache import EMBEDDING_CACHE_FOLDER
+from src.query.docstore import save_vector_store
+from src.query.docstore import load_in_memory
+from src.query.embed import MyVertexAIEmbeddings
+from src.query.encode import extract_metadata
+from src.query.cache import EmbeddingCache
+from langchain.vectorstores import FAISS
+from src.query.index import add_vectors
+from src.query.index import save_atomic
+from src.query.index import remove_ids
+from src.query.encode import entity_id
+from langchain.schema import Document
+from src.config.logging import logger
+from functools import partial
+from typing import Iterable
+from typing import Union
+from typing import Dict
+from pathlib import Path
+import numpy as np
+import json
+import time
+
+
+FAISS_INDEX_FOLDER = './src/query/faiss_index'
+# Metadata fields whose change makes an entity count as updated; 'source' and 'seq_num' only tell where it was loaded from
+COMPARED_METADATA = ('country', 'site_url')
+
+
+def record_document(record: Dict, source: str = '') -> Document:
+    """
+    Build the document of a bank record, as `encode.load_and_index` does.
+
+    Parameters:
+    record (Dict): Record with 'bank_name', 'country' and 'site_url', and optionally 'id'.
+    source (str): File the record was read from.
+
+    Returns:
+    Document: The document, with the bank name as page content.
+    """
+    return Document(page_content=record['bank_name'], metadata=extract_metadata(record, {'source': source}))
+
+
+class EntityIndex:
+    """
+    Adds, updates and removes the entities of a FAISS vector store by their stable ID.
+
+    The store must have been built with entity IDs, see `encode.build_vector_store`. Only new and
+    changed entities are embedded, and their vectors are added to or removed from the index in
+    place, so an update costs time proportional to what changed rather than to the whole index.
+    """
+
+    def __init__(self, vector_store: FAISS, text_embedder: MyVertexAIEmbeddings):
+        """
+        Parameters:
+        vector_store (FAISS): Vector store built with entity IDs.
+        text_embedder (MyVertexAIEmbeddings): Embedder of new and changed bank names.
+        """
+        self.vector_store = vector_store
+        self.text_embedder = text_embedder
+
+    @classmethod
+    def load(cls, folder: Union[str, Path] = FAISS_INDEX_FOLDER,
+             cache_folder: str = EMBEDDING_CACHE_FOLDER) -> 'EntityIndex':
+        """
+        Load a saved vector store for maintenance.
+
+        Parameters:
+        folder (Union[str, Path]): Folder the vector store was saved to.
+        cache_folder (str): Embedding cache of the embedder. None disables it.
+
+        Returns:
+        EntityIndex: The loaded store.
+        """
+        text_embedder = MyVertexAIEmbeddings(cache=EmbeddingCache(cache_folder) if cache_folder else None)
+        return cls(load_in_memory(folder, text_embedder), text_embedder)
+
+    def __len__(self) -> int:
+        return len(self.vector_store.index_to_docstore_id)
+
+    def __contains__(self, id_: int) -> bool:
+        return id_ in self.vector_store.index_to_docstore_id
+
+    def get(self, id_: int) -> Document:
+        return self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[id_])
+
+    def _changed(self, id_: int, document: Document) -> bool:
+        current = self.get(id_)
+        return (current.page_content != document.page_content
+                or any(current.metadata.get(key) != document.metadata.get(key) for key in COMPARED_METADATA))
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Remove entities by ID.
+
+        Parameters:
+        ids (Iterable[int]): IDs to remove. Unknown IDs are ignored.
+
+        Returns:
+        int: Number of entities removed.
+        """
+        ids = [id_ for id_ in dict.fromkeys(ids) if id_ in self]
+        if not ids:
+            return 0
+        store = self.vector_store
+        store.index = remove_ids(store.index, ids)
+        store.docstore.delete([store.index_to_docstore_id[id_] for id_ in ids])
+        for id_ in ids:
+            del store.index_to_docstore_id[id_]
+        return len(ids)
+
+    def upsert(self, documents: Iterable[Document]) -> Dict[str, int]:
+        """
+        Add new entities and replace changed ones. Unchanged entities are left alone.
+
+        Parameters:
+        documents (Iterable[Document]): Documents with an 'entity_id' in their metadata, see `record_document`.
+
+        Returns:
+        Dict[str, int]: Number of entities added, updated and unchanged.
+        """
+        documents = {document.metadata['entity_id']: document for document in documents}
+        added = [id_ for id_ in documents if id_ not in self]
+        updated = [id_ for id_ in documents if id_ in self and self._changed(id_, documents[id_])]
+        counts = {'added': len(added), 'updated': len(updated), 'unchanged': len(documents) - len(added) - len(updated)}
+        ids = added + updated
+        if not ids:
+            return counts
+
+        embeddings = self.text_embedder.embed_documents([documents[id_].page_content for id_ in ids])
+        self.remove(updated)
+        store = self.vector_store
+        add_vectors(store.index, np.array(embeddings, dtype=np.float32), ids)
+        store.docstore.add({str(id_): documents[id_] for id_ in ids})
+        store.index_to_docstore_id.update({id_: str(id_) for id_ in ids})
+        return counts
+
+    def sync(self, documents: Iterable[Document]) -> Dict[str, int]:
+        """
+        Make the store hold exactly the given entities, e.g. today's full company list.
+
+        Parameters:
+        documents (Iterable[Document]): Every entity that should be in the store.
+
+        Returns:
+        Dict[str, int]: Number of entities added, updated, unchanged and removed.
+        """
+        documents = list(documents)
+        keep = {document.metadata['entity_id'] for document in documents}
+        removed = self.remove([id_ for id_ in list(self.vector_store.index_to_docstore_id) if id_ not in keep])
+        counts = self.upsert(documents)
+        counts['removed'] = removed
+        return counts
+
+    def save(self, folder: Union[str, Path] = FAISS_INDEX_FOLDER) -> None:
+        """
+        Save the index and the docstore together, so that readers never see one without the other.
+        """
+        save_atomic(folder, partial(save_vector_store, self.vector_store))
+
+
+def sync_from_jsonl(file_path: str, folder: Union[str, Path] = FAISS_INDEX_FOLDER) -> Dict[str, int]:
+    """
+    Bring a saved vector store in line with a JSONL list of banks, like `banks.jsonl`.
+
+    Parameters:
+    file_path (str): Path to the JSONL file with the full list of banks.
+    folder (Union[str, Path]): Folder of the vector store to update.
+
+    Returns:
+    Dict[str, int]: Number of entities added, updated, unchanged and removed.
+    """
+    started = time.perf_counter()
+    entities = EntityIndex.load(folder)
+    with open(file_path) as f:
+        documents = [record_document(json.loads(line), file_path) for line in f if line.strip()]
+    counts = entities.sync(documents)
+    entities.save(folder)
+    if entities.text_embedder.cache is not None:
+        entities.text_embedder.cache.close()
+    logger.info(f"Synced {folder} with {file_path} in {time.perf_counter() - started:.1f}s: {counts['added']} added, "
+                f"{counts['updated']} updated, {counts['removed']} removed, {counts['unchanged']} unchanged")
+    return counts
+
+
+if __name__ == "__main__":
+    sync_from_jsonl("./src/query/banks.jsonl")
@@ -1,46 +1,45 @@
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import TimeoutException
+from src.scrape.driver_pool import wait_for_page_ready
+from src.scrape.driver_pool import WebDriverPool
+from src.scrape.scraper import classify_urls
+from src.scrape.fetcher import LinkFetcher
+from src.scrape.links import extract_links
 from src.config.logging import logger
 from urllib.parse import urlparse
 from urllib.parse import urljoin
-from selenium import webdriver
-from bs4 import BeautifulSoup
 from typing import Tuple
 from typing import List
 from typing import Set
 import asyncio
-import time 
 import csv
 
 
 class PDFScraper:
-    def __init__(self, webdriver_path: str):
+    def __init__(self, webdriver_path: str, pool_size: int = 10, max_uses: int = 50, page_timeout: float = 10):
         self.webdriver_path = webdriver_path
-
-    def _initialize_webdriver(self) -> webdriver.Chrome:
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        service = Service(self.webdriver_path)
-        return webdriver.Chrome(service=service, options=chrome_options)
+        self.page_timeout = page_timeout
+        self.pool = WebDriverPool(webdriver_path, size=pool_size, max_uses=max_uses, page_load_timeout=page_timeout)
 
     def _scrape_urls_from_page_sync(self, url: str) -> List[str]:
-        driver = self._initialize_webdriver()
         try:
-            logger.info(f"Opening the webpage: {url}")
-            driver.get(url)
-            time.sleep(3)  # Wait for JavaScript to load
-            html_content = driver.page_source
-            soup = BeautifulSoup(html_content, 'html.parser')
-            a_tags = soup.find_all('a', href=True)
-            urls = [tag['href'] for tag in a_tags]
+            with self.pool.driver() as driver:
+                logger.info(f"Opening the webpage: {url}")
+                try:
+                    driver.get(url)
+                except TimeoutException:
+                    logger.info(f"Page load timed out, using partial content: {url}")
+                    driver.execute_script("window.stop();")
+                wait_for_page_ready(driver, self.page_timeout)
+                html_content = driver.page_source
+            urls = extract_links(html_content)
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             urls = []
-        finally:
-            driver.quit()
         return urls
 
+    def close(self) -> None:
+        self.pool.close()
+
     def scrape_pdf_urls_sync(self, base_url: str) -> Set[str]:
         unique_pdf_urls = set()
         non_pdf_urls = set()
@@ -154,20 +153,31 @@ async def write_output_csv_async(file_path: str, data: List[Tuple[str, str, str,
         for row in data:
             writer.writerow(row)
 
+# Asynchronous two-tier page fetch: plain HTTP first, pooled Chrome only for JavaScript-rendered pages
+async def scrape_pdf_urls_tiered(base_url: str, fetcher: LinkFetcher) -> Set[str]:
+    urls = await fetcher.fetch_links(base_url)
+    return classify_urls(urls, extract_root_domain(base_url))[0]
+
+
 # Main asynchronous scraping function
 async def scrape_to_file_async(input_file_path: str, webdriver_path: str, output_file_path: str):
-    scraper = PDFScraper(webdriver_path)
+    # One pooled Chrome instance per browser worker thread
+    scraper = PDFScraper(webdriver_path, pool_size=10)
     input_data = await read_input_csv_async(input_file_path)
     output_data = []
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        tasks = [scrape_pdf_urls_async(scraper, base_url, executor) for _, base_url in input_data]
-        results = await asyncio.gather(*tasks)
-
-        for (bank, base_url), pdf_urls in zip(input_data, results):
-            for pdf_url in pdf_urls:
-                resolved_pdf_url = resolve_pdf_url(base_url, pdf_url)
-                output_data.append((bank, base_url, pdf_url, resolved_pdf_url))
+    try:
+        async with LinkFetcher(scraper._scrape_urls_from_page_sync, browser_workers=10) as fetcher:
+            tasks = [scrape_pdf_urls_tiered(base_url, fetcher) for _, base_url in input_data]
+            results = await asyncio.gather(*tasks)
+            fetcher.report()
+    finally:
+        scraper.close()
+
+    for (bank, base_url), pdf_urls in zip(input_data, results):
+        for pdf_url in pdf_urls:
+            resolved_pdf_url = resolve_pdf_url(base_url, pdf_url)
+            output_data.append((bank, base_url, pdf_url, resolved_pdf_url))
 
     await write_output_csv_async(output_file_path, output_data)
 
@@ -0,0 +1,308 @@
+from src.scrape.scraper import extract_root_domain
+from src.scrape.scraper import resolve_pdf_url
+from src.scrape.scraper import read_input_csv
+from src.scrape.scraper import PDFScraper
+from src.scrape.links import clean_pdf_link
+from src.scrape.fetcher import LinkFetcher
+from src.scrape.links import is_pdf_link
+from src.config.logging import logger
+from urllib.parse import urlunparse
+from urllib.parse import urlparse
+from urllib.parse import urlencode
+from urllib.parse import parse_qsl
+from collections import deque
+from typing import Optional
+from typing import Tuple
+from typing import Deque
+from typing import List
+from typing import Dict
+from typing import Set
+from typing import Any
+import asyncio
+import heapq
+import time
+import csv
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL so that trivially different spellings of the same page compare equal.
+
+    The scheme and host are lower-cased, default ports and fragments dropped, an empty path
+    becomes '/' and query parameters are sorted.
+
+    Args:
+        url (str): An absolute URL.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, query, ''))
+
+
+class DomainScheduler:
+    """
+    Frontier of the crawl that hands out pages per domain, so that one domain's politeness delay
+    never holds up the others.
+
+    Every domain has its own queue. A heap orders the domains with queued pages by the time their
+    next request may start, and `get` returns a page of the earliest due domain that is below its
+    concurrency limit. Workers only wait when no domain is due, never on one particular domain.
+    """
+
+    def __init__(self, concurrency: int = 2, delay: float = 0.5):
+        """
+        Args:
+            concurrency (int): Maximum in-flight requests per domain.
+            delay (float): Minimum seconds between two request starts on the same domain.
+        """
+        self.concurrency = concurrency
+        self.delay = delay
+        self._queues: Dict[str, Deque] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._next_start: Dict[str, float] = {}
+        # (ready time, sequence, domain) of the domains with queued pages and a free slot
+        self._ready: List[Tuple[float, int, str]] = []
+        self._scheduled: Set[str] = set()
+        self._sequence = 0
+        self._unfinished = 0
+        self._changed = asyncio.Condition()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def _schedule(self, domain: str) -> None:
+        if (domain not in self._scheduled and self._queues.get(domain)
+                and self._in_flight.get(domain, 0) < self.concurrency):
+            self._scheduled.add(domain)
+            self._sequence += 1
+            heapq.heappush(self._ready, (self._next_start.get(domain, 0.0), self._sequence, domain))
+
+    async def put(self, domain: str, item) -> None:
+        """
+        Queues a page of a domain.
+        """
+        async with self._changed:
+            self._queues.setdefault(domain, deque()).append(item)
+            self._unfinished += 1
+            self._finished.clear()
+            self._schedule(domain)
+            # A waiter whose timeout fires as it is notified drops the notification, so wake them all
+            self._changed.notify_all()
+
+    async def get(self) -> Tuple[str, Any]:
+        """
+        Waits until some domain may start a request and returns (domain, item) of its oldest page.
+        Call `done` once the page is processed.
+        """
+        async with self._changed:
+            while True:
+                if self._ready:
+                    wait = self._ready[0][0] - time.monotonic()
+                    if wait <= 0:
+                        _, _, domain = heapq.heappop(self._ready)
+                        self._scheduled.discard(domain)
+                        item = self._queues[domain].popleft()
+                        self._in_flight[domain] = self._in_flight.get(domain, 0) + 1
+                        self._next_start[domain] = time.monotonic() + self.delay
+                        self._schedule(domain)
+                        return domain, item
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._changed.wait()
+
+    async def done(self, domain: str) -> None:
+        """
+        Marks a page returned by `get` as processed, freeing its domain's slot.
+        """
+        async with self._changed:
+            self._in_flight[domain] -= 1
+            self._unfinished -= 1
+            self._schedule(domain)
+            self._changed.notify_all()
+            if not self._unfinished:
+                self._finished.set()
+
+    async def clear(self) -> int:
+        """
+        Drops every queued page, e.g. once the page budget is spent. Returns the number dropped.
+        """
+        async with self._changed:
+            dropped = sum(len(queue) for queue in self._queues.values())
+            self._queues.clear()
+            self._ready.clear()
+            self._scheduled.clear()
+            self._unfinished -= dropped
+            if not self._unfinished:
+                self._finished.set()
+            return dropped
+
+    async def join(self) -> None:
+        """
+        Waits until every queued page was processed.
+        """
+        await self._finished.wait()
+
+
+class PDFCrawler:
+    """
+    Asynchronous breadth-first crawler collecting PDF links from many sites at once.
+
+    All seed sites are crawled concurrently by a fixed number of workers sharing one frontier,
+    which hands out pages per domain, see `DomainScheduler`. Pages are deduplicated across the
+    whole crawl by their normalized URL, only pages on the seed's root domain are followed, and
+    each domain is throttled independently. PDFs are written to the output CSV as soon as they
+    are found.
+    """
+
+    def __init__(self, fetcher: LinkFetcher, max_depth: int = 1, max_pages: int = 10000, workers: int = 32,
+                 per_domain_concurrency: int = 2, per_domain_delay: float = 0.5):
+        """
+        Args:
+            fetcher (LinkFetcher): Fetcher returning the hrefs of a page.
+            max_depth (int): Number of hops to follow from each seed page. 1 matches `PDFScraper.scrape_pdf_urls`.
+            max_pages (int): Global budget of pages fetched across all sites.
+            workers (int): Number of pages fetched concurrently across all domains.
+            per_domain_concurrency (int): Maximum in-flight pages per domain.
+            per_domain_delay (float): Minimum seconds between two page fetches on the same domain.
+        """
+        self.fetcher = fetcher
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.workers = workers
+        self.per_domain_concurrency = per_domain_concurrency
+        self.per_domain_delay = per_domain_delay
+        self.visited: Set[str] = set()
+        self.pages_fetched = 0
+        self.pdfs_found = 0
+
+    async def crawl(self, seeds: List[Tuple[str, str]], writer: Optional[csv.writer] = None) -> List[Tuple[str, str, str, str]]:
+        """
+        Crawls every seed site and collects the PDF links found.
+
+        Args:
+            seeds (List[Tuple[str, str]]): (bank, base_url) pairs.
+            writer (csv.writer, optional): Receives one (bank, base_url, pdf_url, resolved_pdf_url) row per PDF as it is found.
+
+        Returns:
+            List[Tuple[str, str, str, str]]: The rows written, in discovery order.
+        """
+        frontier = DomainScheduler(self.per_domain_concurrency, self.per_domain_delay)
+        found: Set[Tuple[str, str]] = set()
+        rows = []
+
+        def domain_of(url: str) -> str:
+            return urlparse(url).netloc.lower()
+
+        # Banks sharing a base URL share one crawl of it; every PDF found is reported for each of them.
+        owners_by_seed: Dict[str, List[Tuple[str, str]]] = {}
+        for bank, base_url in seeds:
+            owners_by_seed.setdefault(normalize_url(base_url), []).append((bank, base_url))
+        for normalized, owners in owners_by_seed.items():
+            if normalized not in self.visited:
+                self.visited.add(normalized)
+                await frontier.put(domain_of(owners[0][1]), (tuple(owners), owners[0][1], 0))
+
+        async def worker() -> None:
+            while True:
+                domain, (owners, url, depth) = await frontier.get()
+                try:
+                    if self.pages_fetched >= self.max_pages:
+                        logger.info(f"Page budget of {self.max_pages} spent, dropping {await frontier.clear()} queued pages")
+                        continue
+                    self.pages_fetched += 1
+                    hrefs, links = await self.fetcher.fetch_page(url)
+
+                    for href in hrefs:
+                        if not is_pdf_link(href):
+                            continue
+                        pdf_url = clean_pdf_link(href)
+                        for bank, base_url in owners:
+                            resolved_pdf_url = resolve_pdf_url(base_url, pdf_url)
+                            key = (bank, normalize_url(resolved_pdf_url or pdf_url))
+                            if key in found:
+                                continue
+                            found.add(key)
+                            row = (bank, base_url, pdf_url, resolved_pdf_url)
+                            rows.append(row)
+                            self.pdfs_found += 1
+                            if writer:
+                                writer.writerow(row)
+
+                    if depth < self.max_depth:
+                        root_domain = extract_root_domain(owners[0][1])
+                        for link in links:
+                            normalized = normalize_url(link)
+                            if normalized not in self.visited and extract_root_domain(link) == root_domain:
+                                self.visited.add(normalized)
+                                await frontier.put(domain_of(link), (owners, link, depth + 1))
+                except Exception as e:
+                    logger.error(f"Failed to crawl {url}: {e}")
+                finally:
+                    await frontier.done(domain)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        await frontier.join()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info(f"Crawl finished: {self.pages_fetched} pages fetched, {len(self.visited)} URLs seen, "
+                    f"{self.pdfs_found} PDF URLs found")
+        return rows
+
+
+def crawl_to_file(input_file_path: str, webdriver_path: str, output_file_path: str, max_depth: int = 1,
+                  max_pages: int = 10000, workers: int = 32, per_domain_concurrency: int = 2,
+                  per_domain_delay: float = 0.5, browser_pool_size: int = 4):
+    """
+    Crawl the sites listed in a CSV file for PDF URLs, streaming them to another CSV file.
+
+    The output has the same columns as `scraper.scrape_to_file`.
+
+    Args:
+        input_file_path (str): Path to input CSV file with bank names and base URLs.
+        webdriver_path (str): Path to the Chrome WebDriver, used for JavaScript-rendered pages.
+        output_file_path (str): Path to save the output CSV file.
+        max_depth (int): Number of hops to follow from each base URL.
+        max_pages (int): Global budget of pages fetched.
+        workers (int): Number of pages fetched concurrently.
+        per_domain_concurrency (int): Maximum in-flight pages per domain.
+        per_domain_delay (float): Minimum seconds between two page fetches on the same domain.
+        browser_pool_size (int): Number of pooled Chrome instances for the browser fallback.
+    """
+    scraper = PDFScraper(webdriver_path, pool_size=browser_pool_size)
+    seeds = read_input_csv(input_file_path)
+
+    async def run() -> None:
+        async with LinkFetcher(scraper._scrape_urls_from_page, browser_workers=browser_pool_size,
+                               concurrency=workers) as fetcher:
+            crawler = PDFCrawler(fetcher, max_depth=max_depth, max_pages=max_pages, workers=workers,
+                                 per_domain_concurrency=per_domain_concurrency, per_domain_delay=per_domain_delay)
+            # Line buffering makes every PDF row visible in the file as soon as it is found
+            with open(output_file_path, mode='w', newline='', encoding='utf-8', buffering=1) as file:
+                writer = csv.writer(file)
+                writer.writerow(['bank', 'base_url', 'pdf_url', 'resolved_pdf_url'])
+                await crawler.crawl(seeds, writer)
+            fetcher.report()
+
+    try:
+        asyncio.run(run())
+    finally:
+        scraper.close()
+
+
+if __name__ == '__main__':
+    crawl_to_file(
+        input_file_path='./src/scrape/input_urls_1000.csv',
+        webdriver_path='./src/scrape/chromedriver',
+        output_file_path='./src/scrape/pdf_urls_1000.csv'
+    )
@@ -1,4 +1,5 @@
 from src.utils.downloader import download_from_csv
+from src.utils.store import ContentStore
 from src.config.logging import logger
 from pathlib import Path
 import asyncio
@@ -19,5 +20,8 @@ if __name__ == "__main__":
     # Create the output folder if it doesn't exist
     output_folder.mkdir(parents=True, exist_ok=True)
 
+    # Keep one copy of each unique PDF, addressed by its sha256
+    store = ContentStore(Path(script_dir, "pdf_store"))
+
     # Run the main coroutine using an asyncio event loop
-    asyncio.run(download_from_csv(csv_path, output_folder))
+    asyncio.run(download_from_csv(csv_path, output_folder, store=store))
@@ -18,5 +18,6 @@ if __name__ == "__main__":
     # Create the output folder if it doesn't exist
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    # Run the main function to synchronously download the PDF files one by one
-    download_from_csv(csv_path, output_folder)
+    # Run the main function to synchronously download the PDF files on a pool of threads, into
+    # 'pdf_files/<bank>/'. Pass store=ContentStore(...) to keep one sha256-addressed copy per PDF instead.
+    download_from_csv(csv_path, output_folder, workers=8)
@@ -0,0 +1,150 @@
+from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from src.config.logging import logger
+from contextlib import contextmanager
+from selenium import webdriver
+from typing import Iterator
+import threading
+import time
+
+
+class WebDriverPool:
+    """
+    A bounded pool of long-lived headless Chrome instances.
+
+    Starting Chrome costs a second or two, so drivers are created lazily up to `size` and handed
+    out again for later pages. A driver is quit and replaced after `max_uses` pages, to keep its
+    memory in check, or as soon as it raises a WebDriver error other than a timeout.
+    """
+
+    def __init__(self, webdriver_path: str, size: int = 1, max_uses: int = 50, page_load_timeout: float = 30):
+        """
+        Args:
+            webdriver_path (str): The path to the Chrome WebDriver executable.
+            size (int): Maximum number of concurrent Chrome instances.
+            max_uses (int): Number of pages a driver serves before it is recycled.
+            page_load_timeout (float): Seconds `driver.get` waits for a page before giving up.
+        """
+        self.webdriver_path = webdriver_path
+        self.size = size
+        self.max_uses = max_uses
+        self.page_load_timeout = page_load_timeout
+        self._idle = []
+        # Guards `_idle`, `_created` and `_closed`; notified whenever a driver is returned or a slot frees up
+        self._available = threading.Condition()
+        self._created = 0
+        self._closed = False
+
+    def _initialize_webdriver(self) -> webdriver.Chrome:
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        service = Service(self.webdriver_path)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        return driver
+
+    def _acquire(self):
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("WebDriverPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self._available.wait()
+        try:
+            return [self._initialize_webdriver(), 0]
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def _release(self, entry) -> None:
+        with self._available:
+            self._idle.append(entry)
+            self._available.notify()
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        # Frees the slot first, so a waiting thread can start a replacement right away
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Failed to quit WebDriver: {e}")
+
+    @contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        """
+        Borrows a driver from the pool, blocking while all of them are busy.
+
+        Yields:
+            webdriver.Chrome: A ready-to-use Chrome WebDriver.
+        """
+        entry = self._acquire()
+        broken = False
+        try:
+            yield entry[0]
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            entry[1] += 1
+            if broken or entry[1] >= self.max_uses or self._closed:
+                logger.info(f"Recycling WebDriver after {entry[1]} pages{' (crashed)' if broken else ''}")
+                self._discard(entry[0])
+            else:
+                self._release(entry)
+
+    def close(self) -> None:
+        """
+        Quits every idle driver. Drivers still in use are quit when they are returned.
+        """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for entry in idle:
+            self._discard(entry[0])
+
+
+def wait_for_page_ready(driver: webdriver.Chrome, timeout: float = 10, idle_time: float = 0.5) -> None:
+    """
+    Waits until the page has finished loading and its network activity has settled.
+
+    The document must first reach readyState 'complete'. After that the number of resource
+    timing entries is polled until it stops growing for `idle_time` seconds, which is when
+    scripts have usually finished fetching and rendering the link lists. Both waits share the
+    same overall `timeout`; running out of time is logged and the page is used as is.
+
+    Args:
+        driver (webdriver.Chrome): The driver that loaded the page.
+        timeout (float): Maximum number of seconds to wait in total.
+        idle_time (float): Seconds without new network requests that count as idle.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
+    except TimeoutException:
+        logger.info(f"Page did not finish loading within {timeout}s, using partial content")
+        return
+
+    count = driver.execute_script("return window.performance.getEntriesByType('resource').length")
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        current = driver.execute_script("return window.performance.getEntriesByType('resource').length")
+        if current != count:
+            count, quiet_since = current, time.monotonic()
+        elif time.monotonic() - quiet_since >= idle_time:
+            return
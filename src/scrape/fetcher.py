@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.scrape.links import DEFAULT_BACKEND
+from src.scrape.links import LinkExtractor
+from src.config.logging import logger
+from aiohttp import ClientTimeout
+from aiohttp import TCPConnector
+from typing import Optional
+from typing import Callable
+from typing import Tuple
+from typing import Dict
+from typing import List
+import aiohttp
+import asyncio
+
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/119.0 Safari/537.36')
+
+
+class LinkFetcher:
+    """
+    Two-tier link discovery: plain HTTP first, headless browser only when needed.
+
+    Pages are fetched with a pooled aiohttp session and their anchors parsed straight from the
+    server-rendered HTML by a LinkExtractor, in a process pool by default. Only pages that fail
+    to download or look JavaScript-rendered are handed to `render`, the (blocking) browser-based
+    scraper, which runs in a small thread pool. The number of pages served by each tier is kept
+    in `stats`.
+
+    Use as an async context manager:
+
+        async with LinkFetcher(scraper._scrape_urls_from_page) as fetcher:
+            urls = await fetcher.fetch_links(url)
+    """
+
+    def __init__(self, render: Callable[[str], List[str]], browser_workers: int = 1, concurrency: int = 50,
+                 per_host: int = 4, timeout: float = 15, min_anchors: int = 10,
+                 extractor: Optional[LinkExtractor] = None, backend: str = DEFAULT_BACKEND):
+        """
+        Args:
+            render (Callable[[str], List[str]]): Browser-based fallback returning the hrefs of a page.
+            browser_workers (int): Threads running the browser fallback, ideally the WebDriver pool size.
+            concurrency (int): Maximum number of open HTTP connections.
+            per_host (int): Maximum number of open HTTP connections per host.
+            timeout (float): Total timeout in seconds for a plain HTTP fetch.
+            min_anchors (int): Anchor count below which a page is escalated to the browser.
+            extractor (LinkExtractor, optional): Shared extractor. By default one is created with `backend`
+                and a process per CPU, and closed with the fetcher.
+            backend (str): Link extraction backend for the default extractor.
+        """
+        self.render = render
+        self.browser_workers = browser_workers
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.min_anchors = min_anchors
+        self.extractor = extractor
+        self.backend = backend
+        self._owns_extractor = extractor is None
+        self.stats: Dict[str, int] = {'static': 0, 'browser': 0}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    async def __aenter__(self) -> 'LinkFetcher':
+        connector = TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout),
+                                             headers={'User-Agent': USER_AGENT})
+        self.executor = ThreadPoolExecutor(max_workers=self.browser_workers)
+        if self._owns_extractor:
+            self.extractor = LinkExtractor(self.backend, min_anchors=self.min_anchors)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+        self.executor.shutdown(wait=True)
+        if self._owns_extractor:
+            self.extractor.close()
+
+    async def _fetch_static(self, url: str) -> Optional[str]:
+        """
+        Fetches a page over plain HTTP.
+
+        Returns:
+            Optional[str]: The HTML, '' for non-HTML responses, or None if the fetch failed.
+        """
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    logger.info(f"Static fetch of {url} returned {response.status}")
+                    return None
+                if 'html' not in response.headers.get('Content-Type', '').lower():
+                    return ''
+                return await response.text(errors='replace')
+        except Exception as e:
+            logger.info(f"Static fetch of {url} failed: {type(e).__name__}")
+            return None
+
+    async def fetch_page(self, url: str) -> Tuple[List[str], List[str]]:
+        """
+        Returns the hrefs found on a page, rendering it in a browser only if necessary.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            Tuple[List[str], List[str]]: The raw href values and the absolute links to other candidate pages.
+        """
+        html_content = await self._fetch_static(url)
+        if html_content == '':
+            self.stats['static'] += 1
+            return [], []
+        if html_content is not None:
+            try:
+                hrefs, links, js_rendered = await self.extractor.analyze(html_content, url)
+            except Exception as e:
+                logger.error(f"Failed to analyze {url}: {e}")
+                hrefs, links, js_rendered = [], [], True
+            if not js_rendered:
+                self.stats['static'] += 1
+                return hrefs, links
+
+        logger.info(f"Escalating to the browser: {url}")
+        self.stats['browser'] += 1
+        loop = asyncio.get_running_loop()
+        hrefs = await loop.run_in_executor(self.executor, self.render, url)
+        hrefs, links, _ = await self.extractor.analyze(None, url, hrefs)
+        return hrefs, links
+
+    async def fetch_links(self, url: str) -> List[str]:
+        """
+        Returns the raw hrefs found on a page, see `fetch_page`.
+        """
+        return (await self.fetch_page(url))[0]
+
+    def report(self) -> Dict[str, float]:
+        """
+        Logs and returns how many pages each tier served.
+
+        Returns:
+            Dict[str, float]: Page counts per tier and the share served statically.
+        """
+        total = sum(self.stats.values())
+        static_share = self.stats['static'] / total if total else 0.0
+        logger.info(f"Pages fetched: {total} ({self.stats['static']} static, {self.stats['browser']} browser, "
+                    f"{static_share:.1%} served without a browser)")
+        return {**self.stats, 'static_share': static_share}
@@ -0,0 +1,221 @@
+from concurrent.futures import ProcessPoolExecutor
+from src.config.logging import logger
+from urllib.parse import urlparse
+from urllib.parse import urljoin
+from html import unescape
+from bs4 import BeautifulSoup
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import List
+from typing import Dict
+import asyncio
+import re
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+except ImportError:  # pragma: no cover - lxml is optional, the regex backend needs no parser
+    lxml = None
+    ParserError = ValueError
+
+
+# Links with these extensions are never HTML pages worth fetching.
+SKIPPED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.css', '.js', '.zip', '.xls', '.xlsx',
+                      '.doc', '.docx', '.ppt', '.pptx', '.mp3', '.mp4', '.xml', '.ico')
+
+# Fingerprints of single-page applications whose server-rendered HTML carries no real content.
+SPA_MARKERS = (
+    '<div id="root"></div>',
+    '<div id="app"></div>',
+    '<app-root',
+    'ng-app',
+    'data-reactroot',
+    '__NEXT_DATA__',
+    'window.__NUXT__',
+    'enable javascript',
+    'requires javascript',
+)
+
+HREF_PATTERN = re.compile(r'''<a\s(?:[^>]*?\s)?href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+
+
+def extract_hrefs_html_parser(html_content: str) -> List[str]:
+    """
+    Extracts anchor hrefs with BeautifulSoup and Python's html.parser (the original, slowest backend).
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+    return [tag['href'] for tag in soup.find_all('a', href=True)]
+
+
+def extract_hrefs_lxml(html_content: str) -> List[str]:
+    """
+    Extracts anchor hrefs with lxml's C HTML parser.
+
+    Responses without any element, e.g. only a comment or an XML declaration, make lxml raise
+    'Document is empty'; they have no links.
+    """
+    if not html_content.strip():
+        return []
+    try:
+        try:
+            tree = lxml.html.fromstring(html_content)
+        except ValueError:
+            # lxml refuses str input that carries an XML encoding declaration
+            tree = lxml.html.fromstring(html_content.encode('utf-8'))
+    except (ParserError, ValueError) as e:
+        logger.info(f"lxml could not parse the page, treating it as having no links: {e}")
+        return []
+    return [str(href) for href in tree.xpath('//a/@href')]
+
+
+def extract_hrefs_regex(html_content: str) -> List[str]:
+    """
+    Extracts anchor hrefs with a streaming regular-expression tokenizer.
+
+    It never builds a document tree, which makes it the fastest backend, at the cost of missing
+    anchors whose attributes contain a literal '>' and picking up anchors written inside scripts
+    or comments.
+    """
+    return [unescape(next(group for group in match.groups() if group is not None))
+            for match in HREF_PATTERN.finditer(html_content)]
+
+
+BACKENDS: Dict[str, Callable[[str], List[str]]] = {
+    'html.parser': extract_hrefs_html_parser,
+    'regex': extract_hrefs_regex,
+}
+if lxml is not None:
+    BACKENDS['lxml'] = extract_hrefs_lxml
+
+DEFAULT_BACKEND = 'lxml' if lxml is not None else 'regex'
+
+
+def extract_links(html_content: str, backend: str = DEFAULT_BACKEND) -> List[str]:
+    """
+    Extracts the href of every anchor in an HTML document.
+
+    Args:
+        html_content (str): The HTML document.
+        backend (str): One of 'lxml', 'regex' or 'html.parser'.
+
+    Returns:
+        List[str]: The raw href values, in document order.
+    """
+    try:
+        extractor = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown link extraction backend '{backend}', expected one of {sorted(BACKENDS)}")
+    return extractor(html_content)
+
+
+def is_pdf_link(href: str) -> bool:
+    return href.endswith('.pdf') or ('.pdf' in href and 'inline' in href)
+
+
+def clean_pdf_link(href: str) -> str:
+    return href.split('?')[0] if 'inline' in href else href
+
+
+def looks_js_rendered(html_content: str, hrefs: List[str], min_anchors: int = 10) -> bool:
+    """
+    Guesses whether a page needs a browser to show its links.
+
+    Args:
+        html_content (str): The server-rendered HTML.
+        hrefs (List[str]): The hrefs found in that HTML.
+        min_anchors (int): Pages with fewer anchors are assumed to build their links in JavaScript.
+
+    Returns:
+        bool: True if the page should be rendered in a browser.
+    """
+    if len(hrefs) < min_anchors:
+        return True
+    lowered = html_content.lower()
+    return any(marker.lower() in lowered for marker in SPA_MARKERS)
+
+
+def page_links(page_url: str, hrefs: List[str]) -> List[str]:
+    """
+    Resolves the non-PDF hrefs of a page to absolute http(s) URLs that may be HTML pages.
+
+    Args:
+        page_url (str): The URL of the page the hrefs were found on.
+        hrefs (List[str]): The raw hrefs.
+
+    Returns:
+        List[str]: Absolute URLs, without PDFs, mail/script links and obvious static assets.
+    """
+    links = []
+    for href in hrefs:
+        if is_pdf_link(href) or href.startswith(('mailto:', 'javascript:', 'tel:', '#')):
+            continue
+        url = urljoin(page_url, href)
+        if url.startswith('http') and not urlparse(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+            links.append(url)
+    return links
+
+
+def analyze_page(html_content: Optional[str], page_url: str, backend: str = DEFAULT_BACKEND,
+                 min_anchors: int = 10, hrefs: Optional[List[str]] = None) -> Tuple[List[str], List[str], bool]:
+    """
+    Parses and classifies one page. Pure and picklable, so it can run in a worker process.
+
+    Args:
+        html_content (Optional[str]): The HTML document, or None if `hrefs` are already known.
+        page_url (str): The URL of the page.
+        backend (str): Link extraction backend.
+        min_anchors (int): Anchor count below which the page is considered JavaScript-rendered.
+        hrefs (List[str], optional): Hrefs extracted elsewhere, e.g. by the browser fallback.
+
+    Returns:
+        Tuple[List[str], List[str], bool]: The raw hrefs, the absolute candidate page links and
+        whether the page looks JavaScript-rendered.
+    """
+    if hrefs is None:
+        try:
+            hrefs = extract_links(html_content, backend)
+        except (ParserError, ValueError) as e:
+            # An unparseable page may still render in a browser, so it is escalated
+            logger.info(f"Failed to parse {page_url}, escalating to the browser: {e}")
+            return [], [], True
+    js_rendered = html_content is not None and looks_js_rendered(html_content, hrefs, min_anchors)
+    return hrefs, page_links(page_url, hrefs), js_rendered
+
+
+class LinkExtractor:
+    """
+    Runs `analyze_page` in a process pool so HTML parsing is not serialized by the GIL.
+
+    With `processes=0` pages are analyzed inline on the calling thread, which is faster for a
+    handful of small pages.
+    """
+
+    def __init__(self, backend: str = DEFAULT_BACKEND, processes: Optional[int] = None, min_anchors: int = 10):
+        """
+        Args:
+            backend (str): Link extraction backend, see `BACKENDS`.
+            processes (int, optional): Worker processes. Defaults to the number of CPUs; 0 disables the pool.
+            min_anchors (int): Anchor count below which a page is considered JavaScript-rendered.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown link extraction backend '{backend}', expected one of {sorted(BACKENDS)}")
+        self.backend = backend
+        self.min_anchors = min_anchors
+        self.pool = ProcessPoolExecutor(max_workers=processes) if processes != 0 else None
+        logger.info(f"Link extraction backend: {backend}, processes: {processes if processes is not None else 'cpu count'}")
+
+    async def analyze(self, html_content: Optional[str], page_url: str,
+                      hrefs: Optional[List[str]] = None) -> Tuple[List[str], List[str], bool]:
+        """
+        Asynchronously analyzes a page, see `analyze_page`.
+        """
+        if self.pool is None:
+            return analyze_page(html_content, page_url, self.backend, self.min_anchors, hrefs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, analyze_page, html_content, page_url,
+                                          self.backend, self.min_anchors, hrefs)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
@@ -1,14 +1,15 @@
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
+from src.scrape.driver_pool import wait_for_page_ready
+from src.scrape.driver_pool import WebDriverPool
+from src.scrape.fetcher import LinkFetcher
+from src.scrape.links import extract_links
 from src.config.logging import logger
 from urllib.parse import urlparse
 from urllib.parse import urljoin
-from selenium import webdriver
-from bs4 import BeautifulSoup
 from typing import Tuple
 from typing import List
 from typing import Set
-import time
+import asyncio
 import csv 
 
 class PDFScraper:
@@ -16,26 +17,19 @@ class PDFScraper:
     A class to scrape PDF URLs from webpages.
     """
 
-    def __init__(self, webdriver_path: str):
+    def __init__(self, webdriver_path: str, pool_size: int = 1, max_uses: int = 50, page_timeout: float = 10):
         """
         Initializes the PDFScraper with a path to the Chrome WebDriver.
 
         Args:
         webdriver_path (str): The path to the Chrome WebDriver executable.
+        pool_size (int): Number of Chrome instances kept alive and reused across pages.
+        max_uses (int): Number of pages a Chrome instance serves before it is restarted.
+        page_timeout (float): Maximum seconds to wait for a page to load and settle.
         """
         self.webdriver_path = webdriver_path
-
-    def _initialize_webdriver(self) -> webdriver.Chrome:
-        """
-        Initializes and returns a Chrome WebDriver.
-
-        Returns:
-        webdriver.Chrome: The initialized Chrome WebDriver.
-        """
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        service = Service(self.webdriver_path)
-        return webdriver.Chrome(service=service, options=chrome_options)
+        self.page_timeout = page_timeout
+        self.pool = WebDriverPool(webdriver_path, size=pool_size, max_uses=max_uses, page_load_timeout=page_timeout)
 
     def _scrape_urls_from_page(self, url: str) -> List[str]:
         """
@@ -47,22 +41,28 @@ class PDFScraper:
         Returns:
         List[str]: A list of found URLs.
         """
-        driver = self._initialize_webdriver()
         try:
-            logger.info(f"Opening the webpage: {url}")
-            driver.get(url)
-            time.sleep(3)  # Wait for JavaScript to load
-            html_content = driver.page_source
-            soup = BeautifulSoup(html_content, 'html.parser')
-            a_tags = soup.find_all('a', href=True)
-            urls = [tag['href'] for tag in a_tags]
+            with self.pool.driver() as driver:
+                logger.info(f"Opening the webpage: {url}")
+                try:
+                    driver.get(url)
+                except TimeoutException:
+                    logger.info(f"Page load timed out, using partial content: {url}")
+                    driver.execute_script("window.stop();")
+                wait_for_page_ready(driver, self.page_timeout)
+                html_content = driver.page_source
+            urls = extract_links(html_content)
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             urls = []
-        finally:
-            driver.quit()
         return urls
 
+    def close(self) -> None:
+        """
+        Shuts down the pooled Chrome instances.
+        """
+        self.pool.close()
+
     def scrape_pdf_urls(self, base_url: str) -> Set[str]:
         """
         Scrape all PDF URLs from a given base URL.
@@ -73,34 +73,67 @@ class PDFScraper:
         Returns:
         Set[str]: A set of unique PDF URLs.
         """
-        unique_pdf_urls = set()
-        non_pdf_urls = set()
-        urls = self._scrape_urls_from_page(base_url)
         root_domain = extract_root_domain(base_url)
-
-        for url in urls:
-            if url.endswith(".pdf") and not "inline" in url:
-                unique_pdf_urls.add(url)
-            elif ".pdf" in url and 'inline' in url:
-                pdf_url = url.split('?')[0]
-                unique_pdf_urls.add(pdf_url)
-            elif ".pdf" not in url and url.startswith("http"):
-                domain = extract_root_domain(url)
-                if domain == root_domain:
-                    non_pdf_urls.add(url)
+        urls = self._scrape_urls_from_page(base_url)
+        unique_pdf_urls, non_pdf_urls = classify_urls(urls, root_domain)
 
         # Perform one more hop of scraping
         for non_pdf_url in non_pdf_urls:
             urls = self._scrape_urls_from_page(non_pdf_url)
-            for url in urls:
-                if url.endswith(".pdf") and not "inline" in url:
-                    unique_pdf_urls.add(url)
-                elif ".pdf" in url and 'inline' in url:
-                    pdf_url = url.split('?')[0]
-                    unique_pdf_urls.add(pdf_url)
+            unique_pdf_urls |= classify_urls(urls, root_domain)[0]
 
         return unique_pdf_urls
 
+    async def scrape_pdf_urls_async(self, base_url: str, fetcher: LinkFetcher) -> Set[str]:
+        """
+        Scrape all PDF URLs from a given base URL, fetching pages through a two-tier LinkFetcher.
+
+        Same result as `scrape_pdf_urls`, but pages are only rendered in Chrome when their
+        server-rendered HTML does not carry the links, and the second hop runs concurrently.
+
+        Args:
+        base_url (str): The base URL to start scraping from.
+        fetcher (LinkFetcher): The fetcher used for every page.
+
+        Returns:
+        Set[str]: A set of unique PDF URLs.
+        """
+        root_domain = extract_root_domain(base_url)
+        urls = await fetcher.fetch_links(base_url)
+        unique_pdf_urls, non_pdf_urls = classify_urls(urls, root_domain)
+
+        # Perform one more hop of scraping
+        for urls in await asyncio.gather(*[fetcher.fetch_links(url) for url in non_pdf_urls]):
+            unique_pdf_urls |= classify_urls(urls, root_domain)[0]
+
+        return unique_pdf_urls
+
+
+def classify_urls(urls: List[str], root_domain: str) -> Tuple[Set[str], Set[str]]:
+    """
+    Splits the hrefs of a page into PDF links and same-site pages worth another hop.
+
+    Args:
+        urls (List[str]): The hrefs found on a page.
+        root_domain (str): Root domain of the site being scraped, as returned by `extract_root_domain`.
+
+    Returns:
+        Tuple[Set[str], Set[str]]: The PDF URLs and the same-domain non-PDF URLs.
+    """
+    pdf_urls = set()
+    non_pdf_urls = set()
+    for url in urls:
+        if url.endswith(".pdf") and not "inline" in url:
+            pdf_urls.add(url)
+        elif ".pdf" in url and 'inline' in url:
+            pdf_url = url.split('?')[0]
+            pdf_urls.add(pdf_url)
+        elif ".pdf" not in url and url.startswith("http"):
+            domain = extract_root_domain(url)
+            if domain == root_domain:
+                non_pdf_urls.add(url)
+    return pdf_urls, non_pdf_urls
+
 
 def read_input_csv(file_path: str) -> List[Tuple[str, str]]:
     """
@@ -198,6 +231,9 @@ def scrape_to_file(input_file_path: str, webdriver_path: str, output_file_path:
     """
     Scrape PDF URLs from base URLs in a CSV file and save them to another CSV file.
 
+    Pages are fetched over plain HTTP where possible and rendered in Chrome only when they
+    look JavaScript-rendered. The share of pages served by each tier is logged at the end.
+
     Args:
         input_file_path (str): Path to input CSV file with bank names and base URLs.
         webdriver_path (str): Path to the Chrome WebDriver.
@@ -205,14 +241,23 @@ def scrape_to_file(input_file_path: str, webdriver_path: str, output_file_path:
     """
     scraper = PDFScraper(webdriver_path)
     input_data = read_input_csv(input_file_path)
-    output_data = []
 
-    for bank, base_url in input_data:
-        pdf_urls = scraper.scrape_pdf_urls(base_url)
+    async def scrape_all() -> List[Tuple[str, str, str, str]]:
+        output_data = []
+        async with LinkFetcher(scraper._scrape_urls_from_page, browser_workers=scraper.pool.size) as fetcher:
+            for bank, base_url in input_data:
+                pdf_urls = await scraper.scrape_pdf_urls_async(base_url, fetcher)
 
-        for pdf_url in pdf_urls:
-            resolved_pdf_url = resolve_pdf_url(base_url, pdf_url)
-            output_data.append((bank, base_url, pdf_url, resolved_pdf_url))
+                for pdf_url in pdf_urls:
+                    resolved_pdf_url = resolve_pdf_url(base_url, pdf_url)
+                    output_data.append((bank, base_url, pdf_url, resolved_pdf_url))
+            fetcher.report()
+        return output_data
+
+    try:
+        output_data = asyncio.run(scrape_all())
+    finally:
+        scraper.close()
 
     logger.info(f"Total number of unique PDF URLs found: {len(output_data)}")
     write_output_csv(output_file_path, output_data)
@@ -0,0 +1,208 @@
+from src.scrape.scraper import extract_root_domain
+from xml.etree.ElementTree import XMLPullParser
+from src.scrape.scraper import read_input_csv
+from src.scrape.crawler import PDFCrawler
+from src.scrape.scraper import PDFScraper
+from src.scrape.fetcher import LinkFetcher
+from src.scrape.fetcher import USER_AGENT
+from src.config.logging import logger
+from aiohttp import ClientTimeout
+from aiohttp import TCPConnector
+from urllib.parse import urlparse
+from typing import AsyncIterator
+from typing import Optional
+from typing import Tuple
+from typing import List
+import aiohttp
+import asyncio
+import zlib
+import csv
+
+
+CHUNK_SIZE = 64 * 1024
+FALLBACK_SITEMAPS = ('/sitemap.xml', '/sitemap_index.xml')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def is_pdf_url(url: str) -> bool:
+    return urlparse(url).path.lower().endswith('.pdf')
+
+
+async def sitemap_locations(session: aiohttp.ClientSession, base_url: str) -> List[str]:
+    """
+    Finds the sitemaps of a site from the 'Sitemap:' lines of its robots.txt.
+
+    Falls back to the conventional /sitemap.xml and /sitemap_index.xml locations when robots.txt
+    is missing or lists none.
+
+    Args:
+        session (aiohttp.ClientSession): The HTTP session.
+        base_url (str): Any URL on the site.
+
+    Returns:
+        List[str]: Candidate sitemap URLs.
+    """
+    root = extract_root_domain(base_url)
+    locations = []
+    try:
+        async with session.get(f'{root}/robots.txt') as response:
+            if response.status == 200:
+                for line in (await response.text(errors='replace')).splitlines():
+                    if line.lower().startswith('sitemap:'):
+                        locations.append(line.split(':', 1)[1].strip())
+    except Exception as e:
+        logger.info(f"Could not read robots.txt of {root}: {type(e).__name__}")
+    return locations or [root + path for path in FALLBACK_SITEMAPS]
+
+
+async def iter_sitemap(session: aiohttp.ClientSession, url: str) -> AsyncIterator[Tuple[str, str, Optional[str]]]:
+    """
+    Streams the entries of one sitemap or sitemap index, gzip-compressed or not.
+
+    The response body is decompressed and parsed incrementally, so even sitemaps of tens of
+    megabytes are processed in constant memory.
+
+    Args:
+        session (aiohttp.ClientSession): The HTTP session.
+        url (str): The sitemap URL.
+
+    Yields:
+        Tuple[str, str, Optional[str]]: ('url' or 'sitemap', loc, lastmod) for every entry.
+    """
+    async with session.get(url) as response:
+        if response.status != 200:
+            logger.info(f"Sitemap {url} returned {response.status}")
+            return
+
+        parser = XMLPullParser(events=('end',))
+        decompressor = None
+        first = True
+        loc = lastmod = None
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            if first:
+                # Many servers send .xml.gz without Content-Encoding, so sniff the gzip magic bytes
+                if chunk[:2] == b'\x1f\x8b':
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                first = False
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+
+            for _, element in parser.read_events():
+                name = _local_name(element.tag)
+                if name == 'loc':
+                    loc = (element.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = (element.text or '').strip()
+                elif name in ('url', 'sitemap'):
+                    if loc:
+                        yield name, loc, lastmod
+                    loc = lastmod = None
+                    element.clear()
+
+
+async def discover_pdfs(session: aiohttp.ClientSession, base_url: str,
+                        max_sitemaps: int = 50) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """
+    Collects the PDF URLs listed in a site's sitemaps, following sitemap indexes.
+
+    Args:
+        session (aiohttp.ClientSession): The HTTP session.
+        base_url (str): Any URL on the site.
+        max_sitemaps (int): Maximum number of sitemap files read for the site.
+
+    Returns:
+        Optional[List[Tuple[str, Optional[str]]]]: (pdf_url, lastmod) pairs, or None if the site
+        has no readable sitemap or its sitemaps list no PDFs, e.g. because they only list HTML
+        pages, so that it is crawled instead.
+    """
+    pending = await sitemap_locations(session, base_url)
+    seen = set(pending)
+    pdfs = {}
+    found_sitemap = False
+
+    while pending and len(seen) - len(pending) < max_sitemaps:
+        url = pending.pop(0)
+        try:
+            async for kind, loc, lastmod in iter_sitemap(session, url):
+                found_sitemap = True
+                if kind == 'sitemap' and loc not in seen:
+                    seen.add(loc)
+                    pending.append(loc)
+                elif kind == 'url' and is_pdf_url(loc):
+                    pdfs[loc] = lastmod
+        except Exception as e:
+            logger.error(f"Failed to read sitemap {url}: {e}")
+
+    if not found_sitemap:
+        return None
+    if not pdfs:
+        logger.info(f"The sitemaps of {base_url} list no PDFs, falling back to crawling")
+        return None
+    logger.info(f"Found {len(pdfs)} PDFs in the sitemaps of {base_url}")
+    return list(pdfs.items())
+
+
+def discover_to_file(input_file_path: str, output_file_path: str, webdriver_path: Optional[str] = None,
+                     concurrency: int = 20, max_sitemaps: int = 50, crawl_depth: int = 1):
+    """
+    Discover PDF URLs from sitemaps for every site in a CSV file, crawling the sites whose sitemaps list no PDFs.
+
+    The output has the columns of `scraper.scrape_to_file` plus 'lastmod' (empty for crawled
+    PDFs), so it can be passed to the downloaders unchanged.
+
+    Args:
+        input_file_path (str): Path to input CSV file with bank names and base URLs.
+        output_file_path (str): Path to save the output CSV file.
+        webdriver_path (str, optional): Path to the Chrome WebDriver. Without it, sites whose sitemaps list no PDFs are skipped.
+        concurrency (int): Number of sites processed at once.
+        max_sitemaps (int): Maximum number of sitemap files read per site.
+        crawl_depth (int): Crawl depth for sites without a sitemap.
+    """
+    input_data = read_input_csv(input_file_path)
+
+    async def run() -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = TCPConnector(limit=concurrency * 2, limit_per_host=4, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, timeout=ClientTimeout(total=120),
+                                         headers={'User-Agent': USER_AGENT}) as session:
+
+            async def discover(base_url: str):
+                async with semaphore:
+                    return await discover_pdfs(session, base_url, max_sitemaps)
+
+            results = await asyncio.gather(*[discover(base_url) for _, base_url in input_data])
+
+        # Line buffering makes every PDF row visible in the file as soon as it is found
+        with open(output_file_path, mode='w', newline='', encoding='utf-8', buffering=1) as file:
+            writer = csv.writer(file)
+            writer.writerow(['bank', 'base_url', 'pdf_url', 'resolved_pdf_url', 'lastmod'])
+            without_sitemap = []
+            for (bank, base_url), pdfs in zip(input_data, results):
+                if pdfs is None:
+                    without_sitemap.append((bank, base_url))
+                    continue
+                for pdf_url, lastmod in pdfs:
+                    writer.writerow((bank, base_url, pdf_url, pdf_url, lastmod or ''))
+
+            logger.info(f"{len(input_data) - len(without_sitemap)} sites served by sitemaps, "
+                        f"{len(without_sitemap)} without a sitemap listing PDFs")
+            if without_sitemap and webdriver_path:
+                scraper = PDFScraper(webdriver_path, pool_size=4)
+                try:
+                    async with LinkFetcher(scraper._scrape_urls_from_page, browser_workers=4) as fetcher:
+                        await PDFCrawler(fetcher, max_depth=crawl_depth).crawl(without_sitemap, writer)
+                        fetcher.report()
+                finally:
+                    scraper.close()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    discover_to_file(
+        input_file_path='./src/scrape/input_urls_1000.csv',
+        output_file_path='./src/scrape/pdf_urls_1000.csv',
+        webdriver_path='./src/scrape/chromedriver'
+    )
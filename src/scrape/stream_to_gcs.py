@@ -0,0 +1,276 @@
+from src.scrape.upload_with_metadata import initialize_gcs_client
+from src.scrape.upload_with_metadata import upload_json
+from src.scrape.upload_with_metadata import METADATA_FOLDER
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.retry import RETRYABLE_STATUS_CODES
+from src.utils.preflight import SKIP_LOG_FILENAME
+from src.utils.metadata import document_json_data
+from src.utils.metadata import metadata_record
+from src.utils.metadata import write_metadata
+from src.utils.metadata import content_id
+from google.cloud.storage.retry import DEFAULT_RETRY
+from src.utils.sync_downloader import get_session
+from src.utils.telemetry import RunTelemetry
+from src.utils.retry import CircuitBreaker
+from src.utils.resumable import cancel_upload
+from src.utils.storage import GCSStorage
+from src.utils.preflight import Preflight
+from src.utils.preflight import log_skip
+from src.utils.retry import RetryPolicy
+from src.utils.preflight import SkipLog
+from src.utils.manifest import CHUNK_SIZE
+from src.config.logging import logger
+from src.config.setup import config
+from typing import Optional
+from typing import Union
+from typing import Dict
+from typing import List
+from pathlib import Path
+import threading
+import requests
+import hashlib
+import time
+import uuid
+import csv
+
+
+INCOMING_PREFIX = 'incoming/'
+# Bytes buffered per transfer before they are sent as one resumable upload request (a multiple of 256 KB)
+UPLOAD_BUFFER_SIZE = 8 * 1024 * 1024
+TELEMETRY_FILENAME = 'stream-run.jsonl'
+
+
+class StreamingPipeline:
+    """
+    Streams PDFs from their URLs straight into GCS, without touching the local disk.
+
+    Each response body is written to a resumable upload under 'incoming/' through a buffer of
+    `buffer_size` bytes while its sha256 is computed. It is then rewritten server-side to
+    '<sha256>.pdf', the layout of `upload_with_metadata.upload_store`. A document already in the
+    bucket is not copied again. Downloads are retried with the same policy, circuit breaker and
+    preflight checks as the downloaders. A failed transfer is restarted from the first byte and
+    its upload is abandoned without creating an object.
+    """
+
+    def __init__(self, client, policy: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 preflight: Optional[Preflight] = None, telemetry: Optional[RunTelemetry] = None,
+                 skip_log: Optional[SkipLog] = None, buffer_size: int = UPLOAD_BUFFER_SIZE,
+                 timeout_duration: int = 30):
+        """
+        Args:
+            client (google.cloud.storage.client.Client): Initialized GCS client.
+            policy (RetryPolicy, optional): Retry policy for downloads. Defaults to `RetryPolicy()`.
+            breaker (CircuitBreaker, optional): Per-host circuit breaker. Defaults to a fresh one.
+            preflight (Preflight, optional): Pre-flight checks. Defaults to `Preflight()`.
+            telemetry (RunTelemetry, optional): Run log receiving one record per URL.
+            skip_log (SkipLog, optional): Receives the URLs rejected by the preflight.
+            buffer_size (int): Upload buffer per transfer in bytes, a multiple of 256 KB.
+            timeout_duration (int): Timeout in seconds for connecting and for each read.
+        """
+        self.bucket = client.bucket(config.DOC_SEARCH_BUCKET)
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.preflight = preflight or Preflight()
+        self.telemetry = telemetry
+        self.skip_log = skip_log
+        self.buffer_size = buffer_size
+        self.timeout_duration = timeout_duration
+        self.documents: Dict[str, List[dict]] = {}
+        self._existing = {info.name for info in GCSStorage(config.DOC_SEARCH_BUCKET, client).list()
+                          if info.name.endswith('.pdf')}
+        self._lock = threading.Lock()
+
+    def _commit(self, incoming, sha256: str) -> None:
+        """
+        Moves an uploaded object from 'incoming/' to its content address, unless that already exists.
+        """
+        name = f'{sha256}.pdf'
+        with self._lock:
+            claimed = name not in self._existing
+            self._existing.add(name)
+        try:
+            if claimed:
+                target = self.bucket.blob(name)
+                token, _, _ = target.rewrite(incoming)
+                while token is not None:
+                    token, _, _ = target.rewrite(incoming, token=token)
+        except Exception:
+            with self._lock:
+                self._existing.discard(name)
+            raise
+        finally:
+            incoming.delete()
+
+    def transfer(self, url: str, company: Optional[str] = None, title: Optional[str] = None) -> Optional[str]:
+        """
+        Streams one URL into the bucket.
+
+        Args:
+            url (str): The URL of the PDF.
+            company (str, optional): Company recorded in the metadata.
+            title (str, optional): Title recorded in the metadata.
+
+        Returns:
+            Optional[str]: The sha256 of the document, or None if it was skipped or failed.
+        """
+        policy = self.policy
+        breaker = self.breaker
+        # Unique per transfer: the same URL listed for two companies is streamed by two concurrent transfers
+        incoming = self.bucket.blob(f'{INCOMING_PREFIX}{hashlib.sha1(url.encode()).hexdigest()}-{uuid.uuid4().hex}.pdf')
+        retries = 0
+        started = time.perf_counter()
+        details = {'bytes': 0, 'http_status': None, 'error': None}
+
+        def finish(status: str, sha256: Optional[str] = None) -> Optional[str]:
+            if self.telemetry:
+                self.telemetry.record(url, status, sha256=sha256, retries=retries,
+                                      duration_s=round(time.perf_counter() - started, 3), **details)
+            return sha256
+
+        writer = None
+        while retries < policy.max_retries:
+            if not breaker.allow(url):
+                logger.error(f"Circuit open for {breaker.host(url)}, skipping {url}")
+                details['error'] = 'circuit_open'
+                return finish('failed')
+            try:
+                with get_session().get(url, timeout=self.timeout_duration, stream=True) as response:
+                    details.update(http_status=response.status_code, error=None, bytes=0)
+                    if response.status_code == 200:
+                        reason = self.preflight.check_headers(response.headers)
+                        if reason is None:
+                            check = self.preflight.body_check()
+                            hasher = hashlib.sha256()
+                            writer = incoming.open('wb', chunk_size=self.buffer_size, content_type='application/pdf',
+                                                   ignore_flush=True, retry=DEFAULT_RETRY)
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                reason = check.feed(chunk)
+                                if reason:
+                                    break
+                                hasher.update(chunk)
+                                details['bytes'] += len(chunk)
+                                writer.write(chunk)
+                            if reason is None:
+                                reason = check.finish()
+                        if reason:
+                            log_skip(url, reason)
+                            if self.skip_log:
+                                self.skip_log.record(url, reason, http_status=response.status_code,
+                                                     content_type=response.headers.get('Content-Type'))
+                            breaker.record_success(url)
+                            details['error'] = reason
+                            return finish('skipped')
+                        writer.close()
+                        writer = None
+                        breaker.record_success(url)
+                        break
+                    elif response.status_code in RETRYABLE_STATUS_CODES:
+                        logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Status code: {response.status_code}")
+                        breaker.record_failure(url)
+                    else:
+                        logger.info(f"Failed to download {url}. Status code: {response.status_code}")
+                        breaker.record_success(url)  # The host answered, the URL itself is bad
+                        details['error'] = f'HTTP {response.status_code}'
+                        return finish('failed')
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Error: {type(e).__name__}")
+                details['error'] = type(e).__name__
+                breaker.record_failure(url)
+            except Exception as e:
+                logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Error: {e}")
+                details['error'] = type(e).__name__
+            finally:
+                # A skipped or failed transfer must not leave a truncated object under 'incoming/'
+                if writer is not None:
+                    cancel_upload(writer)
+                    writer = None
+
+            retries += 1
+            if retries < policy.max_retries:
+                time.sleep(policy.backoff(retries - 1))
+        else:
+            logger.error(f"Failed to stream {url} after {policy.max_retries} retries.")
+            return finish('failed')
+
+        sha256 = hasher.hexdigest()
+        try:
+            self._commit(incoming, sha256)
+        except Exception as e:
+            logger.error(f"Failed to store {url} as {sha256}.pdf: {e}")
+            details['error'] = type(e).__name__
+            return finish('failed')
+        with self._lock:
+            self.documents.setdefault(sha256, []).append({'url': url, 'company': company, 'title': title})
+        logger.info(f"Streamed {url} to {config.DOC_SEARCH_BUCKET}/{sha256}.pdf")
+        return finish('uploaded', sha256)
+
+    def run(self, rows: List[dict], workers: int = 8) -> None:
+        """
+        Streams many URLs concurrently.
+
+        Args:
+            rows (List[dict]): Keyword arguments for `transfer`, i.e. url, company and title.
+            workers (int): Number of concurrent transfers. Memory use is bounded by `workers * buffer_size`.
+        """
+        def run_one(row: dict) -> None:
+            try:
+                self.transfer(**row)
+            except Exception as e:
+                logger.error(f"Failed to stream {row['url']}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run_one, rows))
+
+    def write_metadata(self, metadata_folder: Union[str, Path]) -> None:
+        """
+        Writes one metadata record per document, in the format of `upload_with_metadata.upload_store`.
+
+        A streaming run only sees the URLs of its CSV, so it never removes documents: those of
+        earlier runs are carried forward, see `metadata.write_metadata`.
+
+        Args:
+            metadata_folder (Union[str, Path]): Folder receiving the shards and the delta, see `metadata.write_metadata`.
+        """
+        records = [metadata_record(content_id(sha256), f'gs://{config.DOC_SEARCH_BUCKET}/{sha256}.pdf',
+                                   document_json_data(records))
+                   for sha256, records in self.documents.items()]
+        write_metadata(records, metadata_folder)
+
+
+def stream_from_csv(csv_path: Union[str, Path], metadata_folder: Union[str, Path] = METADATA_FOLDER, workers: int = 8,
+                    log_folder: Union[str, Path] = './data/logs', policy: Optional[RetryPolicy] = None) -> None:
+    """
+    Streams the PDFs listed in a CSV file into GCS and writes their metadata.
+    The CSV file should have the 'bank' and 'resolved_pdf_url' columns of the scrapers.
+
+    Args:
+        csv_path (Union[str, Path]): Path to the CSV file containing URLs.
+        metadata_folder (Union[str, Path]): Folder receiving the metadata shards and the delta.
+        workers (int): Number of concurrent transfers.
+        log_folder (Union[str, Path]): Folder receiving the run log and the list of skipped URLs.
+        policy (RetryPolicy, optional): Retry policy applied to every download.
+    """
+    client = initialize_gcs_client()
+    log_folder = Path(log_folder)
+    telemetry = RunTelemetry(log_folder / TELEMETRY_FILENAME)
+    skip_log = SkipLog(log_folder / SKIP_LOG_FILENAME)
+    pipeline = StreamingPipeline(client, policy=policy, telemetry=telemetry, skip_log=skip_log)
+
+    rows = []
+    with open(csv_path, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            url = row.get('resolved_pdf_url', '').strip()
+            if url:
+                rows.append({'url': url, 'company': row.get('bank', '').strip(), 'title': url.split('/')[-1]})
+
+    try:
+        pipeline.run(rows, workers)
+    finally:
+        skip_log.close()
+        telemetry.close()
+    pipeline.write_metadata(metadata_folder)
+
+
+if __name__ == '__main__':
+    stream_from_csv('./src/scrape/pdf_urls.csv')
+    upload_json()
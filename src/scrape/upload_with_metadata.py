@@ -1,45 +1,57 @@
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+from src.utils.uploader import doc_search_storage
+from src.utils.metadata import metadata_record
+from src.utils.transfer import upload_metadata
+from src.utils.metadata import write_metadata
+from src.utils.transfer import ingest_store
+from src.utils.transfer import upload_many
+from src.utils.transfer import sync_many
 from src.config.logging import logger
+from src.utils.metadata import uri_id
+from src.utils.store import ContentStore
+from src.utils.storage import pooled_client
+from src.utils.storage import Storage
 from src.config.setup import config
 from google.cloud import storage
+from typing import Optional
 from pathlib import Path
 from typing import Union
-import jsonlines
 import json
 
 
+METADATA_FOLDER = './src/scrape/pdf_files/metadata'
+
+
 def initialize_gcs_client() -> storage.Client:
     """
-    Initialize the Google Cloud Storage client using provided service account credentials.
+    Initialize the Google Cloud Storage client using provided service account credentials, with a
+    connection pool sized for concurrent transfers.
 
     Returns:
         google.cloud.storage.client.Client: Initialized GCS client.
     """
     try:
         credentials = ServiceAccountCredentials.from_service_account_file(config.CREDENTIALS_PATH)
-        return storage.Client(credentials=credentials, project=config.PROJECT_ID)
+        return pooled_client(credentials, config.PROJECT_ID)
     except Exception as e:
         logger.error(f"Failed to initialize GCS client: {e}")
 
 
-def upload_to_gcs(client: storage.Client, source_file: Union[str, Path], destination_blob_name: str, writer, id_: str, company_name: str) -> None:
+def upload_to_gcs(target: Storage, source_file: Union[str, Path], destination_blob_name: str, writer, id_: str, company_name: str) -> None:
     """
     Uploads a file to the specified GCS bucket.
 
     Args:
-        client (google.cloud.storage.client.Client): Initialized GCS client.
+        target (Storage): The bucket, e.g. from `doc_search_storage()`. Create it once and reuse it for every file.
         source_file (Union[str, Path]): Path to the file to be uploaded.
         destination_blob_name (str): Desired blob name in the GCS bucket.
     """
     try:
-        bucket = client.get_bucket(config.DOC_SEARCH_BUCKET)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(str(source_file))
-        logger.info(f"Successfully uploaded {source_file} to {config.DOC_SEARCH_BUCKET}/{destination_blob_name}")
-        uri = f'gs://{config.DOC_SEARCH_BUCKET}/{destination_blob_name}'
+        target.put(destination_blob_name, source_file)
+        uri = target.uri(destination_blob_name)
+        logger.info(f"Successfully uploaded {source_file} to {uri}")
         json_data = json.dumps({"company": company_name})
-        metadata = {"id": str(id_), "jsonData": json_data, "content": {"mimeType": "application/pdf", "uri": uri}}
-        writer.write(metadata)
+        writer.write(metadata_record(id_, uri, json_data))
     except Exception as e:
         logger.error(f"Failed to upload {source_file} to GCS: {e}")
 
@@ -64,54 +76,76 @@ def extract_company_name(file_path: Path) -> str:
         logger.error(e)
 
 
-def upload(pdf_folder: Union[str, Path]) -> None:
+def upload(pdf_folder: Union[str, Path], workers: int = 16, incremental: bool = False, delete: bool = False,
+           target: Optional[Storage] = None) -> None:
     """
-    Main function to iterate over PDFs in subdirectories and upload them to GCS.
+    Main function to upload the PDFs in subdirectories concurrently.
+
+    Each PDF in the bucket gets a metadata record whose ID is derived from its URI, so it is the
+    same on every run. The records are written as shards plus a delta, see `metadata.write_metadata`.
 
     Args:
         pdf_folder (Union[str, Path]): Path to the folder containing subdirectories with PDFs.
+        workers (int): Number of files uploaded concurrently.
+        incremental (bool): Only upload PDFs that are new or changed, see `transfer.sync_many`.
+        delete (bool): With `incremental`, delete remote PDFs that are no longer present locally.
+        target (Storage, optional): Target storage. Defaults to the DOC_SEARCH_BUCKET.
     """
-    client = initialize_gcs_client()
-    metadata_file_path = './src/scrape/pdf_files/metadata.jsonl'
-    writer = jsonlines.open(metadata_file_path, mode='w')
+    target = target or doc_search_storage()
 
     # Use rglob to find PDFs in subdirectories
-    id_ = 1
-    for pdf_file in Path(pdf_folder).rglob("*.pdf"):
-        destination_blob_name = pdf_file.name
-        company_name = extract_company_name(pdf_file)
-        upload_to_gcs(client, pdf_file, destination_blob_name, writer, id_, company_name)
-        id_ += 1
+    pdf_files = list(Path(pdf_folder).rglob("*.pdf"))
+    files = [(pdf_file, pdf_file.name) for pdf_file in pdf_files]
+    if incremental:
+        results = sync_many(target, files, delete=delete, workers=workers)
+    else:
+        results = upload_many(target, files, workers)
+
+    records = []
+    for pdf_file, uploaded in zip(pdf_files, results):
+        if uploaded:
+            uri = target.uri(pdf_file.name)
+            json_data = json.dumps({"company": extract_company_name(pdf_file)})
+            records.append(metadata_record(uri_id(uri), uri, json_data))
+    # The folder lists every PDF, so those no longer in it are removed; failed uploads keep their last record
+    write_metadata(records, METADATA_FOLDER, source_ids=[uri_id(target.uri(pdf_file.name)) for pdf_file in pdf_files])
+
+    if all(results):
+        logger.info("All PDFs uploaded successfully!")
+
+
+def upload_store(store_root: Union[str, Path], workers: int = 16, incremental: bool = False,
+                 delete: bool = False, target: Optional[Storage] = None) -> None:
+    """
+    Uploads each unique document of a content-addressed store once, concurrently, and writes its
+    metadata, see `transfer.ingest_store`.
 
-    logger.info("All PDFs uploaded successfully!")
-    writer.close()
+    Args:
+        store_root (Union[str, Path]): Root directory of the ContentStore.
+        workers (int): Number of files uploaded concurrently.
+        incremental (bool): Only upload documents that are not in the bucket yet, see `transfer.sync_many`.
+        delete (bool): With `incremental`, delete remote PDFs that are no longer in the store.
+        target (Storage, optional): Target storage. Defaults to the DOC_SEARCH_BUCKET.
+    """
+    ingest_store(ContentStore(store_root), target or doc_search_storage(), METADATA_FOLDER, workers,
+                 incremental, delete)
 
 
-def upload_json() -> None:
+def upload_json(metadata_folder: Union[str, Path] = METADATA_FOLDER, target: Optional[Storage] = None) -> None:
     """
-    Uploads a JSON file to the specified GCS bucket.
+    Uploads the metadata shards and the delta to the 'metadata/' prefix of the DOC_SEARCH_BUCKET.
 
     Args:
-        client (google.cloud.storage.client.Client): Initialized GCS client.
-        json_file_path (str): Path to the JSON file to be uploaded.
-        destination_blob_name (str): Desired blob name in the GCS bucket.
+        metadata_folder (Union[str, Path]): Folder written by `metadata.write_metadata`.
+        target (Storage, optional): Target storage. Defaults to the DOC_SEARCH_BUCKET.
     """
     try:
-        # Assuming the bucket name is stored in a config variable
-        client = initialize_gcs_client()
-        metadata_file_path = './src/scrape/pdf_files/metadata.jsonl'
-        bucket = client.get_bucket(config.DOC_SEARCH_BUCKET)
-        blob = bucket.blob('metadata.jsonl')
-        
-        # Set the blob's content type to JSON
-        blob.content_type = 'application/json'
-        blob.upload_from_filename(metadata_file_path)
-
-        logger.info(f"Successfully uploaded JSON file {metadata_file_path} to {config.DOC_SEARCH_BUCKET}/metadata.json")
+        upload_metadata(target or doc_search_storage(), metadata_folder)
     except Exception as e:
-        logger.error(f"Failed to upload JSON file {metadata_file_path} to GCS: {e}")
+        logger.error(f"Failed to upload metadata files from {metadata_folder} to GCS: {e}")
 
 
 if __name__ == '__main__':
-    upload('./src/scrape/pdf_files/')
-    upload_json()
\ No newline at end of file
+    target = doc_search_storage()
+    upload_store('./src/scrape/pdf_store/', incremental=True, target=target)
+    upload_json(target=target)
\ No newline at end of file
@@ -1,40 +1,187 @@
+from google.api_core.exceptions import PreconditionFailed
 from google.api_core.exceptions import GoogleAPICallError
+from google.api_core.exceptions import NotFound
 from google.api_core.exceptions import RetryError
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.storage import ObjectInfo
+from src.utils.storage import GCSStorage
+from src.utils.retry import RetryPolicy
+from src.utils.storage import Storage
 from src.config.logging import logger
-from src.config.setup import config
+from src.config.setup import config  # noqa: F401 - sets GOOGLE_APPLICATION_CREDENTIALS for storage.Client()
 from google.cloud import storage
+from typing import Optional
+from typing import Union
+from typing import Dict
+from typing import Any
+from pathlib import Path
+import threading
+import fnmatch
+import json
 import time
-import os 
+import os
 
 
-def download_pdfs_from_gcs(bucket_name, local_folder):
-    """Downloads all PDF files from a GCS bucket to a local folder."""
+MIRROR_MANIFEST_FILENAME = '.mirror-manifest.json'
+
+
+class MirrorManifest:
+    """
+    Records the generation and size of every blob mirrored into a local folder.
+
+    A blob whose generation and size are unchanged, and whose local copy still has that size,
+    does not need to be downloaded again.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to read mirror manifest {self.path}, starting fresh. Error: {e}")
+
+    def is_current(self, info: ObjectInfo, local_path: Path) -> bool:
+        entry = self.entries.get(info.name)
+        return (entry is not None and entry['generation'] == info.generation and entry['size'] == info.size
+                and local_path.exists() and local_path.stat().st_size == info.size)
+
+    def record(self, info: ObjectInfo, local_path: Path) -> None:
+        with self._lock:
+            self.entries[info.name] = {'generation': info.generation, 'size': info.size, 'path': str(local_path)}
 
-    def download_blob(blob, destination_file_name, retries=0):
-        """Attempt to download a blob with retry mechanism."""
-        max_retries = 3
+    def save(self) -> None:
+        with self._lock:
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def download_object(source: Storage, info: ObjectInfo, local_path: Path, policy: RetryPolicy) -> bool:
+    """
+    Downloads one object. The local file only appears once it is complete.
+
+    The exact generation that was listed is requested, so an object overwritten during the mirror
+    is never stored under the old manifest entry.
+
+    Args:
+        source (Storage): The storage holding the object.
+        info (ObjectInfo): The listed object.
+        local_path (Path): Final path of the local copy.
+        policy (RetryPolicy): Retry policy for API and connection errors.
+
+    Returns:
+        bool: True if the object was downloaded.
+    """
+    for attempt in range(policy.max_retries):
         try:
-            blob.download_to_filename(destination_file_name)
-            logger.info(f"Blob {blob.name} downloaded to {destination_file_name}.")
-        except (GoogleAPICallError, RetryError) as e:
-            if retries < max_retries:
-                time.sleep(2 ** retries)  # Exponential backoff
-                download_blob(blob, destination_file_name, retries + 1)
-            else:
-                logger.error(f"Failed to download {blob.name} after {max_retries} retries.")
-
-    storage_client = storage.Client()
-    blobs = storage_client.list_blobs(bucket_name)
-
-    if not os.path.exists(local_folder):
-        os.makedirs(local_folder)
-
-    for blob in blobs:
-        if blob.name.lower().endswith('.pdf'):
-            destination_file_name = os.path.join(local_folder, os.path.basename(blob.name))
-            download_blob(blob, destination_file_name)
-
-# Example usage
-bucket_url = "moodys-demo-doc-search"  # Replace with your GCS bucket name
-local_data_folder = "./src/utils/pdfs"      # Replace with your local folder path
-download_pdfs_from_gcs(bucket_url, local_data_folder)
+            source.get(info.name, local_path, generation=info.generation)
+            return True
+        except (PreconditionFailed, NotFound, FileNotFoundError) as e:
+            # The listed generation was overwritten or deleted meanwhile; asking again cannot succeed
+            logger.error(f"{info.name} changed since it was listed, skipping it until the next mirror. "
+                         f"Error: {type(e).__name__}")
+            return False
+        except (GoogleAPICallError, RetryError, OSError) as e:
+            logger.error(f"Retry {attempt + 1}/{policy.max_retries} for {info.name}. Error: {type(e).__name__}")
+            if attempt + 1 < policy.max_retries:
+                time.sleep(policy.backoff(attempt))
+    logger.error(f"Failed to download {info.name} after {policy.max_retries} retries.")
+    return False
+
+
+def local_path(local_folder: Path, relative_name: str) -> Optional[Path]:
+    """
+    Returns the local path of an object, or None if its name would place it outside `local_folder`,
+    e.g. through '..' segments or an absolute path.
+    """
+    root = local_folder.resolve()
+    path = (root / relative_name).resolve()
+    return path if path != root and path.is_relative_to(root) else None
+
+
+def mirror(source: Union[str, Storage], local_folder: Union[str, Path], prefix: str = '', pattern: str = '*.pdf',
+           workers: int = 16, client: Optional[storage.Client] = None,
+           policy: Optional[RetryPolicy] = None, flatten: bool = False) -> Dict[str, Any]:
+    """
+    Incrementally mirrors the matching objects of a bucket into a local folder.
+
+    The prefix is listed once, and only objects that are new or whose generation or size changed
+    since the last mirror are downloaded, concurrently. Local paths are the object names relative
+    to `prefix`, or only their base names with `flatten`. Objects whose name would place them
+    outside `local_folder` are skipped and counted as rejected.
+
+    Args:
+        source (Union[str, Storage]): Name of the GCS bucket, or any Storage.
+        local_folder (Union[str, Path]): Destination folder. It also holds the mirror manifest.
+        prefix (str): Only objects under this prefix are mirrored.
+        pattern (str): Case-insensitive glob matched against the object names, e.g. '*.pdf' or 'reports/2023/*'.
+        workers (int): Number of concurrent downloads.
+        client (google.cloud.storage.client.Client, optional): GCS client used with a bucket name.
+            Defaults to application default credentials.
+        policy (RetryPolicy, optional): Retry policy per object. Defaults to 3 attempts.
+        flatten (bool): Store every object under its base name directly in `local_folder`. Objects
+            with the same base name overwrite each other.
+
+    Returns:
+        Dict[str, Any]: Counts of matched, downloaded, unchanged, failed and rejected objects, and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    if isinstance(source, str):
+        source = GCSStorage(source, client, pool_size=workers)
+    policy = policy or RetryPolicy(max_retries=3, base_delay=1)
+    local_folder = Path(local_folder)
+    local_folder.mkdir(parents=True, exist_ok=True)
+    manifest = MirrorManifest(local_folder / MIRROR_MANIFEST_FILENAME)
+
+    pending = []
+    stats = {'matched': 0, 'downloaded': 0, 'unchanged': 0, 'failed': 0, 'rejected': 0}
+    for info in source.list(prefix):
+        if info.name.endswith('/') or not fnmatch.fnmatch(info.name.lower(), pattern.lower()):
+            continue
+        stats['matched'] += 1
+        relative_name = info.name.rsplit('/', 1)[-1] if flatten else info.name[len(prefix):].lstrip('/')
+        path = local_path(local_folder, relative_name)
+        if path is None:
+            logger.error(f"Object name {info.name!r} escapes {local_folder}, skipping it")
+            stats['rejected'] += 1
+        elif manifest.is_current(info, path):
+            stats['unchanged'] += 1
+        else:
+            pending.append((info, path))
+
+    def run(item) -> bool:
+        info, path = item
+        if download_object(source, info, path, policy):
+            manifest.record(info, path)
+            return True
+        return False
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for downloaded in executor.map(run, pending):
+                stats['downloaded' if downloaded else 'failed'] += 1
+    finally:
+        manifest.save()
+
+    stats['elapsed_s'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Mirrored {source.uri(prefix)} ({pattern}) to {local_folder} in {stats['elapsed_s']}s: "
+                f"{stats['matched']} matched, {stats['downloaded']} downloaded, {stats['unchanged']} unchanged, "
+                f"{stats['failed']} failed, {stats['rejected']} rejected")
+    return stats
+
+
+def download_pdfs_from_gcs(bucket_name, local_folder):
+    """Downloads all PDF files from a GCS bucket into one flat local folder, skipping those already mirrored."""
+    return mirror(bucket_name, local_folder, pattern='*.pdf', flatten=True)
+
+
+if __name__ == '__main__':
+    # Example usage
+    bucket_url = "moodys-demo-doc-search"  # Replace with your GCS bucket name
+    local_data_folder = "./src/utils/pdfs"      # Replace with your local folder path
+    download_pdfs_from_gcs(bucket_url, local_data_folder)
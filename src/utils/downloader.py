@@ -1,5 +1,17 @@
+from src.utils.preflight import SKIP_LOG_FILENAME
+from src.utils.manifest import DownloadManifest
+from src.utils.telemetry import RunTelemetry
 from aiohttp import ServerDisconnectedError
+from src.utils.manifest import resume_hasher
+from src.utils.manifest import partial_path
+from src.utils.retry import RETRYABLE_STATUS_CODES
 from aiohttp import ClientConnectorError
+from src.utils.retry import CircuitBreaker
+from src.utils.preflight import Preflight
+from src.utils.preflight import log_skip
+from src.utils.retry import RetryPolicy
+from src.utils.preflight import SkipLog
+from src.utils.manifest import CHUNK_SIZE
 from aiohttp import ClientPayloadError
 from aiofiles import open as aio_open
 from src.config.logging import logger
@@ -8,13 +20,30 @@ from pathlib import Path
 import jsonlines
 import aiohttp
 import asyncio
+import hashlib
+import time
 import csv
+import os
 
 
-async def download_file(session, url, destination, max_retries=10, timeout_duration=10):
+MANIFEST_FILENAME = 'download-manifest.json'
+TELEMETRY_FILENAME = 'download-run.jsonl'
+
+
+async def download_file(session, url, destination, max_retries=10, timeout_duration=10, manifest=None,
+                        store=None, company=None, title=None, policy=None, breaker=None, telemetry=None,
+                        preflight=None, skip_log=None):
     """
     Asynchronously downloads a file from a given URL and saves it to the specified destination. 
-    Implements retry logic with quick retries for certain connection errors.
+    Retries connection errors, timeouts and transient server errors with jittered exponential
+    backoff, and fails fast while the circuit breaker reports the host as unhealthy.
+
+    When a manifest is given, the request is made conditional on the validators recorded by a
+    previous run (a 304 response leaves the local copy untouched) and an interrupted transfer
+    is resumed from its '.part' file with an HTTP Range request.
+
+    When a preflight is given, the Content-Type and size headers of the response and the first
+    bytes of its body are checked before the file is kept; rejected downloads are discarded.
 
     Args:
         session (ClientSession): The aiohttp client session.
@@ -22,37 +51,136 @@ async def download_file(session, url, destination, max_retries=10, timeout_durat
         destination (Path): The path where the file should be saved.
         max_retries (int): Maximum number of retries for the download.
         timeout_duration (int): The total timeout duration for each attempt in seconds.
+        manifest (DownloadManifest, optional): Manifest of previous downloads.
+        store (ContentStore, optional): Content-addressed store that receives the finished file.
+        company (str, optional): Company recorded in the store index.
+        title (str, optional): Title recorded in the store index.
+        policy (RetryPolicy, optional): Retry policy. Defaults to exponential backoff with `max_retries` attempts.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker shared across downloads.
+        telemetry (RunTelemetry, optional): Run log receiving one record for this URL.
+        preflight (Preflight, optional): Rejects responses that are not PDFs or exceed the size limit.
+        skip_log (SkipLog, optional): Receives the URL and the reason when the preflight rejects it.
 
     Returns:
-        str: The path of the downloaded file, or None if the download fails.
+        str: The path of the downloaded file, or None if the download fails or is skipped.
     """
+    policy = policy or RetryPolicy(max_retries=max_retries)
     retries = 0
+    partial = partial_path(destination)
+    started = time.perf_counter()
+    details = {'bytes': 0, 'http_status': None, 'final_url': None, 'content_type': None, 'error': None}
+
+    def finish(status, path=None):
+        if telemetry:
+            telemetry.record(url, status, path=str(path) if path else None, retries=retries,
+                             duration_s=round(time.perf_counter() - started, 3), **details)
+        return path
 
-    while retries < max_retries:
+    while retries < policy.max_retries:
+        if breaker and not breaker.allow(url):
+            logger.error(f"Circuit open for {breaker.host(url)}, skipping {url}")
+            details['error'] = 'circuit_open'
+            return finish('failed')
         try:
-            async with session.get(url, timeout=ClientTimeout(total=timeout_duration)) as response:
-                if response.status == 200:
-                    async with aio_open(destination, 'wb') as f:
-                        await f.write(await response.read())
-                    return destination
+            headers = manifest.request_headers(url, destination) if manifest else {}
+            async with session.get(url, headers=headers, timeout=ClientTimeout(total=timeout_duration)) as response:
+                details.update(http_status=response.status, final_url=str(response.url),
+                               content_type=response.headers.get('Content-Type'), error=None)
+                if response.status == 304 and manifest:
+                    logger.info(f"Not modified since last run: {url}")
+                    if breaker:
+                        breaker.record_success(url)
+                    return finish('not_modified', manifest.get(url)['path'])
+                elif response.status == 416:
+                    logger.error(f"Stale partial download for {url}, restarting from the first byte.")
+                    partial.unlink(missing_ok=True)
+                elif response.status in (200, 206):
+                    resume = response.status == 206
+                    if manifest and not resume:
+                        manifest.begin(url, response.headers)
+                    reason = preflight.check_headers(response.headers) if preflight else None
+                    if reason is None:
+                        hasher = resume_hasher(partial) if resume else hashlib.sha256()
+                        check = preflight.body_check(partial.stat().st_size if resume else 0) if preflight else None
+                        async with aio_open(partial, 'ab' if resume else 'wb') as f:
+                            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                                reason = check.feed(chunk) if check else None
+                                if reason:
+                                    break
+                                hasher.update(chunk)
+                                details['bytes'] += len(chunk)
+                                await f.write(chunk)
+                        if check and reason is None:
+                            reason = check.finish()
+                    if reason:
+                        log_skip(url, reason)
+                        partial.unlink(missing_ok=True)
+                        if skip_log:
+                            skip_log.record(url, reason, http_status=response.status,
+                                            content_type=details['content_type'], final_url=details['final_url'])
+                        if breaker:
+                            breaker.record_success(url)
+                        details['error'] = reason
+                        return finish('skipped')
+                    os.replace(partial, destination)
+                    if store:
+                        destination = store.add(destination, hasher.hexdigest(), url, company, title)
+                    if manifest:
+                        manifest.complete(url, destination, response.headers, hasher.hexdigest())
+                    if breaker:
+                        breaker.record_success(url)
+                    return finish('downloaded', destination)
+                elif response.status in RETRYABLE_STATUS_CODES:
+                    logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Status code: {response.status}")
+                    if breaker:
+                        breaker.record_failure(url)
                 else:
                     logger.error(f"Failed to download {url}. Status code: {response.status}")
-                    return None
+                    if breaker:
+                        breaker.record_success(url)  # The host answered, the URL itself is bad
+                    details['error'] = f'HTTP {response.status}'
+                    return finish('failed')
         except ClientConnectorError as e:
-            logger.error(f"Quick retry {retries + 1}/{max_retries} for {url} due to connection error.")
-            await asyncio.sleep(1)  # Short delay for quick retries
+            logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url} due to connection error.")
+            details['error'] = type(e).__name__
+            if breaker:
+                breaker.record_failure(url)
         except (asyncio.TimeoutError, ClientPayloadError, ServerDisconnectedError) as e:
-            logger.error(f"Retry {retries + 1}/{max_retries} for {url}. Error: {type(e).__name__}")
-            await asyncio.sleep(1)  # Delay for other errors
+            logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Error: {type(e).__name__}")
+            details['error'] = type(e).__name__
+            if breaker:
+                breaker.record_failure(url)
         except Exception as e:
             logger.error(type(e).__name__)
+            details['error'] = type(e).__name__
 
         retries += 1
+        if retries < policy.max_retries:
+            await asyncio.sleep(policy.backoff(retries - 1))
 
-    logger.error(f"Failed to download {url} after {max_retries} retries.")
-    return None
+    logger.error(f"Failed to download {url} after {policy.max_retries} retries.")
+    return finish('failed')
 
 
+async def download_exclusive(locks, session, url, destination, **kwargs):
+    """
+    Runs `download_file` while holding the lock of its destination. A URL listed more than once,
+    e.g. for two banks, maps to the same store path, and two coroutines must not write its '.part'
+    file at once; the later one finds the finished download in the manifest.
+
+    Args:
+        locks (dict): Locks by destination, shared by every download of the run.
+        session (ClientSession): The aiohttp client session.
+        url (str): The URL of the file to download.
+        destination (Path): The path where the file should be saved.
+        **kwargs: Further arguments of `download_file`.
+
+    Returns:
+        str: The result of `download_file`.
+    """
+    async with locks.setdefault(str(destination), asyncio.Lock()):
+        return await download_file(session, url, destination, **kwargs)
+
 
 def sanitize_filename(filename):
     """
@@ -66,32 +194,54 @@ def sanitize_filename(filename):
     """
     return "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).rstrip()
 
-async def download(jsonl_path, output_folder):
+async def download(jsonl_path, output_folder, manifest_path=None, store=None, policy=None, breaker=None,
+                   telemetry_path=None, preflight=None):
     """
     Main coroutine to read the JSONL file, download and save the PDFs.
 
     Args:
         jsonl_path (Path): Path to the JSONL file.
         output_folder (Path): Folder to save the downloaded PDFs.
+        manifest_path (Path, optional): Download manifest location. Defaults to 'download-manifest.json' in the output folder.
+        store (ContentStore, optional): Store the PDFs in a content-addressed store instead of by filename.
+        policy (RetryPolicy, optional): Retry policy applied to every download.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker. A fresh one is shared by the whole run by default.
+        telemetry_path (Path, optional): Run log location. Defaults to 'download-run.jsonl' in the output folder.
+        preflight (Preflight, optional): Pre-flight checks applied to every response. Defaults to `Preflight()`;
+            skipped URLs are listed in 'download-skipped.jsonl' in the output folder.
     """
     output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or output_folder / MANIFEST_FILENAME)
+    breaker = breaker or CircuitBreaker()
+    preflight = preflight or Preflight()
+    skip_log = SkipLog(output_folder / SKIP_LOG_FILENAME)
+    telemetry = RunTelemetry(telemetry_path or output_folder / TELEMETRY_FILENAME)
     
     # Create a new aiohttp session
     async with aiohttp.ClientSession() as session:
         tasks = []
+        destination_locks = {}
         
         # Read the JSONL file
         with jsonlines.open(jsonl_path) as reader:
             for item in reader:
                 title = sanitize_filename(item["title"]) + ".pdf"
-                destination = output_folder / title
-                tasks.append(download_file(session, item["link"], destination))
+                destination = store.incoming_path(item["link"]) if store else output_folder / title
+                tasks.append(download_exclusive(destination_locks, session, item["link"], destination,
+                                                manifest=manifest, store=store, title=item["title"],
+                                                policy=policy, breaker=breaker, telemetry=telemetry,
+                                                preflight=preflight, skip_log=skip_log))
         
         # Gather all the download tasks and execute them concurrently
         await asyncio.gather(*tasks)
 
+    await asyncio.to_thread(manifest.close)
+    skip_log.close()
+    telemetry.close()
 
-async def download_from_csv(csv_path, output_folder):
+
+async def download_from_csv(csv_path, output_folder, manifest_path=None, store=None, policy=None, breaker=None,
+                            telemetry_path=None, preflight=None):
     """
     Reads URLs from a CSV file and downloads each as a PDF file.
     The CSV file should have a column named 'resolved_pdf_url' containing the URLs.
@@ -99,12 +249,25 @@ async def download_from_csv(csv_path, output_folder):
     Args:
         csv_path (Path): Path to the CSV file containing URLs.
         output_folder (Path): Folder to save the downloaded PDFs.
+        manifest_path (Path, optional): Download manifest location. Defaults to 'download-manifest.json' in the output folder.
+        store (ContentStore, optional): Store the PDFs in a content-addressed store instead of by filename.
+        policy (RetryPolicy, optional): Retry policy applied to every download.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker. A fresh one is shared by the whole run by default.
+        telemetry_path (Path, optional): Run log location. Defaults to 'download-run.jsonl' in the output folder.
+        preflight (Preflight, optional): Pre-flight checks applied to every response. Defaults to `Preflight()`;
+            skipped URLs are listed in 'download-skipped.jsonl' in the output folder.
     """
     output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or output_folder / MANIFEST_FILENAME)
+    breaker = breaker or CircuitBreaker()
+    preflight = preflight or Preflight()
+    skip_log = SkipLog(output_folder / SKIP_LOG_FILENAME)
+    telemetry = RunTelemetry(telemetry_path or output_folder / TELEMETRY_FILENAME)
 
     async with aiohttp.ClientSession() as session:
         tasks = []
+        destination_locks = {}
 
         # Open and read the CSV file
         with open(csv_path, 'r', newline='') as file:
@@ -112,14 +275,23 @@ async def download_from_csv(csv_path, output_folder):
             for row in csv_reader:
                 url = row.get('resolved_pdf_url', '').strip()
                 bank_name = row.get('bank', '').strip()
-                output_path = Path(f'{output_folder}/{bank_name}')
-                output_path.mkdir(parents=True, exist_ok=True)
                 if url:
                     filename = url.split('/')[-1]
-                    sanitized_filename = sanitize_filename(filename)
-                    destination = f'{output_path}/{sanitized_filename}'
-                    tasks.append(download_file(session, url, destination))
+                    if store:
+                        destination = store.incoming_path(url)
+                    else:
+                        output_path = Path(f'{output_folder}/{bank_name}')
+                        output_path.mkdir(parents=True, exist_ok=True)
+                        destination = f'{output_path}/{sanitize_filename(filename)}'
+                    tasks.append(download_exclusive(destination_locks, session, url, destination,
+                                                    manifest=manifest, store=store, company=bank_name,
+                                                    title=filename, policy=policy, breaker=breaker,
+                                                    telemetry=telemetry, preflight=preflight, skip_log=skip_log))
 
         # Execute all download tasks concurrently
         await asyncio.gather(*tasks)
 
+    await asyncio.to_thread(manifest.close)
+    skip_log.close()
+    telemetry.close()
+
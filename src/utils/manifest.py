@@ -0,0 +1,222 @@
+from src.config.logging import logger
+from typing import Optional
+from typing import Mapping
+from typing import Union
+from typing import Dict
+from typing import Any
+from pathlib import Path
+import threading
+import hashlib
+import json
+import os
+
+
+CHUNK_SIZE = 1024 * 1024
+# Seconds between background writes of a changed manifest
+SAVE_INTERVAL = 5.0
+
+
+def partial_path(destination: Union[str, Path]) -> Path:
+    """
+    Returns the path used for an in-flight download of the given destination.
+
+    Args:
+        destination (Union[str, Path]): The final path of the downloaded file.
+
+    Returns:
+        Path: The sibling '.part' path that receives bytes until the transfer completes.
+    """
+    destination = Path(destination)
+    return destination.with_name(destination.name + '.part')
+
+
+def resume_hasher(path: Union[str, Path]) -> 'hashlib._Hash':
+    """
+    Creates a sha256 hasher primed with the bytes already present in a file.
+
+    Args:
+        path (Union[str, Path]): Path to the (partial) file.
+
+    Returns:
+        hashlib._Hash: A sha256 object that can be updated with the remaining bytes.
+    """
+    hasher = hashlib.sha256()
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+    return hasher
+
+
+class DownloadManifest:
+    """
+    A JSON file recording what was downloaded from each URL.
+
+    Every entry keeps the ETag and Last-Modified validators sent by the server together with
+    the size and sha256 checksum of the local copy. Re-runs use them to send conditional
+    requests (If-None-Match / If-Modified-Since) and to resume interrupted transfers with
+    a Range request guarded by If-Range.
+
+    Changes are kept in memory and written by a background thread at most every `save_interval`
+    seconds, so recording a download never blocks the caller (or an event loop) on disk I/O and
+    a run costs a bounded number of rewrites rather than two per URL. Call `close` at the end of
+    a run for the final write; a crash loses at most the last interval, whose URLs are simply
+    downloaded or resumed again.
+    """
+
+    def __init__(self, path: Union[str, Path], save_interval: float = SAVE_INTERVAL):
+        """
+        Loads the manifest from disk, starting empty if it does not exist yet.
+
+        Args:
+            path (Union[str, Path]): Location of the manifest JSON file.
+            save_interval (float): Seconds between background writes of a changed manifest.
+        """
+        self.path = Path(path)
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._closed = threading.Event()
+        self._saver: Optional[threading.Thread] = None
+        self.entries = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read download manifest {self.path}, starting fresh. Error: {e}")
+            return {}
+
+    def save(self) -> None:
+        """
+        Atomically writes the manifest to disk if it changed since the last write.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.dumps(self.entries, indent=1, sort_keys=True)
+                self._dirty = False
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+    def _save_periodically(self) -> None:
+        while not self._closed.wait(self.save_interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Failed to write download manifest {self.path}. Error: {e}")
+
+    def _changed(self) -> None:
+        # Called with self._lock held
+        self._dirty = True
+        if self._saver is None and not self._closed.is_set():
+            self._saver = threading.Thread(target=self._save_periodically, name='manifest-saver', daemon=True)
+            self._saver.start()
+
+    def close(self) -> None:
+        """
+        Stops the background writer and writes any pending changes.
+        """
+        self._closed.set()
+        if self._saver is not None:
+            self._saver.join()
+        self.save()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the manifest entry for a URL, or None if it was never downloaded.
+        """
+        return self.entries.get(url)
+
+    def is_current(self, url: str) -> bool:
+        """
+        Checks whether the local copy recorded for a URL is still on disk and complete.
+
+        Args:
+            url (str): The source URL.
+
+        Returns:
+            bool: True if the recorded file exists with the recorded size.
+        """
+        entry = self.entries.get(url)
+        if not entry or not entry.get('path'):
+            return False
+        path = Path(entry['path'])
+        return path.exists() and path.stat().st_size == entry.get('size')
+
+    def request_headers(self, url: str, destination: Union[str, Path]) -> Dict[str, str]:
+        """
+        Builds the conditional and range headers for the next request to a URL.
+
+        Args:
+            url (str): The source URL.
+            destination (Union[str, Path]): The final path of the downloaded file.
+
+        Returns:
+            Dict[str, str]: Headers to send with the GET request.
+        """
+        headers = {}
+        entry = self.entries.get(url, {})
+
+        if self.is_current(url):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        # Only resume when the server gave us a validator for the interrupted transfer,
+        # otherwise the remaining bytes could belong to a different version of the file.
+        partial = partial_path(destination)
+        pending = entry.get('partial', {})
+        validator = pending.get('etag') or pending.get('last_modified')
+        if validator and partial.exists() and partial.stat().st_size > 0:
+            headers['Range'] = f'bytes={partial.stat().st_size}-'
+            headers['If-Range'] = validator
+
+        return headers
+
+    def begin(self, url: str, response_headers: Mapping[str, str]) -> None:
+        """
+        Records the validators of a transfer that is starting from the first byte.
+
+        Args:
+            url (str): The source URL.
+            response_headers (Mapping[str, str]): Headers of the 200 response.
+        """
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            entry['partial'] = {
+                'etag': response_headers.get('ETag'),
+                'last_modified': response_headers.get('Last-Modified'),
+            }
+            self._changed()
+
+    def complete(self, url: str, destination: Union[str, Path], response_headers: Mapping[str, str], sha256: str) -> None:
+        """
+        Records a finished download.
+
+        Args:
+            url (str): The source URL.
+            destination (Union[str, Path]): The final path of the downloaded file.
+            response_headers (Mapping[str, str]): Headers of the final response.
+            sha256 (str): Hex digest of the complete file.
+        """
+        with self._lock:
+            entry = self.entries.get(url, {})
+            pending = entry.get('partial', {})
+            self.entries[url] = {
+                'path': str(destination),
+                'etag': response_headers.get('ETag') or pending.get('etag'),
+                'last_modified': response_headers.get('Last-Modified') or pending.get('last_modified'),
+                'size': os.path.getsize(destination),
+                'sha256': sha256,
+            }
+            self._changed()
@@ -0,0 +1,175 @@
+from src.config.logging import logger
+from typing import Iterable
+from typing import Optional
+from typing import Union
+from typing import Dict
+from typing import List
+from pathlib import Path
+import hashlib
+import json
+import os
+
+
+# Document IDs of Vertex AI Search are limited to 63 characters; 32 hex digits keep 128 bits
+ID_LENGTH = 32
+MAX_SHARD_BYTES = 16 * 1024 * 1024
+SHARD_PREFIX = 'metadata-'
+DELTA_FILENAME = 'delta.jsonl'
+
+
+def content_id(sha256: str) -> str:
+    """
+    Returns the document ID of a PDF addressed by its content hash.
+    """
+    return sha256[:ID_LENGTH]
+
+
+def uri_id(uri: str) -> str:
+    """
+    Returns the document ID of a PDF addressed by its canonical URI, e.g. its gs:// location.
+    """
+    return hashlib.sha256(uri.strip().encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def metadata_record(id_: str, uri: str, json_data: str) -> dict:
+    return {"id": str(id_), "jsonData": json_data, "content": {"mimeType": "application/pdf", "uri": uri}}
+
+
+def document_json_data(records: List[dict]) -> str:
+    """
+    Builds the jsonData of a document found under one or more URLs.
+
+    The first company is kept in the 'company' field, as written by `upload_with_metadata.upload`,
+    and every company, title and URL the document was found under is listed.
+
+    Args:
+        records (List[dict]): Records with the url, company and title of each download of the document.
+
+    Returns:
+        str: The JSON-encoded jsonData.
+    """
+    companies = sorted({record['company'] for record in records if record.get('company')})
+    return json.dumps({
+        "company": companies[0] if companies else None,
+        "companies": companies,
+        "titles": sorted({record['title'] for record in records if record.get('title')}),
+        "urls": sorted({record['url'] for record in records if record.get('url')}),
+    })
+
+
+def read_shards(folder: Union[str, Path]) -> Dict[str, dict]:
+    """
+    Loads the metadata records written by a previous run.
+
+    Args:
+        folder (Union[str, Path]): Folder holding the metadata shards.
+
+    Returns:
+        Dict[str, dict]: Records by document ID, empty if there are none.
+    """
+    records = {}
+    for shard in sorted(Path(folder).glob(f'{SHARD_PREFIX}*.jsonl')):
+        with open(shard) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record['id']] = record
+    return records
+
+
+def compute_delta(previous: Dict[str, dict], current: Dict[str, dict]) -> List[dict]:
+    """
+    Lists the documents that were added, changed or removed between two runs.
+
+    Args:
+        previous (Dict[str, dict]): Records of the previous run by document ID.
+        current (Dict[str, dict]): Records of this run by document ID.
+
+    Returns:
+        List[dict]: {'action', 'id', 'record'} entries sorted by ID. Removed documents carry their old record.
+    """
+    delta = []
+    for id_ in sorted(previous.keys() | current.keys()):
+        if id_ not in previous:
+            delta.append({'action': 'added', 'id': id_, 'record': current[id_]})
+        elif id_ not in current:
+            delta.append({'action': 'removed', 'id': id_, 'record': previous[id_]})
+        elif previous[id_] != current[id_]:
+            delta.append({'action': 'changed', 'id': id_, 'record': current[id_]})
+    return delta
+
+
+def _write_atomic(path: Path, lines: List[str]) -> None:
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        f.writelines(lines)
+    os.replace(temp_path, path)
+
+
+def write_metadata(records: Iterable[dict], folder: Union[str, Path], source_ids: Optional[Iterable[str]] = None,
+                   max_shard_bytes: int = MAX_SHARD_BYTES) -> Dict[str, int]:
+    """
+    Writes metadata records as size-bounded JSONL shards plus a delta against the previous run.
+
+    Records are sorted by ID, so unchanged documents land in the same shard with the same bytes
+    on every run. 'delta.jsonl' lists only the documents added, changed or removed since the
+    shards previously in the folder were written. Importing the delta keeps a datastore in sync
+    with work proportional to what changed.
+
+    A run does not always see every document: uploads fail, and a streaming run may cover part of
+    a CSV. Documents of the previous run that have no record in this one are therefore carried
+    forward unchanged. Documents are only removed when `source_ids`, the complete set of documents
+    that should exist, is given and does not contain them.
+
+    Args:
+        records (Iterable[dict]): Records with a deterministic 'id', see `content_id` and `uri_id`.
+        folder (Union[str, Path]): Output folder, e.g. './src/scrape/pdf_files/metadata'.
+        source_ids (Iterable[str], optional): IDs of every document in the authoritative source, including
+            those whose upload failed in this run. None never removes anything.
+        max_shard_bytes (int): Size limit of a shard. A single larger record gets a shard of its own.
+
+    Returns:
+        Dict[str, int]: Number of shards and documents, of documents carried forward from the previous
+        run, and of added, changed and removed documents.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    previous = read_shards(folder)
+    seen = {record['id']: record for record in records}
+    if source_ids is None:
+        current = dict(previous)
+    else:
+        current = {id_: previous[id_] for id_ in set(source_ids) if id_ in previous}
+    carried = len(current.keys() - seen.keys())
+    current.update(seen)
+
+    shards = [[]]
+    size = 0
+    for id_ in sorted(current):
+        line = json.dumps(current[id_]) + '\n'
+        if shards[-1] and size + len(line) > max_shard_bytes:
+            shards.append([])
+            size = 0
+        shards[-1].append(line)
+        size += len(line)
+
+    names = set()
+    for index, lines in enumerate(shards):
+        name = f'{SHARD_PREFIX}{index:05d}.jsonl'
+        _write_atomic(folder / name, lines)
+        names.add(name)
+    for stale in folder.glob(f'{SHARD_PREFIX}*.jsonl'):
+        if stale.name not in names:
+            stale.unlink()
+
+    delta = compute_delta(previous, current)
+    _write_atomic(folder / DELTA_FILENAME, [json.dumps(entry) + '\n' for entry in delta])
+
+    counts = {'shards': len(shards), 'documents': len(current), 'carried_forward': carried,
+              'added': 0, 'changed': 0, 'removed': 0}
+    for entry in delta:
+        counts[entry['action']] += 1
+    logger.info(f"Wrote {counts['documents']} metadata records in {counts['shards']} shards to {folder}: "
+                f"{counts['added']} added, {counts['changed']} changed, {counts['removed']} removed, "
+                f"{counts['carried_forward']} carried forward from the previous run")
+    return counts
@@ -0,0 +1,173 @@
+from src.config.logging import logger
+from typing import Optional
+from typing import Mapping
+from typing import Union
+from typing import Any
+from pathlib import Path
+import threading
+import json
+
+
+PDF_MAGIC = b'%PDF-'
+SNIFF_BYTES = 1024
+SKIP_LOG_FILENAME = 'download-skipped.jsonl'
+
+# Content types that are never a PDF, whatever the URL says. Generic types such as
+# application/octet-stream are left to the magic-byte check.
+NON_PDF_TYPE_PREFIXES = (
+    'text/',
+    'image/',
+    'audio/',
+    'video/',
+    'application/json',
+    'application/xhtml',
+    'application/xml',
+    'application/javascript',
+    'application/zip',
+    'application/x-zip',
+    'application/gzip',
+    'application/x-rar',
+    'application/x-7z',
+    'application/msword',
+    'application/vnd.',
+)
+
+
+def content_type(headers: Mapping[str, str]) -> str:
+    return headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def total_size(headers: Mapping[str, str]) -> Optional[int]:
+    """
+    Returns the full size of the resource announced by a response, if any.
+
+    For 206 responses this is the total of the Content-Range header, otherwise the Content-Length.
+    """
+    content_range = headers.get('Content-Range', '')
+    size = content_range.rsplit('/', 1)[-1] if '/' in content_range else headers.get('Content-Length')
+    try:
+        return int(size)
+    except (TypeError, ValueError):
+        return None
+
+
+class Preflight:
+    """
+    Decides from the response headers and the first bytes of the body whether a URL is a PDF
+    worth downloading.
+
+    Landing pages, login walls and archives are rejected as soon as their headers arrive, or at the
+    latest after the first `sniff_bytes` bytes, instead of being saved, uploaded and indexed as PDFs.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, sniff_bytes: int = SNIFF_BYTES):
+        """
+        Args:
+            max_bytes (int, optional): Largest file accepted. None, the default, accepts any size, since
+                legitimate annual reports can run to hundreds of MB.
+            sniff_bytes (int): Number of leading bytes searched for the '%PDF-' header.
+        """
+        self.max_bytes = max_bytes
+        self.sniff_bytes = sniff_bytes
+
+    def check_headers(self, headers: Mapping[str, str]) -> Optional[str]:
+        """
+        Checks Content-Type and the announced size of a 200 or 206 response.
+
+        Args:
+            headers (Mapping[str, str]): The response headers.
+
+        Returns:
+            Optional[str]: The reason to skip the URL, or None if the body should be streamed.
+        """
+        mime = content_type(headers)
+        if mime.startswith(NON_PDF_TYPE_PREFIXES):
+            return f'content_type:{mime}'
+        size = total_size(headers)
+        if self.max_bytes is not None and size is not None and size > self.max_bytes:
+            return f'too_large:{size}'
+        return None
+
+    def body_check(self, offset: int = 0) -> 'BodyCheck':
+        """
+        Returns a checker for a body streamed from `offset`. Resumed bodies were sniffed by the
+        attempt that started them, so only the size limit applies to them.
+        """
+        return BodyCheck(self, offset)
+
+
+class BodyCheck:
+    """
+    Checks a response body chunk by chunk while it is written to disk.
+    """
+
+    def __init__(self, preflight: Preflight, offset: int = 0):
+        self.preflight = preflight
+        self.received = offset
+        self.head = b''
+        self.sniffed = offset > 0
+
+    def _sniff(self) -> Optional[str]:
+        self.sniffed = True
+        return None if PDF_MAGIC in self.head else 'not_pdf_magic'
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """
+        Args:
+            chunk (bytes): The next chunk of the body.
+
+        Returns:
+            Optional[str]: The reason to abort the download, or None to continue.
+        """
+        self.received += len(chunk)
+        max_bytes = self.preflight.max_bytes
+        if max_bytes is not None and self.received > max_bytes:
+            return f'too_large:>{max_bytes}'
+        if not self.sniffed:
+            self.head += chunk[:self.preflight.sniff_bytes - len(self.head)]
+            if len(self.head) >= self.preflight.sniff_bytes:
+                return self._sniff()
+        return None
+
+    def finish(self) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: The reason to discard a body shorter than `sniff_bytes`, or None to keep it.
+        """
+        return None if self.sniffed else self._sniff()
+
+
+def log_skip(url: str, reason: str) -> None:
+    """
+    Logs a skipped URL. Files over the size limit may be real PDFs, so they are logged as warnings.
+    """
+    if reason.startswith('too_large'):
+        logger.warning(f"Skipping {url}: {reason}, raise or disable the size limit to download it")
+    else:
+        logger.info(f"Skipping {url}: {reason}")
+
+
+class SkipLog:
+    """
+    JSONL record of the URLs a download run skipped and why, one line per URL.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path (Union[str, Path]): Location of the log. An existing file is overwritten.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'w')
+
+    def record(self, url: str, reason: str, **fields: Any) -> None:
+        with self._lock:
+            self.count += 1
+            self._file.write(json.dumps({'url': url, 'reason': reason, **fields}) + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,37 @@
+from src.config.logging import logger
+
+
+# Private BlobWriter attributes `cancel_upload` relies on. They exist in the google-cloud-storage
+# versions this repository supports, from the 2.12.0 pinned in requirements.txt up to 3.x.
+BLOB_WRITER_ATTRIBUTES = ('_upload_and_transport', '_buffer', '_blob')
+
+
+def cancel_upload(writer) -> None:
+    """
+    Discards a GCS BlobWriter without creating its object.
+
+    Closing a BlobWriter uploads what it buffered and finalizes the object, and so does dropping
+    it, because `IOBase.__del__` calls `close()`. BlobWriter has no public way to abandon an
+    upload, so here only its buffer is closed, which marks the writer as closed so that no
+    finalizer runs, and the resumable session is cancelled with a DELETE on its session URL if
+    chunks were already sent.
+
+    Args:
+        writer (google.cloud.storage.fileio.BlobWriter): Writer from `blob.open('wb')`, not closed yet.
+
+    Raises:
+        RuntimeError: If the installed google-cloud-storage changed the BlobWriter internals used here.
+    """
+    missing = [name for name in BLOB_WRITER_ATTRIBUTES if not hasattr(writer, name)]
+    if missing:
+        raise RuntimeError(f"Cannot cancel the upload: {type(writer).__name__} has no {', '.join(missing)}. "
+                           f"This google-cloud-storage version is not supported, install the one in requirements.txt")
+    upload_and_transport = writer._upload_and_transport
+    writer._buffer.close()
+    if upload_and_transport:
+        upload, transport = upload_and_transport
+        try:
+            transport.delete(upload.resumable_url)
+        except Exception as e:
+            # An unfinalized session expires after a week without creating an object
+            logger.error(f"Failed to cancel the upload of {writer._blob.name}: {e}")
@@ -0,0 +1,125 @@
+from src.config.logging import logger
+from urllib.parse import urlparse
+from typing import Dict
+import threading
+import random
+import time
+
+
+# Status codes that signal a transient problem on the server side and are worth retrying.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    The delay before retry `n` (0-based) is drawn uniformly from
+    [0, min(max_delay, base_delay * multiplier ** n)], which spreads retries from many concurrent
+    downloads instead of having them hit a struggling host in lock-step.
+    """
+
+    def __init__(self, max_retries: int = 10, base_delay: float = 0.5, max_delay: float = 30.0,
+                 multiplier: float = 2.0, jitter: bool = True):
+        """
+        Args:
+            max_retries (int): Maximum number of attempts per request.
+            base_delay (float): Delay cap in seconds for the first retry.
+            max_delay (float): Upper bound in seconds for any single delay.
+            multiplier (float): Growth factor of the delay cap between retries.
+            jitter (bool): Draw the delay uniformly below the cap instead of using the cap itself.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the number of seconds to wait before the next attempt.
+
+        Args:
+            attempt (int): The number of attempts already made, starting at 0.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        return random.uniform(0, cap) if self.jitter else cap
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker shared by every download in a run.
+
+    After `failure_threshold` consecutive failures the circuit for a host opens and requests to it
+    fail fast without touching the network. Once `reset_timeout` seconds have passed a single probe
+    request is let through (half-open); its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit of a host.
+            reset_timeout (float): Seconds an open circuit waits before allowing a probe.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._probing: Dict[str, float] = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def allow(self, url: str) -> bool:
+        """
+        Checks whether a request to the URL's host may be sent.
+
+        Args:
+            url (str): The URL about to be requested.
+
+        Returns:
+            bool: False if the host's circuit is open and the request should fail fast.
+        """
+        host = self.host(url)
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            now = time.monotonic()
+            # A probe that never reported back (e.g. it hit an unrelated error) is replaced after a timeout.
+            probe_started = self._probing.get(host)
+            if now - opened_at >= self.reset_timeout and (probe_started is None or now - probe_started >= self.reset_timeout):
+                logger.info(f"Circuit half-open for {host}, sending a probe request.")
+                self._probing[host] = now
+                return True
+            return False
+
+    def record_success(self, url: str) -> None:
+        """
+        Records a successful response from the URL's host and closes its circuit.
+        """
+        host = self.host(url)
+        with self._lock:
+            if host in self._opened_at:
+                logger.info(f"Circuit closed for {host}.")
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._probing.pop(host, None)
+
+    def record_failure(self, url: str) -> None:
+        """
+        Records a failed request to the URL's host, opening its circuit past the threshold.
+        """
+        host = self.host(url)
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            probing = self._probing.pop(host, None) is not None
+            if probing or self._failures[host] >= self.failure_threshold:
+                if host not in self._opened_at:
+                    logger.error(f"Circuit opened for {host} after {self._failures[host]} consecutive failures.")
+                self._opened_at[host] = time.monotonic()
@@ -0,0 +1,381 @@
+from google.auth.transport.requests import AuthorizedSession
+from google.api_core.exceptions import PreconditionFailed
+from google.auth.credentials import with_scopes_if_required
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.cloud.storage import transfer_manager
+from google.auth.credentials import Credentials
+from google.api_core.exceptions import NotFound
+from requests.adapters import HTTPAdapter
+from src.utils.resumable import cancel_upload
+from google.cloud import storage
+from typing import Iterator
+from typing import Optional
+from typing import Union
+from typing import Tuple
+from typing import BinaryIO
+from pathlib import Path
+import google_crc32c
+import google.auth
+import hashlib
+import base64
+import shutil
+import os
+
+
+# Files at least this large are sent to GCS as concurrently uploaded parts instead of a single stream
+CHUNKED_UPLOAD_THRESHOLD = 64 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def file_checksums(path: Union[str, Path]) -> Tuple[str, str]:
+    """
+    Computes the base64 MD5 and CRC32C of a file, in the encoding GCS reports for its objects.
+
+    Returns:
+        Tuple[str, str]: (md5_hash, crc32c).
+    """
+    md5 = hashlib.md5()
+    crc32c = google_crc32c.Checksum()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            md5.update(chunk)
+            crc32c.update(chunk)
+    return base64.b64encode(md5.digest()).decode(), base64.b64encode(crc32c.digest()).decode()
+
+
+class ObjectInfo:
+    """
+    Name, size, version and checksums of a stored object, as returned by `Storage.list` and `Storage.stat`.
+
+    Checksums use the base64 encoding of GCS. `md5_hash` may be None, e.g. for objects uploaded
+    to GCS in parts.
+    """
+
+    def __init__(self, name: str, size: int, generation: Optional[int] = None,
+                 md5_hash: Optional[str] = None, crc32c: Optional[str] = None):
+        self.name = name
+        self.size = size
+        self.generation = generation
+        self.md5_hash = md5_hash
+        self.crc32c = crc32c
+
+
+class LocalObjectInfo(ObjectInfo):
+    """
+    ObjectInfo of a file, whose checksums are only computed when they are first read.
+    """
+
+    def __init__(self, name: str, path: Path):
+        stat = path.stat()
+        self.name = name
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.path = path
+        self._checksums = None
+
+    def _checksum(self, index: int) -> str:
+        if self._checksums is None:
+            self._checksums = file_checksums(self.path)
+        return self._checksums[index]
+
+    @property
+    def md5_hash(self) -> str:
+        return self._checksum(0)
+
+    @property
+    def crc32c(self) -> str:
+        return self._checksum(1)
+
+
+class Storage:
+    """
+    Minimal object store interface used by the ingestion code.
+
+    Objects are addressed by '/'-separated names. Implementations must be safe to use from
+    several threads at once.
+    """
+
+    def uri(self, name: str) -> str:
+        """
+        Returns the URI recorded in document metadata for an object.
+        """
+        raise NotImplementedError
+
+    def list(self, prefix: str = '') -> Iterator[ObjectInfo]:
+        """
+        Lists the objects whose name starts with `prefix`.
+        """
+        raise NotImplementedError
+
+    def stat(self, name: str) -> Optional[ObjectInfo]:
+        """
+        Returns the object's info, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+    def put(self, name: str, source_file: Union[str, Path], content_type: Optional[str] = None) -> int:
+        """
+        Stores a local file under `name`, replacing any previous object.
+
+        Returns:
+            int: The number of bytes stored.
+        """
+        raise NotImplementedError
+
+    def get(self, name: str, destination: Union[str, Path], generation: Optional[int] = None) -> None:
+        """
+        Copies an object to a local file. The file only appears once it is complete.
+
+        Args:
+            name (str): The object name.
+            destination (Union[str, Path]): The local path.
+            generation (int, optional): Fail instead of reading any other version of the object.
+        """
+        raise NotImplementedError
+
+    def open_read(self, name: str) -> BinaryIO:
+        """
+        Opens an object for streaming reads.
+        """
+        raise NotImplementedError
+
+    def open_write(self, name: str, content_type: Optional[str] = None,
+                   buffer_size: int = READ_CHUNK_SIZE) -> 'ObjectWriter':
+        """
+        Opens an object for streaming writes through a buffer of `buffer_size` bytes.
+
+        The object only becomes visible when the writer is closed. Aborting a writer, which also
+        happens when an exception leaves its `with` block, discards what was written, and removes
+        the object if closing had already created it.
+        """
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        raise NotImplementedError
+
+
+class ObjectWriter:
+    """
+    Streaming writer returned by `Storage.open_write`.
+    """
+
+    def write(self, data: bytes) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> 'ObjectWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class GCSWriter(ObjectWriter):
+
+    def __init__(self, blob: storage.Blob, content_type: Optional[str], buffer_size: int):
+        self._blob = blob
+        self._writer = blob.open('wb', chunk_size=buffer_size, content_type=content_type,
+                                 ignore_flush=True, retry=DEFAULT_RETRY)
+
+    def write(self, data: bytes) -> int:
+        return self._writer.write(data)
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def abort(self) -> None:
+        # Dropping the BlobWriter would finalize it, so its upload is cancelled instead
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        if not writer.closed:
+            cancel_upload(writer)
+        elif self._blob.generation is not None:
+            # close() finalized the upload before failing; remove that generation and nothing newer
+            try:
+                self._blob.delete(if_generation_match=self._blob.generation)
+            except (NotFound, PreconditionFailed):
+                pass
+
+
+class LocalWriter(ObjectWriter):
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._temp_path = path.with_name(f'{path.name}.{os.getpid()}.{id(self)}.tmp')
+        self._file = open(self._temp_path, 'wb')
+
+    def write(self, data: bytes) -> int:
+        return self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+
+def pooled_client(credentials: Optional[Credentials] = None, project: Optional[str] = None,
+                  pool_size: int = 64) -> storage.Client:
+    """
+    Creates a GCS client whose HTTP session keeps up to `pool_size` connections open, so that
+    concurrent uploads and downloads do not queue for the default pool of 10.
+
+    Args:
+        credentials (google.auth.credentials.Credentials, optional): Credentials. Defaults to application default credentials.
+        project (str, optional): Project of the client. Defaults to the project of the default credentials.
+        pool_size (int): Maximum number of pooled HTTP connections.
+
+    Returns:
+        google.cloud.storage.client.Client: The client.
+    """
+    if credentials is None:
+        credentials, default_project = google.auth.default()
+        project = project or default_project
+    session = AuthorizedSession(with_scopes_if_required(credentials, storage.Client.SCOPE))
+    session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+
+class GCSStorage(Storage):
+    """
+    Storage backed by a Google Cloud Storage bucket.
+
+    The bucket handle is created once without an API call. Create one GCSStorage per run and
+    share it between threads; give it a client from `pooled_client` for many concurrent requests.
+    """
+
+    def __init__(self, bucket_name: str, client: Optional[storage.Client] = None, pool_size: int = 64,
+                 chunk_workers: int = 4):
+        """
+        Args:
+            bucket_name (str): Name of the bucket.
+            client (google.cloud.storage.client.Client, optional): GCS client, used as is. Defaults to
+                `pooled_client(pool_size=pool_size)` with application default credentials.
+            pool_size (int): Maximum number of pooled HTTP connections of the default client.
+            chunk_workers (int): Parallel part uploads for files above CHUNKED_UPLOAD_THRESHOLD.
+        """
+        self.client = client or pooled_client(pool_size=pool_size)
+        self.bucket_name = bucket_name
+        self.bucket = self.client.bucket(bucket_name)
+        self.chunk_workers = chunk_workers
+
+    @staticmethod
+    def _info(blob: storage.Blob) -> ObjectInfo:
+        return ObjectInfo(blob.name, blob.size, blob.generation, blob.md5_hash, blob.crc32c)
+
+    def uri(self, name: str) -> str:
+        return f'gs://{self.bucket_name}/{name}'
+
+    def list(self, prefix: str = '') -> Iterator[ObjectInfo]:
+        blobs = self.client.list_blobs(self.bucket_name, prefix=prefix or None,
+                                       fields='items(name,size,generation,md5Hash,crc32c),nextPageToken')
+        for blob in blobs:
+            yield self._info(blob)
+
+    def stat(self, name: str) -> Optional[ObjectInfo]:
+        blob = self.bucket.get_blob(name)
+        return self._info(blob) if blob is not None else None
+
+    def put(self, name: str, source_file: Union[str, Path], content_type: Optional[str] = None) -> int:
+        size = os.path.getsize(source_file)
+        blob = self.bucket.blob(name)
+        if content_type:
+            blob.content_type = content_type
+        if size >= CHUNKED_UPLOAD_THRESHOLD:
+            transfer_manager.upload_chunks_concurrently(str(source_file), blob, content_type=content_type,
+                                                        chunk_size=UPLOAD_CHUNK_SIZE,
+                                                        worker_type=transfer_manager.THREAD,
+                                                        max_workers=self.chunk_workers)
+        else:
+            blob.upload_from_filename(str(source_file), content_type=content_type)
+        return size
+
+    def get(self, name: str, destination: Union[str, Path], generation: Optional[int] = None) -> None:
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = destination.with_name(destination.name + '.tmp')
+        try:
+            self.bucket.blob(name).download_to_filename(str(temp_path), if_generation_match=generation)
+            os.replace(temp_path, destination)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def open_read(self, name: str) -> BinaryIO:
+        return self.bucket.blob(name).open('rb', chunk_size=READ_CHUNK_SIZE)
+
+    def open_write(self, name: str, content_type: Optional[str] = None,
+                   buffer_size: int = READ_CHUNK_SIZE) -> ObjectWriter:
+        return GCSWriter(self.bucket.blob(name), content_type, buffer_size)
+
+    def delete(self, name: str) -> None:
+        self.bucket.blob(name).delete()
+
+
+class LocalStorage(Storage):
+    """
+    Storage backed by a local directory, for development, benchmarks and load tests.
+
+    Every object is a file under `root`. Writes go through temporary files that are renamed
+    into place, and the file's modification time stands in for the GCS generation.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name: str) -> Path:
+        path = (self.root / name).resolve()
+        if path != self.root and self.root not in path.parents:
+            raise ValueError(f"Object name '{name}' escapes the storage root {self.root}")
+        return path
+
+    def uri(self, name: str) -> str:
+        return self._path(name).as_uri()
+
+    def list(self, prefix: str = '') -> Iterator[ObjectInfo]:
+        for path in sorted(self.root.rglob('*')):
+            name = path.relative_to(self.root).as_posix()
+            if path.is_file() and name.startswith(prefix) and not name.endswith('.tmp'):
+                yield LocalObjectInfo(name, path)
+
+    def stat(self, name: str) -> Optional[ObjectInfo]:
+        path = self._path(name)
+        return LocalObjectInfo(name, path) if path.is_file() else None
+
+    def put(self, name: str, source_file: Union[str, Path], content_type: Optional[str] = None) -> int:
+        with open(source_file, 'rb') as source, self.open_write(name) as writer:
+            shutil.copyfileobj(source, writer, READ_CHUNK_SIZE)
+        return os.path.getsize(source_file)
+
+    def get(self, name: str, destination: Union[str, Path], generation: Optional[int] = None) -> None:
+        path = self._path(name)
+        if generation is not None and path.stat().st_mtime_ns != generation:
+            raise FileNotFoundError(f"Generation {generation} of {name} no longer exists")
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = destination.with_name(destination.name + '.tmp')
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, destination)
+
+    def open_read(self, name: str) -> BinaryIO:
+        return open(self._path(name), 'rb')
+
+    def open_write(self, name: str, content_type: Optional[str] = None,
+                   buffer_size: int = READ_CHUNK_SIZE) -> ObjectWriter:
+        return LocalWriter(self._path(name))
+
+    def delete(self, name: str) -> None:
+        self._path(name).unlink()
@@ -0,0 +1,143 @@
+from src.utils.manifest import resume_hasher
+from src.config.logging import logger
+from typing import Optional
+from typing import Iterator
+from typing import Union
+from typing import Tuple
+from typing import Dict
+from typing import List
+from typing import Any
+from pathlib import Path
+import threading
+import hashlib
+import json
+import os
+
+
+class ContentStore:
+    """
+    A content-addressed store for downloaded PDFs.
+
+    Every document is stored exactly once under the sha256 of its bytes, so two different PDFs
+    can never overwrite each other and the same PDF reachable from several URLs takes the disk
+    space of one. An append-only JSONL index maps each (URL, company, title) to the hash of the
+    document it resolved to; a URL listed under several companies has one record per company.
+
+    Layout:
+        <root>/objects/<sha[:2]>/<sha>.pdf
+        <root>/incoming/              in-flight downloads
+        <root>/index.jsonl            {"url", "company", "title", "sha256"} per line
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Opens (or creates) a store rooted at the given directory.
+
+        Args:
+            root (Union[str, Path]): Directory holding the objects and the index.
+        """
+        self.root = Path(root)
+        self.objects_dir = self.root / 'objects'
+        self.incoming_dir = self.root / 'incoming'
+        self.index_path = self.root / 'index.jsonl'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.index = self._load_index()
+
+    @staticmethod
+    def _key(record: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        # The same URL can be listed under several companies, each of which keeps its own mapping
+        return record.get('url') or f"{record.get('company')}/{record.get('title')}", record.get('company')
+
+    def _load_index(self) -> Dict[Tuple[str, Optional[str]], Dict[str, Any]]:
+        index = {}
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        # Later lines win, so a URL whose content changed points at the new hash.
+                        index[self._key(record)] = record
+        return index
+
+    def object_path(self, sha256: str) -> Path:
+        """
+        Returns the path of the object with the given hash.
+
+        Args:
+            sha256 (str): Hex digest of the document.
+
+        Returns:
+            Path: Where the document is (or would be) stored.
+        """
+        return self.objects_dir / sha256[:2] / f'{sha256}.pdf'
+
+    def incoming_path(self, url: str) -> Path:
+        """
+        Returns a collision-free temporary download path for a URL.
+
+        Args:
+            url (str): The source URL.
+
+        Returns:
+            Path: A path under the incoming directory derived from the URL.
+        """
+        return self.incoming_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.pdf"
+
+    def add(self, path: Union[str, Path], sha256: Optional[str] = None, url: Optional[str] = None,
+            company: Optional[str] = None, title: Optional[str] = None) -> Path:
+        """
+        Moves a file into the store and records where it came from.
+
+        If an identical document is already stored, the new copy is discarded.
+
+        Args:
+            path (Union[str, Path]): The file to ingest. It is moved, not copied.
+            sha256 (str, optional): Hex digest of the file, computed if not given.
+            url (str, optional): The URL the file was downloaded from.
+            company (str, optional): The company the document belongs to.
+            title (str, optional): The document title.
+
+        Returns:
+            Path: The path of the stored object.
+        """
+        sha256 = sha256 or resume_hasher(path).hexdigest()
+        target = self.object_path(sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            logger.info(f"Duplicate of {target.name}, discarding {path}")
+            os.remove(path)
+        else:
+            os.replace(path, target)
+
+        record = {'url': url, 'company': company, 'title': title, 'sha256': sha256}
+        with self._lock:
+            if self.index.get(self._key(record)) != record:
+                self.index[self._key(record)] = record
+                with open(self.index_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+        return target
+
+    def records(self) -> List[Dict[str, Any]]:
+        """
+        Returns the current mapping records, one per URL and company.
+        """
+        return list(self.index.values())
+
+    def documents(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterates over the unique stored documents together with every record pointing at them.
+
+        Yields:
+            Dict[str, Any]: {'sha256', 'path', 'records'} for each document present on disk.
+        """
+        grouped = {}
+        for record in self.index.values():
+            grouped.setdefault(record['sha256'], []).append(record)
+        for sha256, records in grouped.items():
+            path = self.object_path(sha256)
+            if path.exists():
+                yield {'sha256': sha256, 'path': path, 'records': records}
+            else:
+                logger.error(f"Index refers to missing object {sha256}")
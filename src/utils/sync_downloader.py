@@ -1,50 +1,140 @@
+from src.utils.retry import RETRYABLE_STATUS_CODES
+from src.utils.preflight import SKIP_LOG_FILENAME
+from src.utils.manifest import DownloadManifest
+from src.utils.retry import CircuitBreaker
+from src.utils.preflight import Preflight
+from src.utils.preflight import log_skip
+from src.utils.retry import RetryPolicy
+from src.utils.preflight import SkipLog
+from src.utils.manifest import resume_hasher
+from src.utils.manifest import partial_path
+from src.utils.manifest import CHUNK_SIZE
+from concurrent.futures import ThreadPoolExecutor
 from src.config.logging import logger
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 import jsonlines
+import threading
 import requests
+import hashlib
 import time
 import csv
+import os
 
 
-def download_file(url, destination, max_retries=3, timeout_duration=10):
+MANIFEST_FILENAME = 'download-manifest.json'
+SESSION_POOL_SIZE = 10
+
+_thread_local = threading.local()
+
+
+def download_file(url, destination, max_retries=3, timeout_duration=10, manifest=None,
+                  store=None, company=None, title=None, policy=None, breaker=None, session=None,
+                  preflight=None, skip_log=None):
     """
     Synchronously downloads a file from a given URL and saves it to the specified destination. 
-    Implements retry logic with quick retries for certain connection errors.
+    Retries connection errors, timeouts and transient server errors with jittered exponential
+    backoff, and fails fast while the circuit breaker reports the host as unhealthy.
+
+    When a manifest is given, the request is made conditional on the validators recorded by a
+    previous run and an interrupted transfer is resumed with an HTTP Range request.
 
     Args:
         url (str): The URL of the file to download.
         destination (Path): The path where the file should be saved.
         max_retries (int): Maximum number of retries for the download.
         timeout_duration (int): The total timeout duration for each attempt in seconds.
+        manifest (DownloadManifest, optional): Manifest of previous downloads.
+        store (ContentStore, optional): Content-addressed store that receives the finished file.
+        company (str, optional): Company recorded in the store index.
+        title (str, optional): Title recorded in the store index.
+        policy (RetryPolicy, optional): Retry policy. Defaults to exponential backoff with `max_retries` attempts.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker shared across downloads.
+        session (requests.Session, optional): Session whose connection pool is reused across downloads.
+        preflight (Preflight, optional): Rejects responses that are not PDFs or exceed the size limit.
+        skip_log (SkipLog, optional): Receives the URL and the reason when the preflight rejects it.
 
     Returns:
-        str: The path of the downloaded file, or None if the download fails.
+        str: The path of the downloaded file, or None if the download fails or is skipped.
     """
+    policy = policy or RetryPolicy(max_retries=max_retries)
     retries = 0
+    partial = partial_path(destination)
 
-    while retries < max_retries:
+    while retries < policy.max_retries:
+        if breaker and not breaker.allow(url):
+            logger.error(f"Circuit open for {breaker.host(url)}, skipping {url}")
+            return None
         try:
-            response = requests.get(url, timeout=timeout_duration)
-            if response.status_code == 200:
-                with open(destination, 'wb') as f:
-                    f.write(response.content)
-                return destination
-            else:
-                logger.info(f"Failed to download {url}. Status code: {response.status_code}")
-                return None
+            headers = manifest.request_headers(url, destination) if manifest else {}
+            with (session or requests).get(url, headers=headers, timeout=timeout_duration, stream=True) as response:
+                if response.status_code == 304 and manifest:
+                    logger.info(f"Not modified since last run: {url}")
+                    if breaker:
+                        breaker.record_success(url)
+                    return manifest.get(url)['path']
+                elif response.status_code == 416:
+                    logger.error(f"Stale partial download for {url}, restarting from the first byte.")
+                    partial.unlink(missing_ok=True)
+                elif response.status_code in (200, 206):
+                    resume = response.status_code == 206
+                    if manifest and not resume:
+                        manifest.begin(url, response.headers)
+                    reason = preflight.check_headers(response.headers) if preflight else None
+                    if reason is None:
+                        hasher = resume_hasher(partial) if resume else hashlib.sha256()
+                        check = preflight.body_check(partial.stat().st_size if resume else 0) if preflight else None
+                        with open(partial, 'ab' if resume else 'wb') as f:
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                reason = check.feed(chunk) if check else None
+                                if reason:
+                                    break
+                                hasher.update(chunk)
+                                f.write(chunk)
+                        if check and reason is None:
+                            reason = check.finish()
+                    if reason:
+                        log_skip(url, reason)
+                        partial.unlink(missing_ok=True)
+                        if skip_log:
+                            skip_log.record(url, reason, http_status=response.status_code,
+                                            content_type=response.headers.get('Content-Type'), final_url=response.url)
+                        if breaker:
+                            breaker.record_success(url)
+                        return None
+                    os.replace(partial, destination)
+                    if store:
+                        destination = store.add(destination, hasher.hexdigest(), url, company, title)
+                    if manifest:
+                        manifest.complete(url, destination, response.headers, hasher.hexdigest())
+                    if breaker:
+                        breaker.record_success(url)
+                    return destination
+                elif response.status_code in RETRYABLE_STATUS_CODES:
+                    logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Status code: {response.status_code}")
+                    if breaker:
+                        breaker.record_failure(url)
+                else:
+                    logger.info(f"Failed to download {url}. Status code: {response.status_code}")
+                    if breaker:
+                        breaker.record_success(url)  # The host answered, the URL itself is bad
+                    return None
         except requests.exceptions.ConnectionError:
-            logger.error(f"Quick retry {retries + 1}/{max_retries} for {url} due to connection error.")
-            time.sleep(1)  # Short delay for quick retries
+            logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url} due to connection error.")
+            if breaker:
+                breaker.record_failure(url)
         except (requests.exceptions.Timeout, requests.exceptions.RequestException) as e:
-            logger.error(f"Retry {retries + 1}/{max_retries} for {url}. Error: {type(e).__name__}")
-            time.sleep(1)  # Delay for other errors
+            logger.error(f"Retry {retries + 1}/{policy.max_retries} for {url}. Error: {type(e).__name__}")
+            if breaker:
+                breaker.record_failure(url)
         except Exception as e:
             logger.error(type(e).__name__)
 
-
         retries += 1
+        if retries < policy.max_retries:
+            time.sleep(policy.backoff(retries - 1))
 
-    print(f"Failed to download {url} after {max_retries} retries.")
+    logger.error(f"Failed to download {url} after {policy.max_retries} retries.")
     return None
 
 def sanitize_filename(filename):
@@ -59,24 +149,104 @@ def sanitize_filename(filename):
     """
     return "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).rstrip()
 
-def download_from_jsonl(jsonl_path, output_folder):
+def get_session():
+    """
+    Returns the calling thread's pooled requests session, creating it on first use.
+
+    Sessions are not shared between threads, but each keeps its keep-alive connections
+    across all the downloads its thread performs.
+
+    Returns:
+        requests.Session: The thread-local session.
+    """
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=SESSION_POOL_SIZE, pool_maxsize=SESSION_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _thread_local.session = session
+    return session
+
+
+def _run_downloads(jobs, workers):
+    """
+    Runs download jobs sequentially or on a bounded thread pool.
+
+    At most `2 * workers` jobs are queued at a time, so huge input files are not read into
+    memory up front. Jobs writing to the same destination never run concurrently.
+
+    Args:
+        jobs (Iterable[dict]): Keyword arguments for `download_file`.
+        workers (int): Number of download threads; 1 downloads in the calling thread.
+    """
+    if workers <= 1:
+        for job in jobs:
+            download_file(session=get_session(), **job)
+        return
+
+    slots = threading.BoundedSemaphore(workers * 2)
+    destination_locks = {}
+    locks_guard = threading.Lock()
+
+    def run(job):
+        try:
+            with locks_guard:
+                lock = destination_locks.setdefault(str(job['destination']), threading.Lock())
+            with lock:
+                download_file(session=get_session(), **job)
+        except Exception as e:
+            logger.error(f"Failed to download {job['url']}: {e}")
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for job in jobs:
+            slots.acquire()
+            executor.submit(run, job)
+
+
+def download_from_jsonl(jsonl_path, output_folder, manifest_path=None, store=None, policy=None, breaker=None, workers=1,
+                        preflight=None):
     """
     Reads a JSONL file and downloads each file listed in it.
 
     Args:
         jsonl_path (Path): Path to the JSONL file.
         output_folder (Path): Folder to save the downloaded files.
+        manifest_path (Path, optional): Download manifest location. Defaults to 'download-manifest.json' in the output folder.
+        store (ContentStore, optional): Store the PDFs in a content-addressed store instead of by filename.
+        policy (RetryPolicy, optional): Retry policy applied to every download.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker. A fresh one is shared by the whole run by default.
+        workers (int): Number of parallel download threads, each with its own pooled session.
+        preflight (Preflight, optional): Pre-flight checks applied to every response. Defaults to `Preflight()`;
+            skipped URLs are listed in 'download-skipped.jsonl' in the output folder.
     """
     output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or output_folder / MANIFEST_FILENAME)
+    breaker = breaker or CircuitBreaker()
+    preflight = preflight or Preflight()
+    skip_log = SkipLog(output_folder / SKIP_LOG_FILENAME)
+
+    def jobs():
+        with jsonlines.open(jsonl_path) as reader:
+            for item in reader:
+                title = sanitize_filename(item["title"]) + ".pdf"
+                destination = store.incoming_path(item["link"]) if store else output_folder / title
+                yield dict(url=item["link"], destination=destination, manifest=manifest, store=store,
+                           title=item["title"], policy=policy, breaker=breaker,
+                           preflight=preflight, skip_log=skip_log)
 
-    with jsonlines.open(jsonl_path) as reader:
-        for item in reader:
-            title = sanitize_filename(item["title"]) + ".pdf"
-            destination = output_folder / title
-            download_file(item["link"], destination)
+    try:
+        _run_downloads(jobs(), workers)
+    finally:
+        manifest.close()
+        skip_log.close()
+    logger.info(f"Skipped {skip_log.count} URLs that failed the pre-flight checks, see {skip_log.path}")
 
-def download_from_csv(csv_path, output_folder):
+def download_from_csv(csv_path, output_folder, manifest_path=None, store=None, policy=None, breaker=None, workers=1,
+                      preflight=None):
     """
     Reads URLs from a CSV file and downloads each as a file.
     The CSV file should have a column named 'resolved_pdf_url' containing the URLs.
@@ -84,20 +254,43 @@ def download_from_csv(csv_path, output_folder):
     Args:
         csv_path (Path): Path to the CSV file containing URLs.
         output_folder (Path): Folder to save the downloaded files.
+        manifest_path (Path, optional): Download manifest location. Defaults to 'download-manifest.json' in the output folder.
+        store (ContentStore, optional): Store the PDFs in a content-addressed store instead of by filename.
+        policy (RetryPolicy, optional): Retry policy applied to every download.
+        breaker (CircuitBreaker, optional): Per-host circuit breaker. A fresh one is shared by the whole run by default.
+        workers (int): Number of parallel download threads, each with its own pooled session.
+        preflight (Preflight, optional): Pre-flight checks applied to every response. Defaults to `Preflight()`;
+            skipped URLs are listed in 'download-skipped.jsonl' in the output folder.
     """
     output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest(manifest_path or output_folder / MANIFEST_FILENAME)
+    breaker = breaker or CircuitBreaker()
+    preflight = preflight or Preflight()
+    skip_log = SkipLog(output_folder / SKIP_LOG_FILENAME)
+
+    def jobs():
+        with open(csv_path, 'r', newline='') as file:
+            csv_reader = csv.DictReader(file)
+            for row in csv_reader:
+                url = row.get('resolved_pdf_url', '').strip()
+                bank_name = row.get('bank', '').strip()
+                if url:
+                    filename = url.split('/')[-1]
+                    if store:
+                        destination = store.incoming_path(url)
+                    else:
+                        output_path = Path(f'{output_folder}/{bank_name}')
+                        output_path.mkdir(parents=True, exist_ok=True)
+                        destination = f'{output_path}/{sanitize_filename(filename)}'
+                    logger.info(f'Downloading PDF from: {url}')
+                    yield dict(url=url, destination=destination, manifest=manifest, store=store,
+                               company=bank_name, title=filename, policy=policy, breaker=breaker,
+                               preflight=preflight, skip_log=skip_log)
 
-    with open(csv_path, 'r', newline='') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            url = row.get('resolved_pdf_url', '').strip()
-            bank_name = row.get('bank', '').strip()
-            output_path = Path(f'{output_folder}/{bank_name}')
-            output_path.mkdir(parents=True, exist_ok=True)
-            if url:
-                filename = url.split('/')[-1]
-                sanitized_filename = sanitize_filename(filename)
-                destination = f'{output_path}/{sanitized_filename}'
-                logger.info(f'Downloading PDF from: {url}')
-                download_file(url, destination)
+    try:
+        _run_downloads(jobs(), workers)
+    finally:
+        manifest.close()
+        skip_log.close()
+    logger.info(f"Skipped {skip_log.count} URLs that failed the pre-flight checks, see {skip_log.path}")
@@ -0,0 +1,127 @@
+from src.config.logging import logger
+from urllib.parse import urlparse
+from typing import Sequence
+from typing import Optional
+from typing import Union
+from typing import Dict
+from typing import List
+from typing import Any
+from pathlib import Path
+import threading
+import math
+import json
+import time
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """
+    Computes a percentile with linear interpolation between the closest ranks.
+
+    Args:
+        values (Sequence[float]): The observations.
+        q (float): The percentile to compute, between 0 and 100.
+
+    Returns:
+        Optional[float]: The percentile, or None if there are no observations.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class RunTelemetry:
+    """
+    Structured JSONL log of a download run, one record per URL.
+
+    Records are appended as soon as each download finishes, so a crashed run still leaves a usable
+    log. `close` logs a per-host summary of bytes, throughput and latency percentiles and writes it
+    next to the log as '<name>-summary.json'.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path (Union[str, Path]): Location of the JSONL log. An existing file is overwritten.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.records: List[Dict[str, Any]] = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'w')
+
+    def record(self, url: str, status: str, **fields: Any) -> None:
+        """
+        Appends the outcome of one URL to the log.
+
+        Args:
+            url (str): The requested URL.
+            status (str): Outcome of the download, e.g. 'downloaded', 'not_modified' or 'failed'.
+            **fields: Further attributes such as bytes, duration_s, retries, http_status,
+                final_url, content_type and error.
+        """
+        record = {'url': url, 'host': urlparse(url).netloc.lower(), 'status': status, **fields}
+        with self._lock:
+            self.records.append(record)
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    @staticmethod
+    def _summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        durations = [r.get('duration_s', 0.0) for r in records]
+        p50, p95 = percentile(durations, 50), percentile(durations, 95)
+        transfer_time = sum(r.get('duration_s', 0.0) for r in records if r.get('bytes'))
+        total_bytes = sum(r.get('bytes', 0) for r in records)
+        statuses = {}
+        for r in records:
+            statuses[r['status']] = statuses.get(r['status'], 0) + 1
+        return {
+            'urls': len(records),
+            'statuses': statuses,
+            'bytes': total_bytes,
+            'mb_per_s': round(total_bytes / transfer_time / 1e6, 3) if transfer_time else None,
+            'p50_s': round(p50, 3) if p50 is not None else None,
+            'p95_s': round(p95, 3) if p95 is not None else None,
+            'max_s': max(durations) if durations else None,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarizes the run overall and per host.
+
+        Returns:
+            Dict[str, Any]: {'total': {...}, 'hosts': {host: {...}}, 'wall_time_s': float}.
+        """
+        by_host = {}
+        for record in self.records:
+            by_host.setdefault(record['host'], []).append(record)
+        return {
+            'wall_time_s': round(time.time() - self.started, 3),
+            'total': self._summarize(self.records),
+            'hosts': {host: self._summarize(records) for host, records in sorted(by_host.items())},
+        }
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Closes the log, then logs and saves the run summary.
+
+        Returns:
+            Dict[str, Any]: The run summary.
+        """
+        self._file.close()
+        summary = self.summary()
+        summary_path = self.path.with_name(f'{self.path.stem}-summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        total = summary['total']
+        logger.info(f"Download run finished in {summary['wall_time_s']}s: {total['urls']} URLs, "
+                    f"{total['bytes'] / 1e6:.1f} MB, statuses {total['statuses']}, p95 {total['p95_s']}s per file")
+        for host, stats in summary['hosts'].items():
+            logger.info(f"  {host}: {stats['urls']} URLs, {stats['bytes'] / 1e6:.1f} MB at {stats['mb_per_s']} MB/s, "
+                        f"p50 {stats['p50_s']}s, p95 {stats['p95_s']}s, statuses {stats['statuses']}")
+        logger.info(f"Run log written to {self.path}, summary to {summary_path}")
+        return summary
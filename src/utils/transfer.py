@@ -0,0 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.metadata import document_json_data
+from src.utils.storage import file_checksums
+from src.utils.metadata import metadata_record
+from src.utils.metadata import write_metadata
+from src.utils.metadata import DELTA_FILENAME
+from src.utils.metadata import SHARD_PREFIX
+from src.utils.metadata import content_id
+from src.utils.store import ContentStore
+from src.utils.storage import ObjectInfo
+from src.config.logging import logger
+from src.utils.storage import Storage
+from pathlib import Path
+from typing import Sequence
+from typing import Optional
+from typing import Union
+from typing import Tuple
+from typing import List
+from typing import Dict
+from typing import Any
+import threading
+import time
+import os
+
+
+class UploadProgress:
+    """
+    Thread-safe counters of an upload run, logged at every 5% of the files and summarized at the end.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.uploaded = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._step = max(1, total // 20)
+        self._lock = threading.Lock()
+
+    def update(self, size: int = 0, ok: bool = True, unchanged: bool = False) -> None:
+        with self._lock:
+            if unchanged:
+                self.unchanged += 1
+            elif ok:
+                self.uploaded += 1
+                self.bytes += size
+            else:
+                self.failed += 1
+            done = self.uploaded + self.unchanged + self.failed
+            if done % self._step == 0 or done == self.total:
+                elapsed = time.perf_counter() - self.started
+                logger.info(f"Uploaded {done}/{self.total} files, {self.bytes / 1e6:.1f} MB "
+                            f"at {self.bytes / elapsed / 1e6 if elapsed else 0.0:.2f} MB/s")
+
+    def summary(self) -> dict:
+        """
+        Logs and returns the totals of the run.
+
+        Returns:
+            dict: Files uploaded, unchanged and failed, bytes, elapsed seconds and throughput in MB/s and files/s.
+        """
+        elapsed = time.perf_counter() - self.started
+        summary = {
+            'uploaded': self.uploaded,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'bytes': self.bytes,
+            'elapsed_s': round(elapsed, 3),
+            'mb_per_s': round(self.bytes / elapsed / 1e6, 3) if elapsed else None,
+            'files_per_s': round(self.uploaded / elapsed, 2) if elapsed else None,
+        }
+        logger.info(f"Upload finished: {summary['uploaded']} files ({summary['bytes'] / 1e6:.1f} MB) in "
+                    f"{summary['elapsed_s']}s, {summary['mb_per_s']} MB/s, {summary['files_per_s']} files/s, "
+                    f"{summary['unchanged']} unchanged, {summary['failed']} failed")
+        return summary
+
+
+def object_matches(source_file: Union[str, Path], info: Optional[ObjectInfo]) -> bool:
+    """
+    Tells whether a stored object already holds the content of a local file.
+
+    Sizes are compared first, so the file is only read when they are equal. Objects without an
+    MD5, such as GCS objects uploaded in parts, are compared by CRC32C instead.
+
+    Args:
+        source_file (Union[str, Path]): The local file.
+        info (ObjectInfo, optional): The listed object, or None if there is none.
+
+    Returns:
+        bool: True if the file does not need to be uploaded.
+    """
+    if info is None or info.size != os.path.getsize(source_file):
+        return False
+    md5_hash, crc32c = file_checksums(source_file)
+    if info.md5_hash:
+        return info.md5_hash == md5_hash
+    return info.crc32c == crc32c
+
+
+def upload_many(storage: Storage, files: Sequence[Tuple[Union[str, Path], str]], workers: int = 16,
+                remote: Optional[Dict[str, ObjectInfo]] = None) -> List[bool]:
+    """
+    Uploads files to a storage backend on a thread pool.
+
+    Args:
+        storage (Storage): Target storage, e.g. a GCSStorage or a LocalStorage.
+        files (Sequence[Tuple[Union[str, Path], str]]): (source_file, object_name) pairs.
+        workers (int): Number of files uploaded concurrently.
+        remote (Dict[str, ObjectInfo], optional): Listed objects by name. Files whose object already
+            has the same size and checksum are not uploaded again.
+
+    Returns:
+        List[bool]: Whether each file is stored after the run, in the order of `files`.
+    """
+    progress = UploadProgress(len(files))
+
+    def run(item: Tuple[Union[str, Path], str]) -> bool:
+        source_file, name = item
+        try:
+            if remote is not None and object_matches(source_file, remote.get(name)):
+                progress.update(unchanged=True)
+                return True
+            size = storage.put(name, source_file)
+        except Exception as e:
+            logger.error(f"Failed to upload {source_file} to {storage.uri(name)}: {e}")
+            progress.update(ok=False)
+            return False
+        progress.update(size)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, files))
+    progress.summary()
+    return results
+
+
+def sync_many(storage: Storage, files: Sequence[Tuple[Union[str, Path], str]], prefix: str = '',
+              delete: bool = False, workers: int = 16) -> List[bool]:
+    """
+    Incrementally uploads files: only new or changed files are sent.
+
+    The prefix is listed once up front. With `delete`, PDFs under the prefix that are not among
+    `files` are removed afterwards; other objects such as the metadata shards are kept.
+
+    Args:
+        storage (Storage): Target storage.
+        files (Sequence[Tuple[Union[str, Path], str]]): (source_file, object_name) pairs.
+        prefix (str): Prefix the object names live under.
+        delete (bool): Delete stored PDFs that no longer exist locally.
+        workers (int): Number of files checked and uploaded concurrently.
+
+    Returns:
+        List[bool]: Whether each file is stored after the sync, in the order of `files`.
+    """
+    remote = {info.name: info for info in storage.list(prefix)}
+    logger.info(f"Found {len(remote)} objects under {storage.uri(prefix)}")
+    results = upload_many(storage, files, workers, remote)
+
+    if delete:
+        local_names = {name for _, name in files}
+        stale = [name for name in remote if name.endswith('.pdf') and name not in local_names]
+
+        def remove(name: str) -> None:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.error(f"Failed to delete {storage.uri(name)}: {e}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(remove, stale))
+        logger.info(f"Deleted {len(stale)} stored PDFs that are no longer present locally")
+    return results
+
+
+def ingest_store(store: ContentStore, target: Storage, metadata_folder: Union[str, Path], workers: int = 16,
+                 incremental: bool = False, delete: bool = False) -> Dict[str, Any]:
+    """
+    Uploads each unique document of a content-addressed store once and writes its metadata.
+
+    The object is named after the document's sha256, so identical PDFs downloaded from several URLs
+    are uploaded a single time. Its metadata lists every company, title and URL the document was
+    found under, see `metadata.document_json_data`, and its ID is derived from the sha256.
+
+    Args:
+        store (ContentStore): The downloaded documents.
+        target (Storage): Target storage.
+        metadata_folder (Union[str, Path]): Folder receiving the metadata shards and the delta.
+        workers (int): Number of files uploaded concurrently.
+        incremental (bool): Only upload documents that are not stored yet, see `sync_many`.
+        delete (bool): With `incremental`, delete stored PDFs that are no longer in the store.
+
+    Returns:
+        Dict[str, Any]: Documents found and stored, and the metadata counts of `metadata.write_metadata`.
+    """
+    documents = list(store.documents())
+    files = [(document['path'], f"{document['sha256']}.pdf") for document in documents]
+    if incremental:
+        results = sync_many(target, files, delete=delete, workers=workers)
+    else:
+        results = upload_many(target, files, workers)
+
+    records = []
+    for document, uploaded in zip(documents, results):
+        if uploaded:
+            uri = target.uri(f"{document['sha256']}.pdf")
+            records.append(metadata_record(content_id(document['sha256']), uri, document_json_data(document['records'])))
+    # The store lists every document, so those no longer in it are removed; failed uploads keep their last record
+    counts = write_metadata(records, metadata_folder,
+                            source_ids=[content_id(document['sha256']) for document in documents])
+
+    logger.info(f"{sum(results)} of {len(documents)} unique PDFs stored")
+    return {'documents': len(documents), 'stored': sum(results), **counts}
+
+
+def upload_metadata(target: Storage, metadata_folder: Union[str, Path]) -> None:
+    """
+    Uploads the metadata shards and the delta under the 'metadata/' prefix.
+
+    Shards left over from a previous run with more shards are deleted, so 'metadata/metadata-*.jsonl'
+    always matches exactly the current documents.
+
+    Args:
+        target (Storage): Target storage.
+        metadata_folder (Union[str, Path]): Folder written by `metadata.write_metadata`.
+    """
+    paths = sorted(Path(metadata_folder).glob(f'{SHARD_PREFIX}*.jsonl')) + [Path(metadata_folder, DELTA_FILENAME)]
+    for path in paths:
+        target.put(f'metadata/{path.name}', path, content_type='application/json')
+
+    names = {f'metadata/{path.name}' for path in paths}
+    for info in list(target.list(f'metadata/{SHARD_PREFIX}')):
+        if info.name not in names:
+            target.delete(info.name)
+    logger.info(f"Successfully uploaded {len(paths)} metadata files from {metadata_folder} to {target.uri('metadata/')}")
@@ -1,53 +1,78 @@
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+from src.utils.transfer import upload_many
+from src.utils.storage import pooled_client
+from src.utils.storage import GCSStorage
+from src.utils.transfer import sync_many
 from src.config.logging import logger
+from src.utils.storage import Storage
 from src.config.setup import config
 from google.cloud import storage
+from typing import Optional
 from pathlib import Path
 from typing import Union
 
 
 def initialize_gcs_client() -> storage.Client:
     """
-    Initialize the Google Cloud Storage client using provided service account credentials.
+    Initialize the Google Cloud Storage client using provided service account credentials, with a
+    connection pool sized for concurrent transfers.
 
     Returns:
         google.cloud.storage.client.Client: Initialized GCS client.
     """
     try:
         credentials = ServiceAccountCredentials.from_service_account_file(config.CREDENTIALS_PATH)
-        return storage.Client(credentials=credentials, project=config.PROJECT_ID)
+        return pooled_client(credentials, config.PROJECT_ID)
     except Exception as e:
         logger.error(f"Failed to initialize GCS client: {e}")
 
 
-def upload_to_gcs(client: storage.Client, source_file: Union[str, Path], destination_blob_name: str) -> None:
+def doc_search_storage(client: Optional[storage.Client] = None) -> GCSStorage:
+    """
+    Returns the storage backend of the DOC_SEARCH_BUCKET.
+
+    Args:
+        client (google.cloud.storage.client.Client, optional): GCS client. Defaults to `initialize_gcs_client()`.
+
+    Returns:
+        GCSStorage: The bucket as a Storage.
+    """
+    return GCSStorage(config.DOC_SEARCH_BUCKET, client or initialize_gcs_client())
+
+
+def upload_to_gcs(target: Storage, source_file: Union[str, Path], destination_blob_name: str) -> None:
     """
     Uploads a file to the specified GCS bucket.
 
     Args:
-        client (google.cloud.storage.client.Client): Initialized GCS client.
+        target (Storage): The bucket, e.g. from `doc_search_storage()`. Create it once and reuse it for every file.
         source_file (Union[str, Path]): Path to the file to be uploaded.
         destination_blob_name (str): Desired blob name in the GCS bucket.
     """
     try:
-        bucket = client.get_bucket(config.DOC_SEARCH_BUCKET)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(str(source_file))
-        logger.info(f"Successfully uploaded {source_file} to {config.DOC_SEARCH_BUCKET}/{destination_blob_name}")
+        target.put(destination_blob_name, source_file)
+        logger.info(f"Successfully uploaded {source_file} to {target.uri(destination_blob_name)}")
     except Exception as e:
         logger.error(f"Failed to upload {source_file} to GCS: {e}")
 
 
-def upload(pdf_folder: Union[str, Path]) -> None:
+def upload(pdf_folder: Union[str, Path], workers: int = 16, incremental: bool = False, delete: bool = False,
+           target: Optional[Storage] = None) -> None:
     """
-    Main function to iterate over PDFs and upload them to GCS.
+    Main function to upload the PDFs of a folder concurrently.
 
     Args:
         pdf_folder (Union[str, Path]): Path to the folder containing PDFs.
+        workers (int): Number of files uploaded concurrently.
+        incremental (bool): Only upload PDFs that are new or changed, see `transfer.sync_many`.
+        delete (bool): With `incremental`, delete remote PDFs that are no longer in the folder.
+        target (Storage, optional): Target storage. Defaults to the DOC_SEARCH_BUCKET.
     """
-    client = initialize_gcs_client()
-
-    for pdf_file in Path(pdf_folder).glob("*.pdf"):
-        destination_blob_name = pdf_file.name
-        upload_to_gcs(client, pdf_file, destination_blob_name)
-    logger.info("All PDFs uploaded successfully!")
+    target = target or doc_search_storage()
+    files = [(pdf_file, pdf_file.name) for pdf_file in Path(pdf_folder).glob("*.pdf")]
+    if incremental:
+        results = sync_many(target, files, delete=delete, workers=workers)
+    else:
+        results = upload_many(target, files, workers)
+    if all(results):
+        logger.info("All PDFs uploaded successfully!")
@@ -0,0 +1,78 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.query.cache import EmbeddingCache
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_cached_vectors_survive_reopening(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    expected = vectors(3)
+    cache.put(['a', 'b', 'c'], expected)
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path)
+    found = reopened.get(['c', 'missing', 'a'])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[0], expected[2])
+    np.testing.assert_array_equal(found[2], expected[0])
+    assert (reopened.hits, reopened.misses) == (2, 1)
+
+
+def test_unflushed_entries_are_visible_in_process_only(tmp_path):
+    cache = EmbeddingCache(tmp_path, flush_every=100)
+    cache.put(['a'], vectors(1))
+    assert cache.get(['a'])[0] is not None
+    assert EmbeddingCache(tmp_path).get(['a']) == [None]
+    cache.flush()
+    assert EmbeddingCache(tmp_path).get(['a'])[0] is not None
+
+
+def test_index_is_flushed_every_flush_every_entries(tmp_path):
+    cache = EmbeddingCache(tmp_path, flush_every=4)
+    cache.put(['a', 'b', 'c'], vectors(3))
+    assert len(EmbeddingCache(tmp_path)) == 0
+    cache.put(['d'], vectors(1))
+    assert len(EmbeddingCache(tmp_path)) == 4
+
+
+def test_known_texts_are_not_stored_twice(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    first = vectors(2, seed=1)
+    cache.put(['a', 'b'], first)
+    cache.flush()
+    cache.put(['a', 'b', 'c'], vectors(3, seed=2))
+    cache.close()
+    reopened = EmbeddingCache(tmp_path)
+    assert len(reopened) == 3
+    np.testing.assert_array_equal(reopened.get(['a'])[0], first[0])
+    assert (tmp_path / 'vectors.bin').stat().st_size == 3 * 8 * 4
+
+
+def test_models_do_not_share_vectors(tmp_path):
+    cache = EmbeddingCache(tmp_path, model_name='model-a')
+    cache.put(['a'], vectors(1))
+    cache.close()
+    assert EmbeddingCache(tmp_path, model_name='model-b').get(['a']) == [None]
+
+
+def test_float16_cache_round_trips_approximately(tmp_path):
+    cache = EmbeddingCache(tmp_path, dtype='float16')
+    expected = vectors(2)
+    cache.put(['a', 'b'], expected)
+    cache.close()
+    found = EmbeddingCache(tmp_path, dtype='float16').get(['a', 'b'])
+    np.testing.assert_allclose(np.stack(found), expected, atol=1e-2)
+    with pytest.raises(ValueError):
+        EmbeddingCache(tmp_path, dtype='float32')
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    cache.put(['a'], vectors(1, dim=8))
+    with pytest.raises(ValueError):
+        cache.put(['b'], vectors(1, dim=4))
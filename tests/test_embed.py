@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+try:
+    from src.query.embed import MyVertexAIEmbeddings
+except Exception as e:
+    # Importing the embedder loads the project config and the Vertex AI SDK
+    pytest.skip(f'src.query.embed cannot be imported here: {e}', allow_module_level=True)
+
+from src.query.cache import EmbeddingCache
+
+
+class Embedding:
+
+    def __init__(self, values):
+        self.values = values
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.requests = []
+
+    def get_embeddings(self, batch):
+        self.requests.append(list(batch))
+        return [Embedding([float(len(text)), 1.0, 0.0, 0.0]) for text in batch]
+
+
+def embedder(cache, **fields):
+    return MyVertexAIEmbeddings.construct(client=FakeClient(), cache=cache, max_batch_size=5, max_concurrency=2,
+                                          max_retries=2, **fields)
+
+
+def test_only_uncached_names_are_sent(tmp_path):
+    names = embedder(EmbeddingCache(tmp_path))
+    names.embed_documents(['a', 'bb'])
+    assert names.embed_documents(['bb', 'ccc', 'a']) == [[2.0, 1.0, 0.0, 0.0], [3.0, 1.0, 0.0, 0.0],
+                                                         [1.0, 1.0, 0.0, 0.0]]
+    assert names.client.requests == [['a', 'bb'], ['ccc']]
+
+
+def test_batch_callers_flush_the_cache_after_every_call(tmp_path):
+    embedder(EmbeddingCache(tmp_path)).embed_documents(['a', 'bb'])
+    assert len(EmbeddingCache(tmp_path)) == 2
+
+
+def test_service_embedder_leaves_flushing_to_the_cache(tmp_path):
+    cache = EmbeddingCache(tmp_path, flush_every=1024)
+    queries = embedder(cache, flush_cache=False)
+    for i in range(10):
+        queries.embed_documents([f'query {i}'])
+    assert len(EmbeddingCache(tmp_path)) == 0
+    cache.close()
+    assert len(EmbeddingCache(tmp_path)) == 10
@@ -0,0 +1,81 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('faiss')
+pytest.importorskip('langchain')
+
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.embeddings.base import Embeddings
+from src.query.hybrid import HybridResolver
+from src.query.lexical import LexicalIndex
+from src.query.index import build_index
+from langchain.vectorstores import FAISS
+from langchain.schema import Document
+from src.query.hybrid import RRF_K
+
+
+NAMES = ['Deutsche Bank AG', 'Commerzbank AG', 'Banco Santander SA', 'BNP Paribas SA', 'UniCredit SpA']
+
+
+class FixedEmbeddings(Embeddings):
+    """
+    Embeds every text as the one-hot vector of the entity it is mapped to, and records the calls.
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.calls = []
+
+    def _embed(self, text):
+        vector = np.zeros(len(NAMES), dtype=np.float32)
+        vector[self.targets.get(text, 0)] = 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def resolver(targets=None, **kwargs):
+    embedder = FixedEmbeddings({name: i for i, name in enumerate(NAMES)} | (targets or {}))
+    ids = list(range(len(NAMES)))
+    index = build_index(np.array(embedder.embed_documents(NAMES), dtype=np.float32), ids=ids)
+    embedder.calls.clear()
+    documents = {str(id_): Document(page_content=name, metadata={'entity_id': id_}) for id_, name in zip(ids, NAMES)}
+    vector_store = FAISS(embedder.embed_query, index, InMemoryDocstore(documents), {id_: str(id_) for id_ in ids})
+    return HybridResolver(vector_store, LexicalIndex.build(ids, NAMES), embedder, **kwargs), embedder
+
+
+def test_confident_lexical_matches_skip_the_embedder():
+    hybrid, embedder = resolver()
+    resolution = hybrid.resolve('Commerzbank AG')
+    assert resolution.matches[0][0].page_content == 'Commerzbank AG'
+    assert not resolution.embedded
+    assert embedder.calls == []
+
+
+def test_uncertain_queries_are_embedded_in_one_batch():
+    hybrid, embedder = resolver({'Santandr': 2, 'Paribas bank': 3})
+    resolutions = hybrid.resolve_batch(['Santandr', 'Deutsche Bank AG', 'Paribas bank'])
+    assert embedder.calls == [['Santandr', 'Paribas bank']]
+    assert [resolution.embedded for resolution in resolutions] == [True, False, True]
+    assert [resolution.matches[0][0].page_content for resolution in resolutions] == [
+        'Banco Santander SA', 'Deutsche Bank AG', 'BNP Paribas SA']
+    assert hybrid.stats == {'queries': 3, 'fast_path': 1, 'embedded': 2}
+
+
+def test_reciprocal_rank_fusion_order():
+    hybrid, _ = resolver(k=3)
+    fused = hybrid._fuse([(1.0, [0, 1, 2]), (1.0, [2, 0, 3])])
+    assert [document.metadata['entity_id'] for document, _ in fused] == [0, 2, 1]
+    assert fused[0][1] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+    assert fused[1][1] == pytest.approx(1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+
+
+def test_fusion_weights_favour_a_ranking():
+    hybrid, _ = resolver(k=2, vector_weight=3.0)
+    fused = hybrid._fuse([(1.0, [0, 1, 2]), (3.0, [2, 0, 3])])
+    assert [document.metadata['entity_id'] for document, _ in fused] == [2, 0]
@@ -0,0 +1,69 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+faiss = pytest.importorskip('faiss')
+
+from src.query.index import current_version
+from src.query.index import IndexConfig
+from src.query.index import build_index
+from src.query.index import save_atomic
+from src.query.index import remove_ids
+
+
+def vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_ivf_pq_with_too_few_vectors_builds_an_exact_index():
+    data = vectors(100)
+    index = build_index(data, IndexConfig('ivf_pq'), ids=range(1000, 1100))
+    assert not isinstance(faiss.downcast_index(index.index), faiss.IndexIVF)
+    _, labels = index.search(data[:5], 1)
+    assert labels[:, 0].tolist() == [1000, 1001, 1002, 1003, 1004]
+
+
+def test_ivf_pq_is_built_once_there_are_enough_vectors():
+    index = build_index(vectors(300), IndexConfig('ivf_pq', pq_bits=4), ids=range(300))
+    assert isinstance(index, faiss.IndexIVFPQ)
+    assert index.ntotal == 300
+
+
+def test_ivf_without_vectors_raises_a_clear_error():
+    with pytest.raises(ValueError, match='without vectors'):
+        build_index(vectors(0), IndexConfig('ivf_flat'))
+
+
+@pytest.mark.parametrize('kind', ['flat', 'ivf_flat', 'hnsw'])
+def test_removed_ids_are_no_longer_found(kind):
+    data = vectors(200)
+    index = build_index(data, IndexConfig(kind, nprobe=64), ids=range(200))
+    index = remove_ids(index, [0, 1])
+    assert index.ntotal == 198
+    _, labels = index.search(data[:2], 3)
+    assert not {0, 1} & set(labels.ravel().tolist())
+
+
+def test_saved_versions_leave_the_original_folder_untouched(tmp_path):
+    folder = tmp_path / 'faiss_index'
+    folder.mkdir()
+    (folder / 'index.pkl').write_text('tracked')
+    assert current_version(folder) == folder
+
+    save_atomic(folder, lambda version: (version / 'index.faiss').write_text('v1'))
+    save_atomic(folder, lambda version: (version / 'index.faiss').write_text('v2'))
+    assert (current_version(folder) / 'index.faiss').read_text() == 'v2'
+    assert [path.name for path in folder.iterdir()] == ['index.pkl']
+    # Only the current version is kept
+    assert len([path for path in (tmp_path / 'faiss_index.versions').iterdir() if not path.is_symlink()]) == 1
+
+
+def test_failed_save_keeps_the_current_version(tmp_path):
+    folder = tmp_path / 'faiss_index'
+    save_atomic(folder, lambda version: (version / 'index.faiss').write_text('v1'))
+
+    def fail(version):
+        (version / 'index.faiss').write_text('half')
+        raise OSError('disk full')
+    with pytest.raises(OSError):
+        save_atomic(folder, fail)
+    assert (current_version(folder) / 'index.faiss').read_text() == 'v1'
@@ -0,0 +1,75 @@
+import hashlib
+import json
+
+from src.utils.manifest import DownloadManifest
+from src.utils.manifest import resume_hasher
+from src.utils.manifest import partial_path
+
+
+URL = 'https://example.com/report.pdf'
+
+
+def test_changes_are_written_on_close(tmp_path):
+    path = tmp_path / 'manifest.json'
+    destination = tmp_path / 'report.pdf'
+    destination.write_bytes(b'%PDF-1.7 report')
+    manifest = DownloadManifest(path, save_interval=3600)
+    manifest.begin(URL, {'ETag': '"v1"'})
+    manifest.complete(URL, destination, {'ETag': '"v1"'}, 'abc')
+    # Nothing is written per URL, only by the background saver or on close
+    assert not path.exists()
+    manifest.close()
+
+    entry = json.loads(path.read_text())[URL]
+    assert entry['etag'] == '"v1"'
+    assert entry['size'] == destination.stat().st_size
+    assert DownloadManifest(path).get(URL) == entry
+
+
+def test_background_saver_writes_changes(tmp_path):
+    path = tmp_path / 'manifest.json'
+    manifest = DownloadManifest(path, save_interval=0.01)
+    manifest.begin(URL, {'ETag': '"v1"'})
+    manifest._closed.wait(0.5)
+    assert URL in json.loads(path.read_text())
+    manifest.close()
+
+
+def test_interrupted_download_is_resumed(tmp_path):
+    path = tmp_path / 'manifest.json'
+    destination = tmp_path / 'report.pdf'
+    manifest = DownloadManifest(path)
+    manifest.begin(URL, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    manifest.close()
+    partial_path(destination).write_bytes(b'x' * 100)
+
+    headers = DownloadManifest(path).request_headers(URL, destination)
+    assert headers == {'Range': 'bytes=100-', 'If-Range': '"v1"'}
+
+
+def test_partial_without_validator_is_not_resumed(tmp_path):
+    destination = tmp_path / 'report.pdf'
+    manifest = DownloadManifest(tmp_path / 'manifest.json')
+    manifest.begin(URL, {})
+    partial_path(destination).write_bytes(b'x' * 100)
+    assert manifest.request_headers(URL, destination) == {}
+    manifest.close()
+
+
+def test_current_download_is_requested_conditionally(tmp_path):
+    destination = tmp_path / 'report.pdf'
+    destination.write_bytes(b'%PDF-1.7 report')
+    manifest = DownloadManifest(tmp_path / 'manifest.json')
+    manifest.complete(URL, destination, {'ETag': '"v1"'}, 'abc')
+    assert manifest.request_headers(URL, destination) == {'If-None-Match': '"v1"'}
+    destination.write_bytes(b'%PDF-1.7 truncated')
+    assert manifest.request_headers(URL, destination) == {}
+    manifest.close()
+
+
+def test_resume_hasher_continues_the_partial_hash(tmp_path):
+    partial = tmp_path / 'report.pdf.part'
+    partial.write_bytes(b'first half, ')
+    hasher = resume_hasher(partial)
+    hasher.update(b'second half')
+    assert hasher.hexdigest() == hashlib.sha256(b'first half, second half').hexdigest()
@@ -0,0 +1,62 @@
+import hashlib
+import json
+
+from src.utils.metadata import DELTA_FILENAME
+from src.utils.metadata import metadata_record
+from src.utils.metadata import write_metadata
+from src.utils.metadata import read_shards
+from src.utils.metadata import content_id
+
+
+def record(n, title='report'):
+    id_ = content_id(hashlib.sha256(f'document {n}'.encode()).hexdigest())
+    return metadata_record(id_, f'gs://bucket/{id_}.pdf', json.dumps({'title': title}))
+
+
+def delta(folder):
+    return [(entry['action'], entry['id']) for entry in map(json.loads, (folder / DELTA_FILENAME).read_text().splitlines())]
+
+
+def test_records_are_split_into_bounded_shards(tmp_path):
+    records = [record(n) for n in range(50)]
+    counts = write_metadata(records, tmp_path, max_shard_bytes=1000)
+    shards = sorted(tmp_path.glob('metadata-*.jsonl'))
+    assert counts['shards'] == len(shards) > 1
+    assert all(shard.stat().st_size <= 1000 for shard in shards)
+    assert read_shards(tmp_path) == {r['id']: r for r in records}
+    assert counts['added'] == 50
+
+
+def test_unchanged_run_writes_the_same_shards_and_an_empty_delta(tmp_path):
+    records = [record(n) for n in range(20)]
+    write_metadata(records, tmp_path, max_shard_bytes=1000)
+    before = {shard.name: shard.read_bytes() for shard in tmp_path.glob('metadata-*.jsonl')}
+    counts = write_metadata(list(reversed(records)), tmp_path, max_shard_bytes=1000)
+    assert {shard.name: shard.read_bytes() for shard in tmp_path.glob('metadata-*.jsonl')} == before
+    assert delta(tmp_path) == []
+    assert (counts['added'], counts['changed'], counts['removed']) == (0, 0, 0)
+
+
+def test_delta_lists_added_and_changed_documents(tmp_path):
+    write_metadata([record(1), record(2)], tmp_path)
+    counts = write_metadata([record(2, title='restated'), record(3)], tmp_path)
+    assert delta(tmp_path) == sorted([('changed', record(2)['id']), ('added', record(3)['id'])], key=lambda entry: entry[1])
+    # Document 1 was not seen by this run, but nothing said it is gone
+    assert counts['carried_forward'] == 1
+    assert set(read_shards(tmp_path)) == {record(n)['id'] for n in (1, 2, 3)}
+
+
+def test_documents_are_only_removed_against_the_full_source_set(tmp_path):
+    write_metadata([record(1), record(2), record(3)], tmp_path)
+    # Document 2 failed to upload in this run but still exists in the source
+    counts = write_metadata([record(1)], tmp_path, source_ids=[record(1)['id'], record(2)['id']])
+    assert delta(tmp_path) == [('removed', record(3)['id'])]
+    assert counts['removed'] == 1
+    assert set(read_shards(tmp_path)) == {record(1)['id'], record(2)['id']}
+
+
+def test_stale_shards_are_removed(tmp_path):
+    write_metadata([record(n) for n in range(50)], tmp_path, max_shard_bytes=1000)
+    counts = write_metadata([record(0)], tmp_path, source_ids=[record(0)['id']], max_shard_bytes=1000)
+    assert [shard.name for shard in tmp_path.glob('metadata-*.jsonl')] == ['metadata-00000.jsonl']
+    assert counts['removed'] == 49
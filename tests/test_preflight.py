@@ -0,0 +1,57 @@
+from src.utils.preflight import Preflight
+from src.utils.preflight import SkipLog
+import json
+
+
+def feed_all(check, chunks):
+    for chunk in chunks:
+        reason = check.feed(chunk)
+        if reason:
+            return reason
+    return check.finish()
+
+
+def test_non_pdf_content_types_are_rejected_from_the_headers():
+    preflight = Preflight()
+    assert preflight.check_headers({'Content-Type': 'text/html; charset=utf-8'}) == 'content_type:text/html'
+    assert preflight.check_headers({'Content-Type': 'application/pdf'}) is None
+    # Generic types are left to the magic-byte check
+    assert preflight.check_headers({'Content-Type': 'application/octet-stream'}) is None
+
+
+def test_body_without_pdf_magic_is_rejected():
+    preflight = Preflight(sniff_bytes=16)
+    assert feed_all(preflight.body_check(), [b'<!DOCTYPE html>', b'<html>login</html>']) == 'not_pdf_magic'
+
+
+def test_body_with_pdf_magic_is_accepted():
+    preflight = Preflight(sniff_bytes=16)
+    assert feed_all(preflight.body_check(), [b'%PD', b'F-1.7\n' + b'x' * 100, b'x' * 100]) is None
+
+
+def test_short_body_is_sniffed_when_it_ends():
+    preflight = Preflight()
+    assert feed_all(preflight.body_check(), [b'%PDF-1.4 tiny']) is None
+    assert feed_all(preflight.body_check(), [b'Not found']) == 'not_pdf_magic'
+
+
+def test_resumed_body_is_not_sniffed_again():
+    preflight = Preflight(sniff_bytes=16)
+    assert feed_all(preflight.body_check(offset=1000), [b'middle of the file' * 10]) is None
+
+
+def test_size_limit_is_opt_in():
+    assert Preflight().check_headers({'Content-Type': 'application/pdf', 'Content-Length': str(10 ** 10)}) is None
+    limited = Preflight(max_bytes=1000)
+    assert limited.check_headers({'Content-Length': '2000'}) == 'too_large:2000'
+    assert limited.check_headers({'Content-Range': 'bytes 500-1999/2000'}) == 'too_large:2000'
+    assert feed_all(limited.body_check(), [b'%PDF-' + b'x' * 600, b'x' * 600]) == 'too_large:>1000'
+
+
+def test_skip_log_records_every_url(tmp_path):
+    skip_log = SkipLog(tmp_path / 'skipped.jsonl')
+    skip_log.record('https://example.com/a', 'not_pdf_magic', http_status=200)
+    skip_log.close()
+    assert skip_log.count == 1
+    assert json.loads((tmp_path / 'skipped.jsonl').read_text()) == {
+        'url': 'https://example.com/a', 'reason': 'not_pdf_magic', 'http_status': 200}
@@ -0,0 +1,94 @@
+import pytest
+
+from src.utils.retry import CircuitBreaker
+from src.utils.retry import RetryPolicy
+import src.utils.retry as retry
+
+
+URL = 'https://Bank.example.com/a.pdf'
+OTHER_URL = 'https://other.example.com/b.pdf'
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    policy = RetryPolicy(base_delay=0.5, max_delay=5.0, jitter=False)
+    assert [policy.backoff(attempt) for attempt in range(6)] == [0.5, 1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_jittered_backoff_stays_below_the_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+    for attempt in range(6):
+        cap = min(8.0, 2.0 ** attempt)
+        assert all(0 <= policy.backoff(attempt) <= cap for _ in range(100))
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure(URL)
+    assert breaker.allow(URL)
+    breaker.record_failure(URL)
+    assert not breaker.allow(URL)
+    assert breaker.allow(OTHER_URL)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure(URL)
+    breaker.record_failure(URL)
+    breaker.record_success(URL)
+    breaker.record_failure(URL)
+    assert breaker.allow(URL)
+
+
+def test_half_open_probe_closes_the_circuit_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure(URL)
+    assert not breaker.allow(URL)
+    clock.now += 60
+    assert breaker.allow(URL)
+    # Only one probe is let through while it is in flight
+    assert not breaker.allow(URL)
+    breaker.record_success(URL)
+    assert breaker.allow(URL)
+    assert breaker.allow(URL)
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    for _ in range(5):
+        breaker.record_failure(URL)
+    clock.now += 60
+    assert breaker.allow(URL)
+    breaker.record_failure(URL)
+    assert not breaker.allow(URL)
+    clock.now += 59
+    assert not breaker.allow(URL)
+    clock.now += 1
+    assert breaker.allow(URL)
+
+
+def test_lost_probe_is_replaced_after_the_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure(URL)
+    clock.now += 60
+    assert breaker.allow(URL)
+    clock.now += 30
+    assert not breaker.allow(URL)
+    clock.now += 30
+    assert breaker.allow(URL)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('aiohttp')
+pytest.importorskip('langchain')
+
+from src.query.service import MicroBatcher
+
+
+class RecordingResolver:
+    """
+    Resolves every query to itself and records the batches it was given.
+    """
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.stats = {}
+
+    def resolve_batch(self, queries):
+        self.batches.append(list(queries))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('embedding API down')
+        return [f'resolved {query}' for query in queries]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_full_batches_are_resolved_without_waiting_for_the_delay():
+    resolver = RecordingResolver()
+
+    async def main():
+        batcher = MicroBatcher(resolver, max_batch_size=4, max_batch_delay_ms=10000)
+        batcher.start()
+        started = time.perf_counter()
+        results = await asyncio.gather(*batcher.submit_many([f'q{i}' for i in range(8)]))
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return results, elapsed, batcher.metrics
+
+    results, elapsed, metrics = run(main())
+    assert results == [f'resolved q{i}' for i in range(8)]
+    assert resolver.batches == [['q0', 'q1', 'q2', 'q3'], ['q4', 'q5', 'q6', 'q7']]
+    assert elapsed < 5
+    assert (metrics.batches, metrics.queries) == (2, 8)
+
+
+def test_partial_batch_is_flushed_after_the_delay():
+    resolver = RecordingResolver()
+
+    async def main():
+        batcher = MicroBatcher(resolver, max_batch_size=64, max_batch_delay_ms=50)
+        batcher.start()
+        started = time.perf_counter()
+        result = await batcher.submit('alone')
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return result, elapsed
+
+    result, elapsed = run(main())
+    assert result == 'resolved alone'
+    assert resolver.batches == [['alone']]
+    assert 0.04 <= elapsed < 2
+
+
+def test_queries_arriving_during_a_batch_form_the_next_one():
+    resolver = RecordingResolver(delay=0.2)
+
+    async def main():
+        batcher = MicroBatcher(resolver, max_batch_size=64, max_batch_delay_ms=1)
+        batcher.start()
+        first = batcher.submit('first')
+        await asyncio.sleep(0.05)
+        later = [batcher.submit(f'later {i}') for i in range(5)]
+        await asyncio.gather(first, *later)
+        await batcher.stop()
+
+    run(main())
+    assert resolver.batches == [['first'], [f'later {i}' for i in range(5)]]
+
+
+def test_batch_errors_reach_every_query_of_the_batch():
+    resolver = RecordingResolver(fail=True)
+
+    async def main():
+        batcher = MicroBatcher(resolver, max_batch_size=2, max_batch_delay_ms=1)
+        batcher.start()
+        results = await asyncio.gather(*batcher.submit_many(['a', 'b']), return_exceptions=True)
+        await batcher.stop()
+        return results, batcher.metrics.errors
+
+    results, errors = run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert errors == 1
+
+
+def test_requests_beyond_the_pending_limit_are_refused_whole():
+    async def main():
+        batcher = MicroBatcher(RecordingResolver(), max_pending=3)
+        batcher.submit_many(['a', 'b'])
+        with pytest.raises(asyncio.QueueFull):
+            batcher.submit_many(['c', 'd'])
+        return batcher.pending
+
+    assert run(main()) == 2
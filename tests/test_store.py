@@ -0,0 +1,49 @@
+import hashlib
+
+from src.utils.store import ContentStore
+
+
+def download(store, url, content):
+    path = store.incoming_path(url)
+    path.write_bytes(content)
+    return path
+
+
+def test_identical_documents_are_stored_once(tmp_path):
+    store = ContentStore(tmp_path)
+    first = store.add(download(store, 'https://a.example/x.pdf', b'%PDF-same'), url='https://a.example/x.pdf',
+                      company='A', title='x')
+    second = store.add(download(store, 'https://b.example/y.pdf', b'%PDF-same'), url='https://b.example/y.pdf',
+                       company='B', title='y')
+    assert first == second
+    assert first.name == f"{hashlib.sha256(b'%PDF-same').hexdigest()}.pdf"
+    assert list(store.incoming_dir.iterdir()) == []
+    documents = list(store.documents())
+    assert len(documents) == 1
+    assert {record['company'] for record in documents[0]['records']} == {'A', 'B'}
+
+
+def test_different_documents_never_overwrite_each_other(tmp_path):
+    store = ContentStore(tmp_path)
+    store.add(download(store, 'https://a.example/report.pdf', b'%PDF-one'), url='https://a.example/report.pdf')
+    store.add(download(store, 'https://b.example/report.pdf', b'%PDF-two'), url='https://b.example/report.pdf')
+    assert sorted(document['path'].read_bytes() for document in store.documents()) == [b'%PDF-one', b'%PDF-two']
+
+
+def test_url_listed_for_two_companies_keeps_both_records(tmp_path):
+    store = ContentStore(tmp_path)
+    url = 'https://a.example/x.pdf'
+    for company in ('A', 'B'):
+        store.add(download(store, url, b'%PDF-shared'), url=url, company=company, title='x')
+    assert sorted(record['company'] for record in ContentStore(tmp_path).records()) == ['A', 'B']
+
+
+def test_index_survives_reopening_and_follows_changed_content(tmp_path):
+    store = ContentStore(tmp_path)
+    url = 'https://a.example/x.pdf'
+    store.add(download(store, url, b'%PDF-v1'), url=url, company='A')
+    store.add(download(store, url, b'%PDF-v1'), url=url, company='A')
+    store.add(download(store, url, b'%PDF-v2'), url=url, company='A')
+    assert len(store.index_path.read_text().splitlines()) == 2
+    records = ContentStore(tmp_path).records()
+    assert [record['sha256'] for record in records] == [hashlib.sha256(b'%PDF-v2').hexdigest()]
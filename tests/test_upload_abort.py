@@ -0,0 +1,178 @@
+import gc
+
+import pytest
+
+from src.utils.resumable import cancel_upload
+
+try:
+    from google.cloud.storage.fileio import BlobWriter
+except ImportError:
+    BlobWriter = None
+
+
+CHUNK = 256 * 1024
+requires_gcs = pytest.mark.skipif(BlobWriter is None, reason='google-cloud-storage is not installed')
+
+
+class FakeBuffer:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWriter:
+    """
+    Stand-in for the BlobWriter attributes `cancel_upload` uses, after `sent` chunks were uploaded.
+    """
+
+    def __init__(self, blob, sent=False):
+        self._blob = blob
+        self._buffer = FakeBuffer()
+        self._upload_and_transport = (FakeUpload({}, blob.name, None, CHUNK), blob.transport) if sent else None
+
+
+class FakeUpload:
+    """
+    Resumable upload that creates the object in `bucket` when it sends a chunk shorter than the
+    chunk size, as GCS finalizes a session on its last chunk.
+    """
+
+    def __init__(self, bucket, name, stream, chunk_size):
+        self.bucket = bucket
+        self.name = name
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.resumable_url = f'https://upload.example/session/{name}'
+        self.sent = b''
+
+    def transmit_next_chunk(self, transport, **kwargs):
+        chunk = self.stream.read(self.chunk_size)
+        self.sent += chunk
+        if len(chunk) < self.chunk_size:
+            self.bucket[self.name] = self.sent
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, url):
+        self.deleted.append(url)
+
+
+class FakeBlob:
+
+    def __init__(self, bucket, name):
+        self.bucket_objects = bucket
+        self.name = name
+        self.chunk_size = None
+        self.generation = None
+        self.transport = FakeTransport()
+
+    @property
+    def bucket(self):
+        return self
+
+    @property
+    def client(self):
+        return None
+
+    def _initiate_resumable_upload(self, client, stream, content_type, size, *args, chunk_size=None, **kwargs):
+        return FakeUpload(self.bucket_objects, self.name, stream, chunk_size), self.transport
+
+    def open(self, mode, chunk_size=None, **kwargs):
+        return BlobWriter(self, chunk_size=chunk_size, **kwargs)
+
+
+def test_cancel_fake_writer_before_any_chunk():
+    blob = FakeBlob({}, 'incoming/abc.pdf')
+    writer = FakeWriter(blob)
+    cancel_upload(writer)
+    assert writer._buffer.closed
+    assert blob.transport.deleted == []
+
+
+def test_cancel_fake_writer_deletes_the_session():
+    blob = FakeBlob({}, 'incoming/abc.pdf')
+    writer = FakeWriter(blob, sent=True)
+    cancel_upload(writer)
+    assert writer._buffer.closed
+    assert blob.transport.deleted == ['https://upload.example/session/incoming/abc.pdf']
+
+
+def test_cancel_survives_a_failed_delete():
+    blob = FakeBlob({}, 'incoming/abc.pdf')
+    writer = FakeWriter(blob, sent=True)
+
+    def delete(url):
+        raise ConnectionError('reset')
+    blob.transport.delete = delete
+    cancel_upload(writer)
+    assert writer._buffer.closed
+
+
+def test_cancel_rejects_an_unknown_writer():
+    writer = FakeWriter(FakeBlob({}, 'incoming/abc.pdf'))
+    del writer._upload_and_transport
+    with pytest.raises(RuntimeError, match='_upload_and_transport'):
+        cancel_upload(writer)
+
+
+def open_writer(bucket, name='incoming/abc.pdf'):
+    blob = FakeBlob(bucket, name)
+    return blob, BlobWriter(blob, chunk_size=CHUNK, ignore_flush=True)
+
+
+@requires_gcs
+def test_dropped_writer_finalizes_the_object():
+    # The reason cancel_upload exists: garbage collection closes, and so finalizes, a BlobWriter
+    bucket = {}
+    _, writer = open_writer(bucket)
+    writer.write(b'%PDF-' + b'x' * 100)
+    del writer
+    gc.collect()
+    assert 'incoming/abc.pdf' in bucket
+
+
+@requires_gcs
+def test_cancel_before_any_chunk_creates_nothing():
+    bucket = {}
+    blob, writer = open_writer(bucket)
+    writer.write(b'%PDF-' + b'x' * 100)
+    cancel_upload(writer)
+    del writer
+    gc.collect()
+    assert bucket == {}
+    assert blob.transport.deleted == []
+
+
+@requires_gcs
+def test_cancel_after_chunks_cancels_the_session():
+    bucket = {}
+    blob, writer = open_writer(bucket)
+    writer.write(b'x' * (CHUNK + 1000))
+    cancel_upload(writer)
+    assert writer.closed
+    del writer
+    gc.collect()
+    assert bucket == {}
+    assert blob.transport.deleted == ['https://upload.example/session/incoming/abc.pdf']
+
+
+@requires_gcs
+def test_aborted_gcs_writer_creates_nothing():
+    from src.utils.storage import GCSWriter
+    bucket = {}
+    blob = FakeBlob(bucket, 'incoming/abc.pdf')
+    with pytest.raises(RuntimeError):
+        with GCSWriter(blob, 'application/pdf', CHUNK) as writer:
+            writer.write(b'x' * (CHUNK + 1000))
+            raise RuntimeError('download failed')
+    writer.abort()
+    gc.collect()
+    assert bucket == {}
+    assert blob.transport.deleted == ['https://upload.example/session/incoming/abc.pdf']